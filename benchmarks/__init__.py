@@ -0,0 +1,11 @@
+"""
+Offline benchmark suite
+Parsing microbenchmarks over captured page fixtures and end-to-end pipeline
+runs against the local fake Anthropic server, compared with a stored baseline
+"""
+
+import os
+import sys
+
+# Modules in src/ import each other by bare name (see src/app.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
@@ -0,0 +1,86 @@
+"""
+End-to-end pipeline benchmarks: fixture scraping, scoring, local valuation and
+Claude calls against the local fake Anthropic server
+"""
+
+import json
+import os
+
+from benchmarks.fake_anthropic import SAMPLE_CMA, FakeAnthropicServer
+from benchmarks.harness import benchmark
+from benchmarks.pages import FixtureScraper, subjects
+from claude_analyzer import ClaudeAnalyzer
+from pipeline import AnalysisPipeline
+from rate_limiter import RequestLimiter
+
+# Simulated Claude response time in seconds
+LLM_LATENCY = float(os.getenv('BENCH_LLM_LATENCY', '0.05'))
+
+# A flip analysis that satisfies the flip output schema, so no repair pass is timed
+SAMPLE_FLIP = {
+    'flip_score': 72,
+    'recommendation': 'buy',
+    'arv_assessment': {'estimated_arv': '$330,000', 'arv_per_sqft': '$200', 'arv_methodology': 'Renovated comps',
+                       'arv_confidence': 'Medium'},
+    'acquisition_analysis': {'max_allowable_offer': '$205,000', 'is_asking_price_viable': 'No',
+                             'negotiation_target': '$210,000'},
+    'renovation_scope': {'estimated_cost_low': '$30,000', 'estimated_cost_high': '$45,000',
+                         'priority_items': ['Kitchen'], 'timeline_months': 4, 'scope_level': 'moderate'},
+    'financial_summary': {'total_cost_in': '$270,000', 'expected_arv': '$330,000', 'expected_profit': '$38,000',
+                          'best_case_profit': '$55,000', 'worst_case_profit': '$5,000', 'expected_roi': '14%',
+                          'cash_needed': '$80,000'},
+    'deal_breakers': [],
+    'market_factors': 'Stable demand',
+    'risks': ['Permit delays'],
+    'exit_strategies': ['Rent'],
+}
+
+
+class PipelineBench:
+    """A pipeline wired to fixture pages and a running fake API"""
+
+    def __init__(self, ttl: float, response: dict = SAMPLE_CMA):
+        self.server = FakeAnthropicServer(response_text=json.dumps(response), latency=LLM_LATENCY).start()
+        # Unthrottled so the benchmark measures the pipeline, not the per-minute budget
+        limiter = RequestLimiter(max_concurrent=8, requests_per_minute=1_000_000, tokens_per_minute=1_000_000_000)
+        self.pipeline = AnalysisPipeline(
+            scraper_factory=FixtureScraper,
+            analyzer_factory=lambda: ClaudeAnalyzer(api_key='bench', base_url=self.server.base_url, limiter=limiter),
+            ttl=ttl)
+        self.requests = [{'address': s['address']} for s in subjects()]
+        self.turn = 0
+
+    def next_request(self):
+        self.turn += 1
+        return self.requests[self.turn % len(self.requests)]
+
+    def warmed(self, analysis: str):
+        """Run every address once so timed runs are memo hits"""
+        for request in self.requests:
+            self.pipeline.run(request, analysis=analysis)
+        return self
+
+    def close(self):
+        self.server.stop()
+
+
+@benchmark('pipeline.local_only_cold', 'pipeline', setup=lambda: PipelineBench(ttl=0))
+def local_only_cold(bench):
+    bench.pipeline.run(bench.next_request(), analysis=None)
+
+
+@benchmark('pipeline.comprehensive_cold', 'pipeline', setup=lambda: PipelineBench(ttl=0))
+def comprehensive_cold(bench):
+    result = bench.pipeline.run(bench.next_request(), analysis='comprehensive')['result']
+    assert result['success'], result
+
+
+@benchmark('pipeline.flip_cold', 'pipeline', setup=lambda: PipelineBench(ttl=0, response=SAMPLE_FLIP))
+def flip_cold(bench):
+    result = bench.pipeline.run(bench.next_request(), analysis='flip')['result']
+    assert result['success'], result
+
+
+@benchmark('pipeline.comprehensive_warm', 'pipeline', setup=lambda: PipelineBench(ttl=3600).warmed('comprehensive'))
+def comprehensive_warm(bench):
+    bench.pipeline.run(bench.next_request(), analysis='comprehensive')
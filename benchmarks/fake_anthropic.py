@@ -0,0 +1,252 @@
+"""
+Local stand-in for the Anthropic Messages API
+Serves just enough of the HTTP surface for ClaudeAnalyzer to run against it
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A comprehensive analysis that satisfies the CMA output schema
+SAMPLE_CMA = {
+    'executive_summary': 'Priced slightly below market.',
+    'property_overview': {'condition_assessment': 'Average', 'key_features': ['Garage'],
+                          'property_type': 'Single family'},
+    'market_analysis': {'market_trend': 'Stable', 'median_price_area': '$260,000', 'avg_price_per_sqft': 170,
+                        'avg_days_on_market': 30, 'inventory_level': 'balanced', 'market_position': 'at market'},
+    'comparable_analysis': {'comps_used': [{'address': '9 Oak St', 'adjusted_value': 252000}],
+                            'comps_excluded': [], 'comp_quality_score': 'B'},
+    'valuation': {'estimated_fair_market_value': 255000, 'value_range_low': 245000, 'value_range_high': 265000,
+                  'price_vs_value': '2% below FMV', 'confidence_level': 'Medium', 'methodology': 'Adjusted comps'},
+    'pricing_strategy': {'suggested_list_price': 259000, 'pricing_rationale': 'Comps', 'days_to_sell_estimate': 30},
+    'investment_analysis': {'rental_potential': '$2,100/mo', 'cap_rate_estimate': '6%',
+                            'appreciation_outlook': 'Modest', 'investment_grade': 'B'},
+    'recommendations': ['List at $259,000'],
+    'risk_factors': ['Older systems'],
+    'data_quality_notes': 'Single comp',
+}
+
+
+class FakeAnthropicServer:
+    """Threaded HTTP server answering /v1/messages with a canned response.
+
+    Cached system prefixes are tracked so the usage block reports cache writes
+    on first sight of a prefix and cache reads afterwards, like the real API.
+    When a tool call is forced and the response text is a JSON object, it is
+    returned as that tool's input.
+    """
+
+    def __init__(self, response_text='{"executive_summary": "ok"}', latency=0.0, record_requests=True):
+        """``latency`` is seconds per response, or a callable returning them (e.g. a random draw)"""
+        self.response_text = response_text
+        self.latency = latency
+        self.record_requests = record_requests  # off for long load tests so memory stays flat
+        self.requests = []
+        self.failures = []  # (status, headers) to return, in order, before succeeding
+        self.responses = []  # response texts to use, in order, before falling back to response_text
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.batches = {}
+        self.batch_polls_until_end = 1  # retrieve calls that report in_progress before 'ended'
+        self._cached_prefixes = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _usage_for(self, body, text):
+        """Token counts using a 4-chars-per-token estimate"""
+        cached = 0
+        created = 0
+        for block in body.get('system') or []:
+            if isinstance(block, dict) and block.get('cache_control'):
+                tokens = len(block.get('text', '')) // 4
+                with self._lock:
+                    if block['text'] in self._cached_prefixes:
+                        cached += tokens
+                    else:
+                        self._cached_prefixes.add(block['text'])
+                        created += tokens
+        prompt_chars = sum(len(m['content']) if isinstance(m['content'], str) else len(json.dumps(m['content']))
+                           for m in body.get('messages', []))
+        return {
+            'input_tokens': prompt_chars // 4,
+            'output_tokens': max(1, len(text) // 4),
+            'cache_creation_input_tokens': created,
+            'cache_read_input_tokens': cached,
+        }
+
+    def _message(self, body, text=None):
+        text = self.response_text if text is None else text
+        content = [{'type': 'text', 'text': text}]
+        stop_reason = 'end_turn'
+        tool_choice = body.get('tool_choice') or {}
+        if tool_choice.get('type') == 'tool':
+            try:
+                tool_input = json.loads(text)
+            except ValueError:
+                tool_input = None
+            if isinstance(tool_input, dict):
+                content = [{'type': 'tool_use', 'id': f"toolu_fake_{len(self.requests)}",
+                            'name': tool_choice['name'], 'input': tool_input}]
+                stop_reason = 'tool_use'
+        return {
+            'id': f"msg_fake_{len(self.requests)}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': body.get('model', 'fake'),
+            'content': content,
+            'stop_reason': stop_reason,
+            'stop_sequence': None,
+            'usage': self._usage_for(body, text),
+        }
+
+    def _batch_object(self, batch_id):
+        batch = self.batches[batch_id]
+        ended = batch['polls'] > self.batch_polls_until_end
+        total = len(batch['requests'])
+        return {
+            'id': batch_id,
+            'type': 'message_batch',
+            'processing_status': 'ended' if ended else 'in_progress',
+            'request_counts': {'processing': 0 if ended else total, 'succeeded': total if ended else 0,
+                               'errored': 0, 'canceled': 0, 'expired': 0},
+            'created_at': '2026-01-01T00:00:00Z',
+            'expires_at': '2026-01-02T00:00:00Z',
+            'ended_at': '2026-01-01T01:00:00Z' if ended else None,
+            'archived_at': None,
+            'cancel_initiated_at': None,
+            'results_url': f"{self.base_url}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_error(self, status, headers=None):
+                data = json.dumps({'type': 'error', 'error': {'type': 'overloaded_error', 'message': 'fake'}}).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_events(self, message):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.end_headers()
+                block = message['content'][0]
+                start = dict(message, content=[], stop_reason=None)
+                if block['type'] == 'tool_use':
+                    text = json.dumps(block['input'])
+                    opened = dict(block, input={})
+                    delta = lambda piece: {'type': 'input_json_delta', 'partial_json': piece}
+                else:
+                    text = block['text']
+                    opened = {'type': 'text', 'text': ''}
+                    delta = lambda piece: {'type': 'text_delta', 'text': piece}
+                events = [
+                    ('message_start', {'type': 'message_start', 'message': start}),
+                    ('content_block_start', {'type': 'content_block_start', 'index': 0, 'content_block': opened}),
+                ]
+                for i in range(0, len(text), 16):
+                    events.append(('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                                           'delta': delta(text[i:i + 16])}))
+                events += [
+                    ('content_block_stop', {'type': 'content_block_stop', 'index': 0}),
+                    ('message_delta', {'type': 'message_delta',
+                                       'delta': {'stop_reason': message['stop_reason'], 'stop_sequence': None},
+                                       'usage': {'output_tokens': message['usage']['output_tokens']}}),
+                    ('message_stop', {'type': 'message_stop'}),
+                ]
+                for name, payload in events:
+                    self.wfile.write(f"event: {name}\ndata: {json.dumps(payload)}\n\n".encode())
+                    self.wfile.flush()
+
+            def do_GET(self):
+                parts = self.path.split('?')[0].strip('/').split('/')
+                if parts[:3] != ['v1', 'messages', 'batches'] or len(parts) < 4 or parts[3] not in fake.batches:
+                    self._send_json(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': self.path}})
+                    return
+                batch_id = parts[3]
+                if len(parts) == 5 and parts[4] == 'results':
+                    lines = [json.dumps({'custom_id': r['custom_id'],
+                                         'result': {'type': 'succeeded', 'message': fake._message(r['params'])}})
+                             for r in fake.batches[batch_id]['requests']]
+                    data = '\n'.join(lines).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/binary')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                fake.batches[batch_id]['polls'] += 1
+                self._send_json(200, fake._batch_object(batch_id))
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if self.path.startswith('/v1/messages/batches'):
+                    batch_id = f"msgbatch_fake_{len(fake.batches)}"
+                    fake.batches[batch_id] = {'requests': body['requests'], 'polls': 0}
+                    self._send_json(200, fake._batch_object(batch_id))
+                    return
+                if not self.path.startswith('/v1/messages'):
+                    self._send_json(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': self.path}})
+                    return
+                with fake._lock:
+                    if fake.record_requests:
+                        fake.requests.append(body)
+                    failure = fake.failures.pop(0) if fake.failures else None
+                    text = fake.responses.pop(0) if fake.responses and not failure else None
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                try:
+                    if failure:
+                        self._send_error(*failure)
+                        return
+                    delay = fake.latency() if callable(fake.latency) else fake.latency
+                    if delay:
+                        time.sleep(delay)
+                    message = fake._message(body, text)
+                    if body.get('stream'):
+                        self._send_events(message)
+                    else:
+                        self._send_json(200, message)
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+        return Handler
@@ -0,0 +1,115 @@
+"""
+Benchmark registry, timing loop and baseline comparison
+Timings are compared relative to a fixed calibration workload timed in the
+same run, so a baseline recorded on one machine still gates another
+"""
+
+import json
+import math
+import statistics
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+BENCHMARKS: Dict[str, Dict] = {}
+
+
+def benchmark(name: str, group: str, setup: Optional[Callable[[], object]] = None):
+    """Register ``fn(state)`` as a benchmark; ``setup()`` builds ``state`` once, outside the timing"""
+    def decorator(fn):
+        BENCHMARKS[name] = {'fn': fn, 'group': group, 'setup': setup}
+        return fn
+    return decorator
+
+
+def measure(fn: Callable[[], object], min_time: float = 0.2, repeats: int = 5, min_calls: int = 20) -> Dict:
+    """Median and best seconds per call over ``repeats`` rounds of at least ``min_time`` each.
+
+    Calls slower than a round get extra rounds until ``min_calls`` have been
+    timed, so best-of-rounds is not one sample of a 150 ms pipeline run.
+    """
+    fn()  # warm caches and lazy imports
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / 5 or loops >= 1_000_000:
+            break
+        loops *= 10
+    loops = max(1, int(loops * (min_time / max(elapsed, 1e-9))))
+    repeats = max(repeats, math.ceil(min_calls / loops))
+
+    rounds = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        rounds.append((time.perf_counter() - started) / loops)
+    return {'median_s': statistics.median(rounds), 'best_s': min(rounds), 'loops': loops, 'repeats': repeats}
+
+
+def _calibration_workload():
+    """Fixed pure-Python work shaped like the parse and filter code: string splits, dicts and a sort"""
+    rows = [f"{i} Main St | ${i * 1000:,} | {i % 5} bd" for i in range(200)]
+    parsed = [dict(zip(('address', 'price', 'beds'), row.split(' | '))) for row in rows]
+    return sorted(parsed, key=lambda row: -int(row['price'].strip('$').replace(',', '')))
+
+
+def calibrate(min_time: float = 0.2, repeats: int = 5) -> float:
+    """Best seconds per call of the calibration workload: how fast this host is right now"""
+    return measure(_calibration_workload, min_time, repeats)['best_s']
+
+
+def run(names: Optional[List[str]] = None, min_time: float = 0.2, repeats: int = 5,
+        min_calls: int = 20) -> Dict[str, Dict]:
+    results = {}
+    for name, spec in BENCHMARKS.items():
+        if names and not any(pattern in name for pattern in names):
+            continue
+        state = spec['setup']() if spec['setup'] else None
+        try:
+            results[name] = dict(measure(lambda: spec['fn'](state), min_time, repeats, min_calls), group=spec['group'])
+        finally:
+            if hasattr(state, 'close'):
+                state.close()
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float,
+            abs_tolerance: float = 0.0, host_factor: float = 1.0) -> List[Dict]:
+    """One row per benchmark; ``regressed`` when it is slower than baseline by more than ``tolerance``.
+
+    Best-of-rounds is compared rather than the median: it is far less
+    sensitive to noisy neighbours on shared CI hosts. A slowdown must also
+    exceed ``abs_tolerance`` seconds, so microsecond benchmarks (a warm cache
+    hit) do not fail the gate over a few microseconds of scheduler jitter.
+    Baseline times are first multiplied by ``host_factor``, the current
+    calibration time over the baseline's, so a slower host is not a regression.
+    """
+    rows = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        expected = base['best_s'] * host_factor if base and base.get('best_s') else None
+        ratio = result['best_s'] / expected if expected else None
+        regressed = ratio is not None and ratio > 1 + tolerance and result['best_s'] - expected > abs_tolerance
+        rows.append({'name': name, 'best_s': result['best_s'], 'median_s': result['median_s'],
+                     'baseline_s': expected, 'ratio': ratio, 'regressed': regressed})
+    return rows
+
+
+def load_baseline(path: str) -> Tuple[Dict[str, Dict], Optional[float]]:
+    """The baseline's benchmark results and calibration time, ``({}, None)`` when there is none yet"""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}, None
+    return data['benchmarks'], data.get('calibration_s')
+
+
+def save_baseline(path: str, results: Dict[str, Dict], calibration_s: float):
+    with open(path, 'w') as f:
+        json.dump({'recorded_at': time.strftime('%Y-%m-%d %H:%M:%S'), 'calibration_s': calibration_s,
+                   'benchmarks': results}, f, indent=2, sort_keys=True)
+        f.write('\n')
@@ -0,0 +1,268 @@
+"""
+Open-loop load generator for the Flask endpoints
+
+    python -m benchmarks.load_test --rate 2 --duration 60 --time-scale 0.1
+    python -m benchmarks.load_test --url http://localhost:8000 --pid 1234 --rate 1
+
+Without --url the app is served in-process with stubbed backends: fixture
+pages whose loads take a lognormal time around the scraper's own render waits,
+and the fake Claude API answering after a lognormal delay around
+--llm-median seconds. --time-scale shrinks every backend delay for quick runs.
+Requests arrive as a Poisson process at --rate per second regardless of how
+fast earlier ones finish, so queueing and 503s show up as they would in
+production. Reports throughput, latency percentiles and error rates per
+endpoint, plus process RSS over time.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import benchmarks  # noqa: F401 - puts src/ on the path
+from benchmarks.end_to_end import SAMPLE_FLIP
+from benchmarks.fake_anthropic import SAMPLE_CMA, FakeAnthropicServer
+from benchmarks.pages import FixtureScraper, subjects
+
+DEFAULT_MIX = 'analyze=0.6,flip=0.3,static=0.1'
+ENDPOINTS = {
+    'analyze': ('POST', '/analyze'),
+    'flip': ('POST', '/flip-analysis'),
+    'static': ('GET', '/static/style.css'),
+}
+PAGE_SIGMA = 0.4
+LLM_SIGMA = 0.5
+
+# Local targets must not go through any HTTP proxy configured in the environment
+_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+def _lognormal(median: float, sigma: float) -> float:
+    return random.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+
+def rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """Resident set size from /proc, in MB (None where /proc is unavailable)"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def stubbed_scraper_factory(time_scale: float):
+    """FixtureScraper whose page loads sleep a lognormal time around the scraper's render wait"""
+    class LatencyScraper(FixtureScraper):
+        def _load_page(self, url, source, settle):
+            time.sleep(_lognormal(settle * time_scale, PAGE_SIGMA))
+            self.driver.get(url)
+
+    return LatencyScraper
+
+
+class InProcessTarget:
+    """The Flask app on a local port, its pipeline wired to stubbed scrape and Claude backends"""
+
+    def __init__(self, time_scale: float, llm_median: float, warm: bool):
+        from werkzeug.serving import make_server
+        import app as app_module
+        from claude_analyzer import ClaudeAnalyzer
+        from pipeline import AnalysisPipeline
+        from rate_limiter import RequestLimiter
+
+        delay = lambda: _lognormal(llm_median * time_scale, LLM_SIGMA)
+        self.cma_api = FakeAnthropicServer(json.dumps(SAMPLE_CMA), latency=delay, record_requests=False).start()
+        self.flip_api = FakeAnthropicServer(json.dumps(SAMPLE_FLIP), latency=delay, record_requests=False).start()
+        limiter = RequestLimiter(max_concurrent=64, requests_per_minute=1_000_000, tokens_per_minute=1_000_000_000)
+
+        def analyzer_factory():
+            return _RoutingAnalyzer(ClaudeAnalyzer(api_key='load', base_url=self.cma_api.base_url, limiter=limiter),
+                                    ClaudeAnalyzer(api_key='load', base_url=self.flip_api.base_url, limiter=limiter))
+
+        self.app_module, self.original_pipeline = app_module, app_module.pipeline
+        app_module.pipeline = AnalysisPipeline(scraper_factory=stubbed_scraper_factory(time_scale),
+                                               analyzer_factory=analyzer_factory, ttl=3600 if warm else 0)
+        self.server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def close(self):
+        self.server.shutdown()
+        self.app_module.pipeline = self.original_pipeline
+        self.cma_api.stop()
+        self.flip_api.stop()
+
+
+class _RoutingAnalyzer:
+    """Sends each analysis type to the fake API holding a matching canned response"""
+
+    def __init__(self, cma, flip):
+        self.cma = cma
+        self.flip = flip
+
+    def comprehensive_property_analysis(self, *args, **kwargs):
+        return self.cma.comprehensive_property_analysis(*args, **kwargs)
+
+    def analyze_flip_potential(self, *args, **kwargs):
+        return self.flip.analyze_flip_potential(*args, **kwargs)
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}' (choose from {', '.join(ENDPOINTS)})")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+class LoadTest:
+    def __init__(self, url: str, rate: float, duration: float, mix: Dict[str, float], timeout: float,
+                 pid: Optional[int] = None, rss_interval: float = 1.0):
+        self.url = url.rstrip('/')
+        self.rate = rate
+        self.duration = duration
+        self.mix = mix
+        self.timeout = timeout
+        self.pid = pid
+        self.rss_interval = rss_interval
+        self.results = defaultdict(list)  # endpoint -> [(latency_s, status)]
+        self.rss = []  # (elapsed_s, MB)
+        self._lock = threading.Lock()
+        self._payloads = [{'address': s['address']} for s in subjects()]
+
+    def _request(self, endpoint: str):
+        method, path = ENDPOINTS[endpoint]
+        data = json.dumps(random.choice(self._payloads)).encode() if method == 'POST' else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'} if data else {})
+        started = time.perf_counter()
+        try:
+            with _opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except Exception:
+            status = 0  # connection error or client timeout
+        with self._lock:
+            self.results[endpoint].append((time.perf_counter() - started, status))
+
+    def _sample_rss(self, started: float, stop: threading.Event):
+        while not stop.is_set():
+            self.rss.append((round(time.monotonic() - started, 1), rss_mb(self.pid)))
+            stop.wait(self.rss_interval)
+
+    def run(self) -> Dict:
+        names, weights = zip(*self.mix.items())
+        stop = threading.Event()
+        started = time.monotonic()
+        sampler = threading.Thread(target=self._sample_rss, args=(started, stop), daemon=True)
+        sampler.start()
+        sent = 0
+        # Enough client threads that arrivals never wait on earlier responses
+        with ThreadPoolExecutor(max_workers=512, thread_name_prefix='load') as pool:
+            next_at = started
+            while next_at - started < self.duration:
+                time.sleep(max(0.0, next_at - time.monotonic()))
+                pool.submit(self._request, random.choices(names, weights)[0])
+                sent += 1
+                next_at += random.expovariate(self.rate)
+        elapsed = time.monotonic() - started
+        stop.set()
+        sampler.join()
+        return self.report(sent, elapsed)
+
+    def report(self, sent: int, elapsed: float) -> Dict:
+        endpoints = {}
+        for endpoint, samples in sorted(self.results.items()):
+            latencies = sorted(latency for latency, _ in samples)
+            statuses = defaultdict(int)
+            for _, status in samples:
+                statuses[status] += 1
+            errors = sum(count for status, count in statuses.items() if status == 0 or status >= 400)
+            endpoints[endpoint] = {
+                'requests': len(samples),
+                'throughput_rps': round(len(samples) / elapsed, 3),
+                'error_rate': round(errors / len(samples), 4),
+                'statuses': dict(statuses),
+                **{f'p{q}': round(_percentile(latencies, q / 100), 4) for q in (50, 90, 95, 99)},
+                'max': round(latencies[-1], 4),
+            }
+        rss_values = [mb for _, mb in self.rss if mb is not None]
+        return {
+            'target': self.url,
+            'offered_rate_rps': self.rate,
+            'sent': sent,
+            'elapsed_s': round(elapsed, 1),
+            'endpoints': endpoints,
+            'rss_mb': {'start': rss_values[0] if rss_values else None,
+                       'peak': max(rss_values) if rss_values else None,
+                       'end': rss_values[-1] if rss_values else None,
+                       'timeline': self.rss},
+        }
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def print_report(report: Dict):
+    print(f"{report['sent']} requests in {report['elapsed_s']}s at {report['offered_rate_rps']}/s "
+          f"offered -> {report['target']}")
+    print(f"{'endpoint':10} {'reqs':>6} {'rps':>7} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  statuses")
+    for name, e in report['endpoints'].items():
+        print(f"{name:10} {e['requests']:>6} {e['throughput_rps']:>7.2f} {e['error_rate'] * 100:>5.1f}% "
+              f"{e['p50']:>7.2f}s {e['p95']:>7.2f}s {e['p99']:>7.2f}s {e['max']:>7.2f}s  {e['statuses']}")
+    rss = report['rss_mb']
+    if rss['peak'] is not None:
+        print(f"RSS MB: start {rss['start']:.0f}, peak {rss['peak']:.0f}, end {rss['end']:.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Realty AI Scout load test')
+    parser.add_argument('--url', help='Existing server to target; default serves the app in-process with stubs')
+    parser.add_argument('--pid', type=int, help='Server process to sample RSS from when using --url')
+    parser.add_argument('--rate', type=float, default=1.0, help='Mean arrivals per second (Poisson)')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to keep sending')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Endpoint weights (default {DEFAULT_MIX})')
+    parser.add_argument('--timeout', type=float, default=300.0, help='Client timeout per request')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='Multiplier for stubbed backend delays')
+    parser.add_argument('--llm-median', type=float, default=25.0, help='Median stubbed Claude latency, seconds')
+    parser.add_argument('--warm', action='store_true', help='Keep pipeline memoization on (repeat addresses hit)')
+    parser.add_argument('--json', help='Also write the full report, RSS timeline included, to this file')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    target = None if args.url else InProcessTarget(args.time_scale, args.llm_median, args.warm)
+    try:
+        test = LoadTest(args.url or target.url, args.rate, args.duration, parse_mix(args.mix), args.timeout,
+                        pid=args.pid if args.url else os.getpid())
+        report = test.run()
+    finally:
+        if target:
+            target.close()
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
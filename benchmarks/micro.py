@@ -0,0 +1,37 @@
+"""
+Parsing and filtering microbenchmarks over captured pages
+"""
+
+from benchmarks.harness import benchmark
+from benchmarks.pages import fixture_json, fixture_text, subjects
+from selenium_scraper import PropertyScraper
+
+
+@benchmark('parse.redfin_sold_listings', 'parse', setup=lambda: fixture_text('redfin_sold_hartford.txt'))
+def parse_redfin_sold_listings(page_text):
+    PropertyScraper._parse_redfin_sold_listings(page_text)
+
+
+@benchmark('parse.comp_from_text_block', 'parse', setup=lambda: fixture_json('zillow_sold_cards.json'))
+def parse_comp_from_text_block(cards):
+    for card in cards:
+        PropertyScraper._parse_comp_from_text_block(card, 'zillow_comps')
+
+
+@benchmark('filter.is_distressed_sale', 'filter',
+           setup=lambda: fixture_json('zillow_sold_cards.json') + fixture_text('redfin_sold_hartford.txt').split('SOLD '))
+def is_distressed_sale(texts):
+    for text in texts:
+        PropertyScraper._is_distressed_sale(text)
+
+
+def _listings_and_subject():
+    listings = PropertyScraper._parse_redfin_sold_listings(fixture_text('redfin_sold_hartford.txt'))
+    return listings, subjects()[2]
+
+
+@benchmark('filter.is_valid_comp', 'filter', setup=_listings_and_subject)
+def is_valid_comp(state):
+    listings, subject = state
+    for comp in listings:
+        PropertyScraper._is_valid_comp(comp, subject)
@@ -0,0 +1,86 @@
+"""
+Captured page fixtures and a scraper that replays them instead of driving Chrome
+"""
+
+import json
+import os
+from typing import Dict, List
+
+from selenium_scraper import PropertyScraper
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Recently-sold page text per city, as returned by body.text on Redfin
+REDFIN_SOLD_PAGES = {'willimantic': 'redfin_sold_willimantic.txt', 'hartford': 'redfin_sold_hartford.txt'}
+
+
+def fixture_text(name: str) -> str:
+    with open(os.path.join(FIXTURE_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def fixture_json(name: str):
+    with open(os.path.join(FIXTURE_DIR, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def subjects() -> List[Dict]:
+    return fixture_json('subjects.json')
+
+
+class _Element:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FixtureDriver:
+    """Just enough of a WebDriver to serve captured body text by URL"""
+
+    def __init__(self):
+        self.current_url = 'about:blank'
+        self.pages_loaded = 0
+
+    def get(self, url: str):
+        self.current_url = url
+        self.pages_loaded += 1
+
+    def _page(self) -> str:
+        url = self.current_url.lower()
+        for city, name in REDFIN_SOLD_PAGES.items():
+            if f'/{city}/' in url and 'recently-sold' in url:
+                return fixture_text(name)
+        return ''
+
+    def find_element(self, by, value):
+        return _Element(self._page())
+
+    def find_elements(self, by, value):
+        return []
+
+    def quit(self):
+        pass
+
+
+class FixtureScraper(PropertyScraper):
+    """PropertyScraper whose pages come from fixtures, with no render waits.
+
+    Zillow is treated as blocked, so comps come from the real Redfin
+    recently-sold parsing and filtering over the captured city pages.
+    """
+
+    def __init__(self, headless=True):
+        super().__init__(headless=headless)
+        self._subjects = {s['address']: s for s in subjects()}
+
+    def start_driver(self):
+        self.driver = FixtureDriver()
+        return True
+
+    def _load_page(self, url, source, settle):
+        self.driver.get(url)
+
+    def scrape_subject(self, address):
+        return dict(self._subjects.get(address, {'address': address}), source='fixture')
+
+    def find_comparables(self, address, subject_data=None, max_comps=8):
+        return []
@@ -0,0 +1,101 @@
+"""
+Deterministic perf runs from recorded browser and Claude sessions
+
+    python -m benchmarks.replay record session.json "12 Elm St, Hartford, CT" --analysis flip
+    python -m benchmarks.replay run session.json --repeat 5
+    python -m benchmarks.replay run session.json --latency   # at the recorded page and API speed
+
+'record' runs the live pipeline (Chrome and the Claude API) once per address
+and saves every page and API exchange. 'run' replays them through the real
+scraper, analyzer and pipeline, printing per-run wall time and checking each
+result is identical to the recorded one. Exits 1 if any result differs.
+"""
+
+import argparse
+import logging
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+import benchmarks  # noqa: F401 - puts src/ on the path
+from pipeline import AnalysisPipeline, NullCache
+from rate_limiter import RequestLimiter
+from session_replay import (RecordingPropertyScraper, ReplayPropertyScraper, SessionRecording, recording_analyzer,
+                            replay_analyzer, result_digest)
+
+
+def _unthrottled() -> RequestLimiter:
+    # Replays should measure the pipeline, not the per-minute API budget
+    return RequestLimiter(max_concurrent=8, requests_per_minute=1_000_000, tokens_per_minute=1_000_000_000)
+
+
+def record(recording: SessionRecording, addresses: List[str], analysis: str) -> List[Dict]:
+    pipeline = AnalysisPipeline(scraper_factory=lambda: RecordingPropertyScraper(recording),
+                                analyzer_factory=lambda: recording_analyzer(recording), cache=NullCache())
+    runs = []
+    for address in addresses:
+        started = time.perf_counter()
+        context = pipeline.run({'address': address}, analysis=analysis)
+        run = {'address': address, 'analysis': analysis, 'digest': result_digest(context),
+               'seconds': round(time.perf_counter() - started, 3)}
+        recording.add_run(run)
+        runs.append(run)
+    recording.save()
+    return runs
+
+
+def replay(recording: SessionRecording, repeat: int = 1, reproduce_latency: bool = False) -> List[Dict]:
+    limiter = _unthrottled()
+    pipeline = AnalysisPipeline(
+        scraper_factory=lambda: ReplayPropertyScraper(recording, reproduce_latency),
+        analyzer_factory=lambda: replay_analyzer(recording, reproduce_latency, limiter=limiter),
+        cache=NullCache())
+    results = []
+    for recorded in recording.data['runs']:
+        seconds, digests = [], set()
+        for _ in range(repeat):
+            started = time.perf_counter()
+            context = pipeline.run({'address': recorded['address']}, analysis=recorded['analysis'])
+            seconds.append(time.perf_counter() - started)
+            digests.add(result_digest(context))
+        results.append({'address': recorded['address'], 'analysis': recorded['analysis'],
+                        'recorded_s': recorded.get('seconds'), 'best_s': min(seconds),
+                        'median_s': statistics.median(seconds), 'matches': digests == {recorded['digest']}})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Record or replay pipeline sessions')
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_cmd = commands.add_parser('record', help='Run live and save the session')
+    record_cmd.add_argument('recording')
+    record_cmd.add_argument('addresses', nargs='+')
+    record_cmd.add_argument('--analysis', default='comprehensive', choices=('comprehensive', 'flip'))
+    run_cmd = commands.add_parser('run', help='Replay a saved session')
+    run_cmd.add_argument('recording')
+    run_cmd.add_argument('--repeat', type=int, default=3)
+    run_cmd.add_argument('--latency', action='store_true', help='Reproduce recorded page loads and API latency')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    recording = SessionRecording(args.recording)
+    if args.command == 'record':
+        for run in record(recording, args.addresses, args.analysis):
+            print(f"{run['address']:45} {run['analysis']:13} {run['seconds']:>8.2f}s")
+        return 0
+
+    if not recording.data['runs']:
+        print(f"No recorded runs in {args.recording}")
+        return 1
+    results = replay(recording, args.repeat, args.latency)
+    print(f"{'address':45} {'analysis':13} {'recorded':>9} {'best':>9} {'median':>9}  result")
+    for r in results:
+        recorded = f"{r['recorded_s']:.2f}s" if r['recorded_s'] is not None else '-'
+        print(f"{r['address'][:45]:45} {r['analysis']:13} {recorded:>9} {r['best_s']:>8.3f}s "
+              f"{r['median_s']:>8.3f}s  {'identical' if r['matches'] else 'DIFFERS'}")
+    return 0 if all(r['matches'] for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
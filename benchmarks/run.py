@@ -0,0 +1,87 @@
+"""
+Run the benchmark suite and compare against the stored baseline
+
+    python -m benchmarks.run                  # all benchmarks vs benchmarks/baseline.json
+    python -m benchmarks.run parse filter     # only names containing 'parse' or 'filter'
+    python -m benchmarks.run --save-baseline  # record the current numbers as the new baseline
+
+Exits 1 when any benchmark's best round is slower than its baseline by more than --tolerance
+and by more than --abs-tolerance seconds. Baseline times are scaled by how long a fixed
+calibration workload takes on this host now versus when the baseline was recorded, so the
+committed baseline gates runs on any machine.
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+import benchmarks  # noqa: F401 - puts src/ on the path
+from benchmarks import end_to_end, micro  # noqa: F401 - register benchmarks
+from benchmarks.harness import calibrate, compare, load_baseline, run, save_baseline
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def _format_seconds(seconds):
+    if seconds is None:
+        return '-'
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds:.2f}s"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Realty AI Scout benchmarks')
+    parser.add_argument('names', nargs='*', help='Run only benchmarks whose name contains one of these')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown vs baseline (0.25 = 25%%)')
+    parser.add_argument('--abs-tolerance', type=float, default=50e-6,
+                        help='Slowdowns smaller than this many seconds per call never fail')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Seconds per timing round')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--min-calls', type=int, default=20, help='Add rounds until this many calls are timed')
+    args = parser.parse_args(argv)
+
+    # The scraper logs every comp at INFO
+    logging.disable(logging.INFO)
+    # Calibrated either side of the run; the faster reading is the less disturbed one
+    calibration_s = calibrate(args.min_time, args.repeats)
+    results = run(args.names, args.min_time, args.repeats, args.min_calls)
+    calibration_s = min(calibration_s, calibrate(args.min_time, args.repeats))
+    baseline, baseline_calibration_s = load_baseline(args.baseline)
+    host_factor = calibration_s / baseline_calibration_s if baseline_calibration_s else 1.0
+
+    if args.save_baseline:
+        if args.names and baseline:
+            # Keep the other benchmarks' numbers: store these in the existing baseline's host units
+            results = {name: dict(result, best_s=result['best_s'] / host_factor,
+                                  median_s=result['median_s'] / host_factor)
+                       for name, result in results.items()}
+            calibration_s = baseline_calibration_s or calibration_s
+        save_baseline(args.baseline, {**(baseline if args.names else {}), **results}, calibration_s)
+        print(f"Saved {len(results)} results to {args.baseline}")
+        return 0
+
+    if not baseline_calibration_s:
+        print('Baseline has no calibration time; comparing raw seconds (re-record with --save-baseline)')
+    print(f"Host speed vs baseline: {host_factor:.2f}x calibration time\n")
+    rows = compare(results, baseline, args.tolerance, args.abs_tolerance, host_factor)
+    print(f"{'benchmark':34} {'best':>10} {'median':>10} {'baseline':>10} {'ratio':>7}")
+    for row in rows:
+        ratio = f"{row['ratio']:.2f}x" if row['ratio'] is not None else 'new'
+        flag = '  REGRESSED' if row['regressed'] else ''
+        print(f"{row['name']:34} {_format_seconds(row['best_s']):>10} {_format_seconds(row['median_s']):>10} "
+              f"{_format_seconds(row['baseline_s']):>10} {ratio:>7}{flag}")
+    regressed = [row['name'] for row in rows if row['regressed']]
+    if regressed:
+        print(f"\n{len(regressed)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressed)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Admission control for browser sessions and Claude calls
+Each scarce resource gets a concurrency limit and a bounded wait queue with a
+maximum queue time; requests beyond that are rejected straight away with a
+retry hint so the server sheds load instead of starting more Chrome processes
+"""
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from resilience import LatencyTracker
+
+
+class Overloaded(Exception):
+    """No capacity for ``resource``; retry after ``retry_after`` seconds"""
+
+    def __init__(self, resource: str, retry_after: int, reason: str):
+        super().__init__(f"{resource} capacity exhausted ({reason}), retry after {retry_after}s")
+        self.resource = resource
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionLimiter:
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float):
+        """At most ``limit`` holders, ``max_queue`` waiters, each waiting at most ``max_wait`` seconds"""
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.waits = LatencyTracker(min_samples=1)
+        self.holds = LatencyTracker(min_samples=1)
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._stats = {'admitted': 0, 'rejected_queue_full': 0, 'rejected_timeout': 0}
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free, from the typical hold time and queue depth"""
+        hold = self.holds.percentile(self.name, 0.5) or 5.0
+        return max(1, math.ceil(hold * (self._waiting + 1) / self.limit))
+
+    def _reject(self, reason: str):
+        self._stats[f'rejected_{reason}'] += 1
+        raise Overloaded(self.name, self.retry_after(), reason.replace('_', ' '))
+
+    def acquire(self, max_wait: Optional[float] = None) -> float:
+        """Take a slot, queueing up to ``max_wait`` seconds; returns the time spent waiting"""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        started = time.monotonic()
+        with self._cond:
+            if self._active >= self.limit:
+                if self._waiting >= self.max_queue:
+                    self._reject('queue_full')
+                self._waiting += 1
+                try:
+                    if not self._cond.wait_for(lambda: self._active < self.limit, timeout=max_wait):
+                        self._reject('timeout')
+                finally:
+                    self._waiting -= 1
+            self._active += 1
+            self._stats['admitted'] += 1
+        waited = time.monotonic() - started
+        self.waits.record(self.name, waited)
+        return waited
+
+    def release(self, held: Optional[float] = None):
+        if held is not None:
+            self.holds.record(self.name, held)
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, max_wait: Optional[float] = None):
+        """Hold one slot for the duration of the block"""
+        self.acquire(max_wait)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            snapshot = dict(self._stats, limit=self.limit, active=self._active, queue_depth=self._waiting,
+                            max_queue=self.max_queue, max_wait=self.max_wait)
+        snapshot['wait_p50'] = self.waits.percentile(self.name, 0.5)
+        snapshot['wait_p95'] = self.waits.percentile(self.name, 0.95)
+        snapshot['hold_p50'] = self.holds.percentile(self.name, 0.5)
+        return snapshot
+
+
+class Admission:
+    def __init__(self, browser: Optional[AdmissionLimiter] = None, llm: Optional[AdmissionLimiter] = None):
+        """Limits from BROWSER_SESSION_LIMIT (2), LLM_CONCURRENCY_LIMIT (8),
+        ADMISSION_QUEUE_LIMIT (10) and ADMISSION_MAX_WAIT seconds (30)"""
+        max_queue = int(os.getenv('ADMISSION_QUEUE_LIMIT', '10'))
+        max_wait = float(os.getenv('ADMISSION_MAX_WAIT', '30'))
+        self.browser = browser or AdmissionLimiter(
+            'browser', int(os.getenv('BROWSER_SESSION_LIMIT', '2')), max_queue, max_wait)
+        self.llm = llm or AdmissionLimiter(
+            'llm', int(os.getenv('LLM_CONCURRENCY_LIMIT', '8')), max_queue, max_wait)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {'browser': self.browser.stats(), 'llm': self.llm.stats()}
+
+
+# Shared so every endpoint and background job draws from the same capacity
+default_admission = Admission()
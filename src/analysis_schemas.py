@@ -0,0 +1,269 @@
+"""
+Machine-readable output schemas for JSON-returning analyses
+Each schema is sent as a forced tool's input_schema so the model must produce
+it, then checked locally; only the fields that fail are sent back for repair
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from token_budget import _to_number
+
+TEXT = {'type': 'string'}
+TEXT_LIST = {'type': 'array', 'items': TEXT}
+# Free-form figures the model may give as "$350/sqft" or 350
+FIGURE = {'type': ['string', 'number']}
+DOLLARS = {'type': 'number', 'description': 'Whole US dollars, no symbols or commas'}
+RATING = {'type': 'string', 'enum': ['High', 'Medium', 'Low']}
+
+
+def _object(properties: Dict[str, Dict], required: Optional[List[str]] = None) -> Dict:
+    return {'type': 'object', 'properties': properties, 'required': required or list(properties)}
+
+
+CMA_SCHEMA = _object({
+    'executive_summary': TEXT,
+    'property_overview': _object({
+        'condition_assessment': TEXT,
+        'key_features': TEXT_LIST,
+        'property_type': TEXT,
+    }),
+    'market_analysis': _object({
+        'market_trend': TEXT,
+        'median_price_area': FIGURE,
+        'avg_price_per_sqft': FIGURE,
+        'avg_days_on_market': FIGURE,
+        'inventory_level': TEXT,
+        'market_position': TEXT,
+    }),
+    'comparable_analysis': _object({
+        'comps_used': {'type': 'array', 'items': _object({
+            'address': TEXT,
+            'sale_price': FIGURE,
+            'sale_type': TEXT,
+            'similarity_grade': TEXT,
+            'adjustments': TEXT,
+            'adjusted_value': FIGURE,
+        }, required=['address', 'adjusted_value'])},
+        'comps_excluded': TEXT_LIST,
+        'comp_quality_score': TEXT,
+    }, required=['comps_used', 'comp_quality_score']),
+    'valuation': _object({
+        'estimated_fair_market_value': DOLLARS,
+        'value_range_low': DOLLARS,
+        'value_range_high': DOLLARS,
+        'price_vs_value': TEXT,
+        'confidence_level': TEXT,
+        'methodology': TEXT,
+    }),
+    'pricing_strategy': _object({
+        'suggested_list_price': DOLLARS,
+        'pricing_rationale': TEXT,
+        'days_to_sell_estimate': FIGURE,
+    }),
+    'investment_analysis': _object({
+        'rental_potential': FIGURE,
+        'cap_rate_estimate': FIGURE,
+        'appreciation_outlook': TEXT,
+        'investment_grade': TEXT,
+    }),
+    'recommendations': TEXT_LIST,
+    'risk_factors': TEXT_LIST,
+    'data_quality_notes': TEXT,
+})
+
+# Flip dollar figures stay strings ("$350,000") - the flip view renders them verbatim
+FLIP_SCHEMA = _object({
+    'flip_score': FIGURE,
+    'recommendation': {'type': 'string', 'enum': ['strong_buy', 'buy', 'consider', 'pass']},
+    'arv_assessment': _object({
+        'estimated_arv': FIGURE,
+        'arv_per_sqft': FIGURE,
+        'arv_methodology': TEXT,
+        'arv_confidence': RATING,
+    }),
+    'acquisition_analysis': _object({
+        'max_allowable_offer': FIGURE,
+        'is_asking_price_viable': TEXT,
+        'negotiation_target': TEXT,
+    }),
+    'renovation_scope': _object({
+        'estimated_cost_low': FIGURE,
+        'estimated_cost_high': FIGURE,
+        'priority_items': TEXT_LIST,
+        'timeline_months': FIGURE,
+        'scope_level': TEXT,
+    }),
+    'financial_summary': _object({
+        'total_cost_in': FIGURE,
+        'expected_arv': FIGURE,
+        'expected_profit': FIGURE,
+        'best_case_profit': FIGURE,
+        'worst_case_profit': FIGURE,
+        'expected_roi': FIGURE,
+        'cash_needed': FIGURE,
+    }),
+    'deal_breakers': TEXT_LIST,
+    'market_factors': TEXT,
+    'risks': TEXT_LIST,
+    'exit_strategies': TEXT_LIST,
+})
+
+# The six sections analyze_property_value asks for
+PROPERTY_VALUE_SCHEMA = _object({
+    'market_research': _object({
+        'market_trend': TEXT,
+        'avg_days_on_market': FIGURE,
+        'price_per_sqft_trend': TEXT,
+        'inventory_level': TEXT,
+    }),
+    'property_valuation': _object({
+        'estimated_market_value': DOLLARS,
+        'value_range_low': DOLLARS,
+        'value_range_high': DOLLARS,
+        'price_per_sqft': FIGURE,
+        'confidence_level': TEXT,
+    }),
+    'comparable_analysis': _object({
+        'comps': {'type': 'array', 'items': _object({
+            'address': TEXT,
+            'grade': {'type': 'string', 'enum': ['A', 'B', 'C']},
+            'adjustments': TEXT,
+        }, required=['address', 'grade'])},
+        'best_comparable': TEXT,
+        'worst_comparable': TEXT,
+    }, required=['comps']),
+    'market_strategy': _object({
+        'suggested_list_price': DOLLARS,
+        'pricing_rationale': TEXT,
+        'best_time_to_sell': TEXT,
+        'marketing_recommendations': TEXT_LIST,
+    }),
+    'investment_analysis': _object({
+        'rental_potential': FIGURE,
+        'appreciation_outlook': TEXT,
+        'risk_factors': TEXT_LIST,
+    }),
+    'property_insights': _object({
+        'condition_assessment': TEXT,
+        'upgrade_recommendations': TEXT_LIST,
+        'red_flags': TEXT_LIST,
+    }),
+})
+
+SCHEMAS = {
+    'comprehensive': ('record_cma', 'Record the completed comparative market analysis', CMA_SCHEMA),
+    'flip': ('record_flip_analysis', 'Record the completed flip analysis', FLIP_SCHEMA),
+    'property_value': ('record_property_value', 'Record the completed property valuation', PROPERTY_VALUE_SCHEMA),
+}
+
+_JSON_TYPES = {
+    'object': dict, 'array': list, 'string': str, 'boolean': bool,
+    'number': (int, float), 'integer': int, 'null': type(None),
+}
+
+
+def tool_for(analysis_type: Optional[str], fields: Optional[List[str]] = None) -> Optional[Dict]:
+    """Tool definition for ``analysis_type``, optionally restricted to top-level ``fields`` for a repair"""
+    if analysis_type not in SCHEMAS:
+        return None
+    name, description, schema = SCHEMAS[analysis_type]
+    if fields:
+        schema = dict(schema, properties={f: schema['properties'][f] for f in fields},
+                      required=[f for f in fields if f in schema['required']])
+        description = f"Record corrected values for: {', '.join(fields)}"
+    return {'name': name, 'description': description, 'input_schema': schema}
+
+
+def _type_ok(value: Any, expected) -> bool:
+    for name in ([expected] if isinstance(expected, str) else expected):
+        if name in ('number', 'integer') and isinstance(value, bool):
+            continue
+        if isinstance(value, _JSON_TYPES[name]):
+            return True
+    return False
+
+
+def coerce(value: Any, schema: Dict) -> Any:
+    """Fix trivially wrong types locally (e.g. "$255,000" where a number is required)"""
+    expected = schema.get('type')
+    if expected == 'number' and isinstance(value, str) and _to_number(value) is not None:
+        return _to_number(value)
+    if expected == 'object' and isinstance(value, dict):
+        props = schema.get('properties', {})
+        return {k: coerce(v, props[k]) if k in props else v for k, v in value.items()}
+    if expected == 'array' and isinstance(value, list) and 'items' in schema:
+        return [coerce(v, schema['items']) for v in value]
+    return value
+
+
+def validate(value: Any, schema: Dict, path: Tuple = ()) -> List[Tuple[Tuple, str]]:
+    """(path, message) for every schema violation in ``value``"""
+    expected = schema.get('type')
+    if expected and not _type_ok(value, expected):
+        return [(path, f"expected {expected}, got {type(value).__name__}")]
+    errors = []
+    if 'enum' in schema and value not in schema['enum']:
+        errors.append((path, f"must be one of {schema['enum']}"))
+    if isinstance(value, dict):
+        for key in schema.get('required', []):
+            if key not in value or value[key] in (None, ''):
+                errors.append((path + (key,), 'missing'))
+        for key, sub in schema.get('properties', {}).items():
+            if key in value and value[key] not in (None, ''):
+                errors.extend(validate(value[key], sub, path + (key,)))
+    if isinstance(value, list) and 'items' in schema:
+        for i, item in enumerate(value):
+            errors.extend(validate(item, schema['items'], path + (i,)))
+    return errors
+
+
+def _value_range_check(section: str, value_key: str):
+    """Check that ``section``'s value_range_low <= ``value_key`` <= value_range_high"""
+    def check(analysis: Dict) -> List[Tuple[Tuple, str]]:
+        values = analysis.get(section)
+        if not isinstance(values, dict):
+            return []
+        low, value, high = (values.get(k) for k in ('value_range_low', value_key, 'value_range_high'))
+        if all(isinstance(v, (int, float)) for v in (low, value, high)) and not low <= value <= high:
+            return [((section,), f"value_range_low <= {value_key} <= value_range_high must hold")]
+        return []
+    return check
+
+
+# Cross-field checks that a JSON schema can't express
+CHECKS = {
+    'comprehensive': [_value_range_check('valuation', 'estimated_fair_market_value')],
+    'property_value': [_value_range_check('property_valuation', 'estimated_market_value')],
+}
+
+
+def check_analysis(analysis_type: str, analysis: Any) -> Tuple[Any, List[Tuple[Tuple, str]]]:
+    """Coerce and validate an analysis; returns (coerced analysis, errors)"""
+    schema = SCHEMAS[analysis_type][2]
+    analysis = coerce(analysis, schema)
+    errors = validate(analysis, schema)
+    if not errors:
+        for check in CHECKS.get(analysis_type, []):
+            errors.extend(check(analysis))
+    return analysis, errors
+
+
+def invalid_fields(errors: List[Tuple[Tuple, str]]) -> List[str]:
+    """Sorted top-level fields touched by ``errors``"""
+    return sorted({str(path[0]) for path, _ in errors if path})
+
+
+def describe_errors(errors: List[Tuple[Tuple, str]]) -> str:
+    return '\n'.join(f"- {'.'.join(str(p) for p in path) or '(root)'}: {message}" for path, message in errors)
+
+
+def repair_prompt(prompt: str, analysis: Dict, errors: List[Tuple[Tuple, str]]) -> str:
+    """Original prompt plus the invalid fields, their current values and what is wrong"""
+    fields = invalid_fields(errors)
+    current = {f: analysis.get(f) for f in fields} if isinstance(analysis, dict) else {}
+    return (f"{prompt}\n\n"
+            f"YOUR PREVIOUS ANSWER IS COMPLETE EXCEPT THESE FIELDS, WHICH FAILED VALIDATION:\n"
+            f"{describe_errors(errors)}\n\n"
+            f"Previous values: {json.dumps(current, separators=(',', ':'), default=str)}\n\n"
+            f"Return corrected values for only: {', '.join(fields)}")
@@ -3,10 +3,10 @@ Realty AI Scout - Main Flask Application
 AI-powered real estate analysis tool for property valuation and market insights
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, make_response, render_template, request, jsonify, stream_with_context
+import functools
 import os
 import sys
-import json
 import time
 from dotenv import load_dotenv
 
@@ -19,70 +19,34 @@ load_dotenv()
 app = Flask(__name__, template_folder='../templates', static_folder='../static')
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-key-change-in-production')
 
+from pipeline import AnalysisPipeline
+from backends import backend_name, create, factory_for
+from jobs import JobManager, JobQueueFull
+from admission import Overloaded, default_admission
+from portfolio import parse_rows, run_portfolio, to_ndjson
+from model_router import default_router
+from profiling import RequestProfiler
+import tracing
 
-def try_scrape(address):
-    """Attempt to scrape property data. Returns scraped data or empty structure."""
-    try:
-        from selenium_scraper import PropertyScraper
-        scraper = PropertyScraper(headless=True)
-        if scraper.start_driver():
-            print(f"Scraping data for: {address}")
-            scraped_data = scraper.scrape_property_and_comps(address)
-            scraper.close_driver()
-            print(f"Scraping done. Property: {bool(scraped_data.get('property'))}, "
-                  f"Comps: {len(scraped_data.get('comparables', []))}")
-            return scraped_data
-    except Exception as e:
-        print(f"Scraping failed: {e}")
-    return {'property': {'address': address}, 'comparables': []}
-
-
-def build_property_data(req_json, scraped_property=None):
-    """Merge manual input with scraped data. Manual input takes priority."""
-    base = scraped_property or {}
-
-    # Manual fields override scraped data when provided
-    manual_fields = {
-        'price': req_json.get('price'),
-        'beds': req_json.get('beds'),
-        'baths': req_json.get('baths'),
-        'sqft': req_json.get('sqft'),
-        'year_built': req_json.get('year_built'),
-        'lot_size': req_json.get('lot_size'),
-        'basement': req_json.get('basement'),
-        'sqft_finished_basement': req_json.get('sqft_finished_basement'),
-        'property_type': req_json.get('property_type'),
-        'condition': req_json.get('condition'),
-    }
-
-    for key, val in manual_fields.items():
-        if val is not None and val != '' and val != 'Unknown':
-            base[key] = val
-
-    # Calculate total living sqft if we have both
-    if base.get('sqft') and base.get('sqft_finished_basement'):
-        try:
-            above = int(str(base['sqft']).replace(',', ''))
-            below = int(str(base['sqft_finished_basement']).replace(',', ''))
-            base['sqft_above_grade'] = above
-            base['total_living_sqft'] = above + below
-        except (ValueError, TypeError):
-            pass
-
-    base['address'] = req_json.get('address', base.get('address', 'Unknown'))
-    base['data_source'] = 'manual' if any(v for v in manual_fields.values()) else 'scraped'
-    return base
+# Stage results (scrapes, comps, local valuation, LLM output) shared by every endpoint; see configure_backends()
+pipeline = None
+
+# Overall time budget for one analysis request; Claude gets whatever scraping leaves
+ANALYZE_DEADLINE_SECONDS = float(os.getenv('ANALYZE_DEADLINE_SECONDS', '180'))
+MIN_LLM_SECONDS = 20.0
+
+
+def remaining_deadline(started):
+    """Seconds left for the Claude call, never less than MIN_LLM_SECONDS"""
+    return max(MIN_LLM_SECONDS, ANALYZE_DEADLINE_SECONDS - (time.time() - started))
 
 
 def parse_claude_json(content):
-    """Extract JSON from Claude's response text."""
-    start_idx = content.find('{')
-    end_idx = content.rfind('}') + 1
-    if start_idx >= 0 and end_idx > start_idx:
-        try:
-            return json.loads(content[start_idx:end_idx])
-        except json.JSONDecodeError:
-            pass
+    """Extract JSON from Claude's response text, repairing truncated output."""
+    from json_stream import parse_json_text
+    parsed = parse_json_text(content)
+    if parsed:
+        return parsed
     return {"raw_analysis": content}
 
 
@@ -92,99 +56,287 @@ def index():
     return render_template('index.html')
 
 
+def run_comprehensive(data, on_stage=None, started=None):
+    """Full CMA for one request body; returns (payload, http_status)"""
+    started = started or time.time()
+    address = data.get('address')
+    # Scrapes and local valuation are reused from any earlier analysis of this address
+    context = pipeline.run(data, analysis='comprehensive', deadline=lambda: remaining_deadline(started),
+                           on_stage=on_stage)
+    property_data = context['property_data']
+    analysis_result = context['result']
+
+    print(f"Analysis with data source: {property_data.get('data_source')}")
+    print(f"Property: price={property_data.get('price')}, sqft={property_data.get('sqft')}, "
+          f"beds={property_data.get('beds')}, basement={property_data.get('basement')}")
+
+    if analysis_result.get('success'):
+        analysis_json = parse_claude_json(analysis_result.get('content', ''))
+        return {
+            'address': address,
+            'status': 'success',
+            'property_data': property_data,
+            'comparables': context['comparables'],
+            'local_valuation': context['local_valuation'],
+            'analysis': analysis_json,
+            'stage_timings': context['timings'],
+            'timestamp': time.time()
+        }, 200
+    return {
+        'error': f'Claude analysis failed: {analysis_result.get("error", "Unknown error")}',
+        'address': address,
+        'local_valuation': context['local_valuation'],
+    }, 500
+
+
+def run_flip(data, on_stage=None, started=None):
+    """Flip analysis for one request body; returns (payload, http_status)"""
+    started = started or time.time()
+    address = data.get('address')
+    context = pipeline.run(data, analysis='flip', deadline=lambda: remaining_deadline(started), on_stage=on_stage)
+    property_data = context['property_data']
+    flip_result = context['result']
+
+    print(f"Flip analysis with data source: {property_data.get('data_source')}")
+    print(f"Property: price={property_data.get('price')}, sqft={property_data.get('sqft')}, "
+          f"beds={property_data.get('beds')}, basement={property_data.get('basement')}")
+
+    if flip_result.get('success'):
+        analysis_json = parse_claude_json(flip_result.get('content', ''))
+        return {
+            'address': address,
+            'status': 'success',
+            'property_data': property_data,
+            'comparables': context['comparables'],
+            'flip_analysis': analysis_json,
+            'flip_metrics': flip_result.get('flip_metrics', {}),
+            'flip_simulation': flip_result.get('flip_simulation'),
+            'local_valuation': context['local_valuation'],
+            'stage_timings': context['timings'],
+            'timestamp': time.time()
+        }, 200
+    return {
+        'error': f'Flip analysis failed: {flip_result.get("error", "Unknown")}',
+        'flip_metrics': flip_result.get('flip_metrics', {}),
+        'flip_simulation': flip_result.get('flip_simulation'),
+        'local_valuation': context['local_valuation'],
+        'property_data': property_data,
+    }, 500
+
+
+ANALYSES = {'comprehensive': run_comprehensive, 'flip': run_flip}
+
+
+def run_analysis(data, analysis, on_stage=None):
+    """Job runner: dispatch to the analysis by name"""
+    return ANALYSES[analysis](data, on_stage=on_stage)
+
+
+# Background jobs free the web worker while scraping and Claude run; see configure_backends()
+jobs = None
+
+
+def configure_backends(scraper=None, analyzer=None, cache=None, store=None):
+    """Rebuild the pipeline and job manager on the named backends (default: *_BACKEND env vars)"""
+    global pipeline, jobs
+    pipeline = AnalysisPipeline(scraper_factory=factory_for('scraper', scraper),
+                                analyzer_factory=factory_for('analyzer', analyzer),
+                                cache=create('cache', cache))
+    if jobs is not None:
+        jobs.shutdown(wait=False)
+    jobs = JobManager(run_analysis, store_factory=factory_for('store', store))
+
+
+configure_backends()
+
+# Opt-in via X-Profile: <PROFILE_TOKEN> (X-Profile-Mode: cprofile|sample) or PROFILE_SAMPLE_RATE
+profiler = RequestProfiler()
+
+
+def profiled(view):
+    """Run the view under the request profiler when asked to; the response names the saved profile"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        body = request.get_json(silent=True) or {}
+        metadata = {'method': request.method, 'path': request.path, 'address': body.get('address'),
+                    'remote_addr': request.remote_addr}
+        with profiler.session(request.headers.get('X-Profile'), request.headers.get('X-Profile-Mode'),
+                              metadata) as profile_id:
+            response = make_response(view(*args, **kwargs))
+            metadata['status'] = response.status_code
+        if profile_id:
+            response.headers['X-Profile-Id'] = profile_id
+        return response
+    return wrapper
+
+
+def wants_timings():
+    """Per-request span timings are returned with ?debug=timings or an X-Debug-Timings: 1 header"""
+    return request.args.get('debug') == 'timings' or request.headers.get('X-Debug-Timings') == '1'
+
+
+def overloaded_response(error):
+    """Fast 503 telling the client when to come back"""
+    return jsonify({'error': str(error), 'resource': error.resource}), 503, {'Retry-After': str(error.retry_after)}
+
+
 @app.route('/analyze', methods=['POST'])
+@profiled
 def analyze_property():
     """Analyze property and return insights"""
+    started = time.time()
     try:
-        data = request.json
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
         address = data.get('address')
         if not address:
             return jsonify({'error': 'Address is required'}), 400
 
-        from claude_analyzer import ClaudeAnalyzer
-        analyzer = ClaudeAnalyzer()
-
-        # Try scraping, fall back to Claude-only analysis
-        scraped_data = try_scrape(address)
-
-        # Merge manual input with scraped data
-        property_data = build_property_data(data, scraped_data.get('property'))
-        scraped_data['property'] = property_data
-
-        print(f"Analysis with data source: {property_data.get('data_source')}")
-        print(f"Property: price={property_data.get('price')}, sqft={property_data.get('sqft')}, "
-              f"beds={property_data.get('beds')}, basement={property_data.get('basement')}")
-
-        analysis_result = analyzer.comprehensive_property_analysis(scraped_data)
-
-        if analysis_result.get('success'):
-            analysis_json = parse_claude_json(analysis_result.get('content', ''))
-            return jsonify({
-                'address': address,
-                'status': 'success',
-                'property_data': property_data,
-                'comparables': scraped_data.get('comparables', []),
-                'analysis': analysis_json,
-                'timestamp': time.time()
-            })
-        else:
-            return jsonify({
-                'error': f'Claude analysis failed: {analysis_result.get("error", "Unknown error")}',
-                'address': address,
-            }), 500
+        with tracing.trace() as request_trace:
+            payload, status = run_comprehensive(data, started=started)
+        if wants_timings():
+            payload['trace'] = request_trace.to_dict()
+        return jsonify(payload), status
 
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         print(f"Pipeline error: {e}")
         return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
 
 
 @app.route('/flip-analysis', methods=['POST'])
+@profiled
 def flip_analysis():
     """Analyze property for flip/investment potential"""
+    started = time.time()
     try:
-        data = request.json
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
         address = data.get('address')
         if not address:
             return jsonify({'error': 'Address is required'}), 400
 
-        from claude_analyzer import ClaudeAnalyzer
-        analyzer = ClaudeAnalyzer()
-
-        # Try scraping, fall back to Claude-only analysis
-        scraped_data = try_scrape(address)
-
-        # Merge manual input with scraped data
-        property_data = build_property_data(data, scraped_data.get('property'))
-        comparables = scraped_data.get('comparables', [])
-
-        print(f"Flip analysis with data source: {property_data.get('data_source')}")
-        print(f"Property: price={property_data.get('price')}, sqft={property_data.get('sqft')}, "
-              f"beds={property_data.get('beds')}, basement={property_data.get('basement')}")
-
-        flip_result = analyzer.analyze_flip_potential(property_data, comparables)
-
-        if flip_result.get('success'):
-            analysis_json = parse_claude_json(flip_result.get('content', ''))
-            return jsonify({
-                'address': address,
-                'status': 'success',
-                'property_data': property_data,
-                'comparables': comparables,
-                'flip_analysis': analysis_json,
-                'flip_metrics': flip_result.get('flip_metrics', {}),
-                'timestamp': time.time()
-            })
-        else:
-            return jsonify({
-                'error': f'Flip analysis failed: {flip_result.get("error", "Unknown")}',
-                'flip_metrics': flip_result.get('flip_metrics', {}),
-                'property_data': property_data,
-            }), 500
+        with tracing.trace() as request_trace:
+            payload, status = run_flip(data, started=started)
+        if wants_timings():
+            payload['trace'] = request_trace.to_dict()
+        return jsonify(payload), status
 
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         return jsonify({'error': f'Flip analysis failed: {str(e)}'}), 500
 
 
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue an analysis (analysis_type 'comprehensive' or 'flip') and return its id immediately"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    if not data.get('address'):
+        return jsonify({'error': 'Address is required'}), 400
+    analysis = data.get('analysis_type') or 'comprehensive'
+    if analysis not in ANALYSES:
+        return jsonify({'error': f'Unknown analysis_type: {analysis}'}), 400
+
+    try:
+        job = jobs.submit(data, analysis)
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '30'}
+    return jsonify({'job_id': job['id'], 'status': job['status'],
+                    'status_url': f"/jobs/{job['id']}"}), 202, {'Location': f"/jobs/{job['id']}"}
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status, per-stage progress and, once finished, the analysis response"""
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+
+@app.route('/portfolio', methods=['POST'])
+def portfolio():
+    """Analyze many properties from a CSV, NDJSON or JSON body, streaming one NDJSON line per property"""
+    analysis = request.args.get('analysis_type', 'comprehensive')
+    if analysis not in ANALYSES:
+        return jsonify({'error': f'Unknown analysis_type: {analysis}'}), 400
+
+    upload = request.files.get('file')
+    if upload:
+        stream = upload.stream
+        extension = os.path.splitext(upload.filename.lower())[1]
+        content_type = {'.json': 'application/json', '.ndjson': 'application/x-ndjson',
+                        '.jsonl': 'application/x-ndjson'}.get(extension, 'text/csv')
+    else:
+        stream, content_type = request.stream, request.content_type
+    try:
+        rows = parse_rows(stream, content_type)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    results = run_portfolio(rows, ANALYSES[analysis])
+    return Response(stream_with_context(to_ndjson(results)), mimetype='application/x-ndjson')
+
+
+@app.route('/capacity', methods=['GET'])
+def capacity():
+    """Browser/Claude slot usage, queue depth and wait times, plus the job backlog"""
+    return jsonify({'admission': default_admission.stats(), 'jobs': jobs.stats()})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition: span latency histograms plus Claude, admission and job gauges"""
+    router_stats = default_router.stats()
+    admission_stats = default_admission.stats()
+    lines = tracing.registry.render()
+    lines += tracing.gauge_lines('realty_llm_requests', 'Claude requests per model tier',
+                                 [({'tier': tier}, s['requests']) for tier, s in router_stats.items()])
+    lines += tracing.gauge_lines('realty_llm_tokens', 'Claude tokens per model tier',
+                                 [({'tier': tier, 'direction': direction}, s[f'{direction}_tokens'])
+                                  for tier, s in router_stats.items() for direction in ('input', 'output')])
+    lines += tracing.gauge_lines('realty_llm_cost_usd', 'Claude spend per model tier',
+                                 [({'tier': tier}, s['cost_usd']) for tier, s in router_stats.items()])
+    lines += tracing.gauge_lines('realty_llm_escalations', 'Requests escalated off each tier',
+                                 [({'tier': tier}, s['escalations']) for tier, s in router_stats.items()])
+    lines += tracing.gauge_lines('realty_admission_active', 'Slots in use',
+                                 [({'resource': r}, s['active']) for r, s in admission_stats.items()])
+    lines += tracing.gauge_lines('realty_admission_queue_depth', 'Requests waiting for a slot',
+                                 [({'resource': r}, s['queue_depth']) for r, s in admission_stats.items()])
+    lines += tracing.gauge_lines('realty_admission_rejected', 'Requests turned away with 503',
+                                 [({'resource': r, 'reason': reason}, s[f'rejected_{reason}'])
+                                  for r, s in admission_stats.items() for reason in ('queue_full', 'timeout')])
+    lines += tracing.gauge_lines('realty_admission_wait_seconds', 'Recent time spent queued for a slot',
+                                 [({'resource': r, 'quantile': q}, s[f'wait_p{q}'])
+                                  for r, s in admission_stats.items() for q in ('50', '95')])
+    lines += tracing.gauge_lines('realty_jobs_pending', 'Background jobs queued or running',
+                                 [({}, jobs.stats()['pending'])])
+    lines += tracing.gauge_lines('realty_scrape_cache', 'Property scrape lookups and background refreshes',
+                                 [({'result': k}, v) for k, v in sorted(pipeline.scrape_stats.items())])
+    cache_stats = pipeline.cache.stats()
+    backend = cache_stats.pop('backend', 'none')
+    lines += tracing.gauge_lines('realty_cache', 'Stage cache events and entries by backend',
+                                 [({'backend': backend, 'event': k}, v) for k, v in sorted(cache_stats.items())
+                                  if v is not None])
+    if backend_name('scraper') == 'pooled':
+        from browser_pool import pool_stats
+        browser_stats = pool_stats()
+        recycles = browser_stats.pop('recycles', {})
+        lines += tracing.gauge_lines('realty_browser_pool', 'Shared browsers, tabs in use and tab leases',
+                                     [({'stat': k}, v) for k, v in sorted(browser_stats.items())])
+        lines += tracing.gauge_lines('realty_browser_recycles', 'Browsers replaced, by watchdog reason',
+                                     [({'reason': k}, v) for k, v in sorted(recycles.items())])
+    lines += tracing.gauge_lines('realty_single_flight', 'Coalesced pipeline stage computations',
+                                 [({'role': k}, v) for k, v in pipeline.flight.stats().items()])
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
 if __name__ == '__main__':
     print("Starting Realty AI Scout on http://localhost:8000")
     print("Access at: http://localhost:8000")
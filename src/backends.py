@@ -0,0 +1,347 @@
+"""
+Pluggable backends for scraping, analysis, stage caching and result storage
+Each kind has named implementations selected at startup (SCRAPER_BACKEND,
+ANALYZER_BACKEND, CACHE_BACKEND, STORE_BACKEND). In-memory fakes and
+record/replay wrappers let tests and benchmarks run with no browser or network;
+the session-record/session-replay backends capture whole browser and API
+sessions instead (see session_replay)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from cache_backends import RedisCache, SQLiteCache
+from pipeline import NullCache, StageCache, canonical_key
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('scraper', 'analyzer', 'cache', 'store')
+DEFAULTS = {'scraper': 'selenium', 'analyzer': 'claude', 'cache': 'memory', 'store': 'sqlite'}
+REGISTRY: Dict[str, Dict[str, Callable[[], Any]]] = {kind: {} for kind in KINDS}
+
+
+def register(kind: str, name: str):
+    """Register a zero-argument constructor as backend ``name`` of ``kind``"""
+    def decorator(factory):
+        REGISTRY[kind][name] = factory
+        return factory
+    return decorator
+
+
+def backend_name(kind: str, name: Optional[str] = None) -> str:
+    """``name``, else <KIND>_BACKEND from the environment, else the default"""
+    return name or os.getenv(f'{kind.upper()}_BACKEND') or DEFAULTS[kind]
+
+
+def create(kind: str, name: Optional[str] = None):
+    """A new instance of the configured backend of ``kind``"""
+    name = backend_name(kind, name)
+    try:
+        factory = REGISTRY[kind][name]
+    except KeyError:
+        raise ValueError(f"Unknown {kind} backend '{name}' (available: {', '.join(sorted(REGISTRY[kind]))})")
+    return factory()
+
+
+def factory_for(kind: str, name: Optional[str] = None) -> Callable[[], Any]:
+    """Constructor for the configured backend, resolved now so later env changes don't switch it"""
+    name = backend_name(kind, name)
+    if name not in REGISTRY[kind]:
+        raise ValueError(f"Unknown {kind} backend '{name}' (available: {', '.join(sorted(REGISTRY[kind]))})")
+    return lambda: create(kind, name)
+
+
+# ============================================================
+# Record / replay
+# ============================================================
+
+class Cassette:
+    def __init__(self, path: str):
+        """JSON file of recorded backend results, written through on every put"""
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self._entries = json.load(f)
+        except FileNotFoundError:
+            self._entries = {}
+
+    def get(self, key: str):
+        with self._lock:
+            return self._entries.get(key)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key: str, value):
+        with self._lock:
+            self._entries[key] = value
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self._entries, f, indent=1, sort_keys=True, default=str)
+            os.replace(tmp_path, self.path)
+
+
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def cassette(kind: str) -> Cassette:
+    """The shared cassette for ``kind`` under BACKEND_CASSETTE_DIR (default ./cassettes)"""
+    path = os.path.join(os.getenv('BACKEND_CASSETTE_DIR', 'cassettes'), f'{kind}.json')
+    with _cassettes_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+
+class RecordingScraper:
+    """Scrapes with the real scraper and records each result by canonical address"""
+
+    def __init__(self, inner, tape: Cassette):
+        self.inner = inner
+        self.tape = tape
+
+    def start_driver(self):
+        return self.inner.start_driver()
+
+    def close_driver(self):
+        self.inner.close_driver()
+
+    def scrape_subject(self, address):
+        result = self.inner.scrape_subject(address)
+        self.tape.put(f'subject|{canonical_key(address)}', result)
+        return result
+
+    def scrape_comps(self, address, subject_data=None, comp_pool=None):
+        result = self.inner.scrape_comps(address, subject_data=subject_data, comp_pool=comp_pool)
+        self.tape.put(f'comps|{canonical_key(address)}', result)
+        return result
+
+
+class ReplayScraper:
+    """Serves recorded scrapes; addresses never recorded scrape as empty"""
+
+    def __init__(self, tape: Cassette):
+        self.tape = tape
+
+    def start_driver(self):
+        return True
+
+    def close_driver(self):
+        pass
+
+    def scrape_subject(self, address):
+        return self.tape.get(f'subject|{canonical_key(address)}') or {}
+
+    def scrape_comps(self, address, subject_data=None, comp_pool=None):
+        return self.tape.get(f'comps|{canonical_key(address)}') or []
+
+
+def _analysis_key(analysis: str, property_data: Dict) -> str:
+    return f"{analysis}|{canonical_key(property_data.get('address'))}"
+
+
+class RecordingAnalyzer:
+    """Analyzes with the real analyzer and records each successful result"""
+
+    def __init__(self, inner, tape: Cassette):
+        self.inner = inner
+        self.tape = tape
+
+    def _record(self, key: str, result: Dict) -> Dict:
+        if result.get('success'):
+            self.tape.put(key, result)
+        return result
+
+    def comprehensive_property_analysis(self, scraped_data: Dict, **kwargs) -> Dict:
+        return self._record(_analysis_key('comprehensive', scraped_data.get('property', {})),
+                            self.inner.comprehensive_property_analysis(scraped_data, **kwargs))
+
+    def analyze_flip_potential(self, property_data: Dict, comparables: List[Dict], **kwargs) -> Dict:
+        return self._record(_analysis_key('flip', property_data),
+                            self.inner.analyze_flip_potential(property_data, comparables, **kwargs))
+
+
+class ReplayAnalyzer:
+    """Serves recorded analyses; anything not recorded fails like an API error would"""
+
+    def __init__(self, tape: Cassette):
+        self.tape = tape
+
+    def _replay(self, key: str) -> Dict:
+        recorded = self.tape.get(key)
+        if recorded is None:
+            return {'success': False, 'error': f'No recorded analysis for {key}'}
+        return recorded
+
+    def comprehensive_property_analysis(self, scraped_data: Dict, **kwargs) -> Dict:
+        return self._replay(_analysis_key('comprehensive', scraped_data.get('property', {})))
+
+    def analyze_flip_potential(self, property_data: Dict, comparables: List[Dict], **kwargs) -> Dict:
+        return self._replay(_analysis_key('flip', property_data))
+
+
+# ============================================================
+# In-memory fakes
+# ============================================================
+
+def _seed(address: str) -> int:
+    return int(hashlib.sha1(canonical_key(address).encode()).hexdigest()[:8], 16)
+
+
+class FakeScraper:
+    """Deterministic synthetic subject and comps derived from the address - no browser"""
+
+    def start_driver(self):
+        return True
+
+    def close_driver(self):
+        pass
+
+    def scrape_subject(self, address):
+        seed = _seed(address)
+        sqft = 1100 + seed % 1400
+        return {
+            'source': 'fake',
+            'address': address,
+            'price': str(round(sqft * (150 + seed % 60), -3)),
+            'beds': 2 + seed % 3,
+            'baths': 1 + (seed // 7) % 3 * 0.5,
+            'sqft': sqft,
+            'year_built': 1900 + seed % 120,
+            'lot_size': '0.25 acres',
+        }
+
+    def scrape_comps(self, address, subject_data=None, comp_pool=None):
+        subject = subject_data or self.scrape_subject(address)
+        sqft = int(str(subject.get('sqft') or 1500).replace(',', ''))
+        seed = _seed(address)
+        comps = []
+        for i in range(6):
+            comp_sqft = int(sqft * (0.85 + 0.05 * i))
+            comps.append({
+                'address': f"{10 + (seed + i * 37) % 400} Comp St",
+                'sale_price': str(round(comp_sqft * (155 + (seed + i) % 40), -3)),
+                'sale_date': '2026-01-15',
+                'sqft': comp_sqft,
+                'beds': subject.get('beds'),
+                'baths': subject.get('baths'),
+                'year_built': subject.get('year_built'),
+                'distance_miles': round(0.2 + 0.15 * i, 2),
+                'sale_type': 'standard',
+                'source': 'fake',
+            })
+        return comps
+
+
+class FakeAnalyzer:
+    """Canned analyses built around the local valuation - no network, no tokens"""
+
+    @staticmethod
+    def _result(analysis: Dict) -> Dict:
+        return {'success': True, 'content': json.dumps(analysis), 'model': 'fake', 'tier': 'fake',
+                'usage': {'input_tokens': 0, 'output_tokens': 0}}
+
+    def comprehensive_property_analysis(self, scraped_data: Dict, on_section=None, reference_valuation=None,
+                                        **kwargs) -> Dict:
+        valuation = reference_valuation or {}
+        fmv = valuation.get('estimated_fair_market_value') or 0
+        analysis = {
+            'executive_summary': 'Synthetic analysis from the fake analyzer backend.',
+            'valuation': {
+                'estimated_fair_market_value': fmv,
+                'value_range_low': valuation.get('value_range_low') or fmv,
+                'value_range_high': valuation.get('value_range_high') or fmv,
+                'confidence_level': valuation.get('confidence_level') or 'Low',
+                'methodology': 'Local adjusted comps',
+            },
+            'recommendations': [],
+            'risk_factors': [],
+        }
+        if on_section:
+            for key, value in analysis.items():
+                on_section(key, value)
+        return self._result(analysis)
+
+    def analyze_flip_potential(self, property_data: Dict, comparables: List[Dict], on_section=None,
+                               reference_valuation=None, **kwargs) -> Dict:
+        arv = (reference_valuation or {}).get('estimated_fair_market_value') or 0
+        analysis = {
+            'flip_score': 50,
+            'recommendation': 'consider',
+            'arv_assessment': {'estimated_arv': arv, 'arv_confidence': 'Low'},
+            'deal_breakers': [],
+            'risks': [],
+        }
+        if on_section:
+            for key, value in analysis.items():
+                on_section(key, value)
+        return dict(self._result(analysis), flip_metrics={})
+
+
+# ============================================================
+# Registrations
+# ============================================================
+
+def _selenium_scraper():
+    from selenium_scraper import PropertyScraper
+    return PropertyScraper(headless=True)
+
+
+def _pooled_scraper():
+    from browser_pool import PooledPropertyScraper
+    return PooledPropertyScraper(headless=True)
+
+
+def _claude_analyzer():
+    from claude_analyzer import ClaudeAnalyzer
+    return ClaudeAnalyzer()
+
+
+def _session_backend(kind: str, mode: str):
+    """Real PropertyScraper / ClaudeAnalyzer recording to, or replaying from, the shared session recording"""
+    import session_replay
+    recording = session_replay.shared_recording()
+    if mode == 'record':
+        if kind == 'scraper':
+            return session_replay.RecordingPropertyScraper(recording)
+        return session_replay.recording_analyzer(recording)
+    if kind == 'scraper':
+        return session_replay.ReplayPropertyScraper(recording, session_replay.replay_latency())
+    return session_replay.replay_analyzer(recording, session_replay.replay_latency())
+
+
+def _result_store(path: Optional[str] = None):
+    from result_store import ResultStore
+    return ResultStore(path)
+
+
+register('scraper', 'selenium')(_selenium_scraper)
+register('scraper', 'pooled')(_pooled_scraper)
+register('scraper', 'fake')(FakeScraper)
+register('scraper', 'record')(lambda: RecordingScraper(_selenium_scraper(), cassette('scraper')))
+register('scraper', 'replay')(lambda: ReplayScraper(cassette('scraper')))
+register('scraper', 'session-record')(lambda: _session_backend('scraper', 'record'))
+register('scraper', 'session-replay')(lambda: _session_backend('scraper', 'replay'))
+
+register('analyzer', 'claude')(_claude_analyzer)
+register('analyzer', 'fake')(FakeAnalyzer)
+register('analyzer', 'record')(lambda: RecordingAnalyzer(_claude_analyzer(), cassette('analyzer')))
+register('analyzer', 'replay')(lambda: ReplayAnalyzer(cassette('analyzer')))
+register('analyzer', 'session-record')(lambda: _session_backend('analyzer', 'record'))
+register('analyzer', 'session-replay')(lambda: _session_backend('analyzer', 'replay'))
+
+register('cache', 'memory')(StageCache)
+register('cache', 'sqlite')(lambda: StageCache(backend=SQLiteCache()))
+register('cache', 'redis')(lambda: StageCache(backend=RedisCache()))
+register('cache', 'none')(NullCache)
+
+register('store', 'sqlite')(_result_store)
+register('store', 'memory')(lambda: _result_store(':memory:'))
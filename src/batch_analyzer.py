@@ -0,0 +1,144 @@
+"""
+Message-batch portfolio analysis for bulk valuations
+Submits prepared analysis prompts as one asynchronous Message Batch, polls
+until it ends, and writes each result to the result store by property key,
+validated and repaired like an interactive analysis
+"""
+
+import hashlib
+import json
+import logging
+import sys
+import time
+from typing import Dict, Optional
+
+from analysis_schemas import check_analysis, describe_errors
+from claude_analyzer import ClaudeAnalyzer
+from json_stream import parse_json_text
+from resilience import call_with_retries
+from result_store import ResultStore
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAPPING_KIND = 'batch_mapping'
+
+
+def _custom_id(key: str) -> str:
+    """Batch custom_id values must be 1-64 chars of [a-zA-Z0-9_-], so hash the property key"""
+    return 'prop-' + hashlib.sha1(key.encode()).hexdigest()[:40]
+
+
+class PortfolioBatch:
+    def __init__(self, analyzer: ClaudeAnalyzer, store: ResultStore, analysis_type: str = 'comprehensive',
+                 poll_interval: float = 60.0):
+        """Run ``analysis_type`` ('comprehensive' or 'flip') for many properties through the Batches API"""
+        if analysis_type not in ('comprehensive', 'flip'):
+            raise ValueError(f"Unsupported batch analysis type: {analysis_type}")
+        self.analyzer = analyzer
+        self.store = store
+        self.analysis_type = analysis_type
+        self.poll_interval = poll_interval
+
+    def _spec(self, scraped_data: Dict):
+        """Prompt, system and analysis_type for one property, plus any locally computed extras"""
+        if self.analysis_type == 'flip':
+            return self.analyzer._flip_request(scraped_data.get('property', {}),
+                                               scraped_data.get('comparables', []))
+        return self.analyzer._comprehensive_request(scraped_data), {}
+
+    def submit(self, properties: Dict[str, Dict]) -> str:
+        """Submit one batch for {property_key: scraped_data}; returns the batch id"""
+        if not self.analyzer.client:
+            raise RuntimeError("Claude API key not configured")
+
+        requests = []
+        mapping = {}
+        for key, scraped_data in properties.items():
+            spec, extras = self._spec(scraped_data)
+            custom_id = _custom_id(key)
+            requests.append({'custom_id': custom_id, 'params': self.analyzer._build_request(**spec)})
+            # The prompt is kept for repairing results that fail validation
+            mapping[custom_id] = {'key': key, 'extras': extras, 'prompt': spec['prompt'], 'system': spec['system']}
+
+        batch = self.analyzer.client.messages.batches.create(requests=requests)
+        # Persist the id mapping so results can be collected by a later process
+        self.store.put(batch.id, BATCH_MAPPING_KIND, {'analysis_type': self.analysis_type, 'requests': mapping})
+        logger.info(f"Submitted batch {batch.id} with {len(requests)} {self.analysis_type} analyses")
+        return batch.id
+
+    def wait(self, batch_id: str, timeout: Optional[float] = None):
+        """Poll until the batch has ended; returns the final batch object"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            batch = self.analyzer.client.messages.batches.retrieve(batch_id)
+            if batch.processing_status == 'ended':
+                return batch
+            counts = batch.request_counts
+            logger.info(f"Batch {batch_id}: {counts.processing} processing, {counts.succeeded} succeeded, "
+                        f"{counts.errored} errored")
+            if deadline is not None and time.monotonic() + self.poll_interval > deadline:
+                raise TimeoutError(f"Batch {batch_id} still {batch.processing_status} after {timeout}s")
+            time.sleep(self.poll_interval)
+
+    def collect(self, batch_id: str) -> Dict[str, int]:
+        """Write every batch result to the store under its property key; returns counts by outcome"""
+        mapping = self.store.get(batch_id, BATCH_MAPPING_KIND)
+        if not mapping:
+            raise KeyError(f"No request mapping stored for batch {batch_id}")
+
+        kind = mapping['analysis_type']
+        counts = {'succeeded': 0, 'errored': 0, 'canceled': 0, 'expired': 0}
+        for entry in self.analyzer.client.messages.batches.results(batch_id):
+            request = mapping['requests'].get(entry.custom_id)
+            if not request:
+                logger.warning(f"Batch {batch_id}: unknown custom_id {entry.custom_id}")
+                continue
+            outcome = entry.result.type
+            counts[outcome] = counts.get(outcome, 0) + 1
+            if outcome == 'succeeded':
+                message = entry.result.message
+                result = self.analyzer._build_result(message, self.analyzer._message_content(message), kind)
+                self._validate(result, kind, request)
+                result['analysis'] = parse_json_text(result['content']) or {'raw_analysis': result['content']}
+                result.update(request['extras'])
+            else:
+                error = getattr(entry.result, 'error', None)
+                result = {'success': False, 'error': str(getattr(error, 'error', error) or outcome)}
+            result['batch_id'] = batch_id
+            self.store.put(request['key'], kind, result)
+        logger.info(f"Batch {batch_id} collected: {counts}")
+        return counts
+
+    def _validate(self, result: Dict, kind: str, request: Dict):
+        """Coerce and check a batch result in place; invalid fields get one direct (non-batch) repair call"""
+        analyzer = self.analyzer
+        tier = analyzer.router.tier_for(kind)
+        repair = analyzer._repair_request(request.get('prompt', ''), request.get('system'), kind, tier, result)
+        if not repair:
+            return
+        repair_request, analysis, fields = repair
+        try:
+            if not request.get('prompt'):
+                raise ValueError('batch was submitted without its prompt')
+            message, content = call_with_retries(analyzer._attempt(repair_request, None, kind, tier),
+                                                 analyzer.retry_policy)
+            analyzer._apply_repair(result, kind, analysis, fields, message, content, None)
+        except Exception as e:
+            logger.warning(f"Repair of batch result fields {fields} failed: {e}")
+            result['validation_errors'] = describe_errors(check_analysis(kind, analysis)[1]).splitlines()
+
+    def run(self, properties: Dict[str, Dict], timeout: Optional[float] = None) -> Dict[str, int]:
+        """Submit, wait for and collect one batch"""
+        batch_id = self.submit(properties)
+        self.wait(batch_id, timeout=timeout)
+        return self.collect(batch_id)
+
+
+# Example usage: python src/batch_analyzer.py portfolio.json [comprehensive|flip]
+# where portfolio.json maps property keys to {'property': {...}, 'comparables': [...]}
+if __name__ == "__main__":
+    with open(sys.argv[1]) as f:
+        portfolio = json.load(f)
+    batch = PortfolioBatch(ClaudeAnalyzer(), ResultStore(),
+                           analysis_type=sys.argv[2] if len(sys.argv) > 2 else 'comprehensive')
+    print(batch.run(portfolio))
@@ -0,0 +1,364 @@
+"""
+Shared Chrome instances serving several scrapes at once, one tab each
+A WebDriver session drives one window at a time, so every task gets a
+TabDriver that switches to its own tab under the browser's lock for each
+command. Pages load with Chrome's 'none' strategy and TabDriver waits for
+them outside that lock, so while one tab loads the browser serves the others.
+A new browser starts only when every running one is at its tab cap.
+Browsers the watchdog flags (memory, page count, slow loads) take no new
+tabs and are replaced once their current scrapes finish
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+from selenium.common.exceptions import InvalidSessionIdException
+
+from admission import Overloaded
+from driver_watchdog import DriverHealth, DriverWatchdog
+from selenium_scraper import PropertyScraper
+
+logger = logging.getLogger(__name__)
+
+# Chrome otherwise throttles timers and rendering in background tabs, which is every tab but one
+_BACKGROUND_TAB_ARGS = ('--disable-background-timer-throttling', '--disable-renderer-backgrounding',
+                        '--disable-backgrounding-occluded-windows')
+
+
+def launch_chrome():
+    """A headless Chrome whose get() returns at once, leaving load waits to TabDriver"""
+    scraper = PropertyScraper(headless=True)
+    scraper.options.page_load_strategy = 'none'
+    for arg in _BACKGROUND_TAB_ARGS:
+        scraper.options.add_argument(arg)
+    if not scraper.start_driver():
+        raise RuntimeError('Chrome failed to start')
+    return scraper.driver
+
+
+class _Browser:
+    def __init__(self, driver, health: DriverHealth):
+        self.driver = driver
+        self.health = health
+        self.retiring = None  # recycle reason once the watchdog flags it
+        self.lock = threading.RLock()
+        self.leases = 0  # tabs handed out or being opened
+        self.tabs = set()
+        self.spare: List[str] = []  # open but unleased windows, starting with the initial one
+        self.current = None
+        self.broken = False
+        try:
+            self.spare.append(driver.current_window_handle)
+        except Exception:
+            pass
+
+    def open_tab(self) -> str:
+        with self.lock:
+            if self.spare:
+                handle = self.spare.pop()
+                self.driver.switch_to.window(handle)
+            else:
+                self.driver.switch_to.new_window('tab')
+                handle = self.driver.current_window_handle
+            self.current = handle
+            self.tabs.add(handle)
+            return handle
+
+    def close_tab(self, handle: str):
+        with self.lock:
+            self.tabs.discard(handle)
+            self.driver.switch_to.window(handle)
+            self.current = handle
+            if len(self.driver.window_handles) > 1:
+                self.driver.close()
+                self.current = None
+            else:
+                # Closing the last window would end the session; blank it and keep it for the next task
+                self.driver.get('about:blank')
+                self.spare.append(handle)
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.warning(f"Browser quit failed: {e}")
+
+
+class TabDriver:
+    """WebDriver stand-in confined to one tab of a shared browser; quit() hands the tab back"""
+
+    def __init__(self, pool: 'BrowserPool', browser: _Browser, handle: str):
+        self._pool = pool
+        self._browser = browser
+        self.handle = handle
+        self.released = False
+
+    def _run(self, command: Callable, *args):
+        """Run one WebDriver command in this tab, holding the browser while it does"""
+        browser = self._browser
+        with browser.lock:
+            if self.released:
+                raise InvalidSessionIdException('Tab already released to the pool')
+            if browser.current != self.handle:
+                browser.driver.switch_to.window(self.handle)
+                browser.current = self.handle
+            try:
+                return command(*args)
+            except InvalidSessionIdException:
+                browser.broken = True
+                raise
+
+    def wait_loaded(self):
+        """Poll the tab until its document completes, releasing the browser between polls"""
+        deadline = time.monotonic() + self._pool.load_timeout
+        driver = self._browser.driver
+        while self._run(driver.execute_script, 'return document.readyState') != 'complete':
+            if time.monotonic() > deadline:
+                logger.warning(f"Page still loading after {self._pool.load_timeout}s; stopping it")
+                self._run(driver.execute_script, 'window.stop()')
+                return
+            time.sleep(self._pool.poll_interval)
+
+    def get(self, url):
+        self._navigate(self._browser.driver.get, url)
+
+    def _navigate(self, command: Callable, *args):
+        """Run a command that loads a page, wait for it, and count the load toward the browser's health"""
+        started = time.monotonic()
+        self._run(command, *args)
+        self.wait_loaded()
+        self._pool.watchdog.record_load(self._browser.health, time.monotonic() - started)
+
+    @property
+    def current_url(self):
+        return self._run(lambda: self._browser.driver.current_url)
+
+    def find_element(self, by, value):
+        return _TabElement(self, self._run(self._browser.driver.find_element, by, value))
+
+    def find_elements(self, by, value):
+        return [_TabElement(self, element) for element in self._run(self._browser.driver.find_elements, by, value)]
+
+    def execute_script(self, script, *args):
+        return self._run(self._browser.driver.execute_script, script, *args)
+
+    def quit(self):
+        self._pool.release(self)
+
+
+class _TabElement:
+    """Element proxy whose calls run in the tab it was found in"""
+
+    def __init__(self, tab: TabDriver, element):
+        self._tab = tab
+        self._element = element
+
+    @property
+    def text(self):
+        return self._tab._run(lambda: self._element.text)
+
+    def get_attribute(self, name):
+        return self._tab._run(self._element.get_attribute, name)
+
+    def find_element(self, by, value):
+        return _TabElement(self._tab, self._tab._run(self._element.find_element, by, value))
+
+    def find_elements(self, by, value):
+        return [_TabElement(self._tab, element) for element in self._tab._run(self._element.find_elements, by, value)]
+
+    def click(self):
+        # Scrapers click through to listing pages; those loads count like get()'s
+        self._tab._navigate(self._element.click)
+
+
+class BrowserPool:
+    def __init__(self, driver_factory: Optional[Callable] = None, max_browsers: Optional[int] = None,
+                 tabs_per_browser: Optional[int] = None, max_wait: Optional[float] = None,
+                 load_timeout: Optional[float] = None, poll_interval: float = 0.1,
+                 watchdog: Optional[DriverWatchdog] = None):
+        """Up to ``max_browsers`` (BROWSER_POOL_BROWSERS, default 2) browsers of ``tabs_per_browser`` tabs each
+        (BROWSER_POOL_TABS, default 4).
+
+        lease() waits up to ``max_wait`` seconds (BROWSER_POOL_WAIT, default 30) for a free tab; page loads
+        are stopped after ``load_timeout`` seconds (BROWSER_POOL_LOAD_TIMEOUT, default 30).
+        ``watchdog`` decides when a browser is recycled; it is consulted as each tab is released
+        and every ``watchdog.interval`` seconds in the background.
+        """
+        self.driver_factory = driver_factory or launch_chrome
+        self.max_browsers = max_browsers or int(os.getenv('BROWSER_POOL_BROWSERS', '2'))
+        self.tabs_per_browser = tabs_per_browser or int(os.getenv('BROWSER_POOL_TABS', '4'))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv('BROWSER_POOL_WAIT', '30'))
+        self.load_timeout = load_timeout or float(os.getenv('BROWSER_POOL_LOAD_TIMEOUT', '30'))
+        self.poll_interval = poll_interval
+        self.browsers: List[_Browser] = []
+        self._starting = 0
+        self._cond = threading.Condition()
+        self._stats = Counter()
+        self.watchdog = watchdog or DriverWatchdog()
+        self._sampler = None
+        self._closed = threading.Event()
+
+    def _least_loaded(self) -> Optional[_Browser]:
+        open_browsers = [b for b in self.browsers
+                         if not (b.broken or b.retiring) and b.leases < self.tabs_per_browser]
+        return min(open_browsers, key=lambda b: b.leases, default=None)
+
+    def lease(self) -> TabDriver:
+        """A tab of its own in a shared browser; raises Overloaded if none frees up within max_wait"""
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            while True:
+                browser = self._least_loaded()
+                if browser is not None:
+                    browser.leases += 1
+                    break
+                if len(self.browsers) + self._starting < self.max_browsers:
+                    self._starting += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['rejected'] += 1
+                    raise Overloaded('browser_tabs', max(1, round(self.load_timeout)), 'all tabs busy')
+                self._stats['waits'] += 1
+                self._cond.wait(remaining)
+
+        if browser is None:
+            # Chrome takes seconds to start, so other leases proceed meanwhile
+            try:
+                browser = _Browser(self.driver_factory(), self.watchdog.new_health())
+            except Exception:
+                with self._cond:
+                    self._starting -= 1
+                    self._cond.notify_all()
+                raise
+            with self._cond:
+                self._starting -= 1
+                browser.leases += 1
+                self.browsers.append(browser)
+                self._stats['browsers_started'] += 1
+                self._cond.notify_all()
+            self._start_sampler()
+
+        try:
+            handle = browser.open_tab()
+        except Exception:
+            browser.broken = True
+            self._return_slot(browser)
+            raise
+        self._stats['leases'] += 1
+        return TabDriver(self, browser, handle)
+
+    def release(self, tab: TabDriver):
+        """Close ``tab`` and free its slot, then recycle its browser if it died or the watchdog flags it"""
+        if tab.released:
+            return
+        browser = tab._browser
+        if not browser.broken:
+            try:
+                browser.close_tab(tab.handle)
+            except Exception as e:
+                logger.warning(f"Closing tab failed, retiring its browser: {e}")
+                browser.broken = True
+        tab.released = True
+        self._return_slot(browser)
+
+    def _return_slot(self, browser: _Browser):
+        # Between jobs is when a recycle costs nothing
+        reason = 'session_lost' if browser.broken else self.watchdog.verdict(browser.health, browser.driver)
+        with self._cond:
+            browser.leases -= 1
+        self._retire(browser, reason)
+
+    def _retire(self, browser: _Browser, reason: Optional[str]):
+        """Stop giving ``browser`` new tabs and quit it once its last tab is released"""
+        with self._cond:
+            if reason and not browser.retiring:
+                browser.retiring = reason
+            quit_now = browser.retiring and browser.leases == 0 and browser in self.browsers
+            if quit_now:
+                self.browsers.remove(browser)
+            self._cond.notify_all()
+        if quit_now:
+            self.watchdog.recycled(browser.retiring, browser.health)
+            browser.quit()
+
+    def _start_sampler(self):
+        with self._cond:
+            if self._sampler is not None or not self.watchdog.interval:
+                return
+            self._sampler = threading.Thread(target=self._sample_loop, name='browser-watchdog', daemon=True)
+        self._sampler.start()
+
+    def _sample_loop(self):
+        """Flag browsers proactively, so busy ones stop taking tabs before they degrade further"""
+        while not self._closed.wait(self.watchdog.interval):
+            with self._cond:
+                browsers = [b for b in self.browsers if not b.retiring]
+            for browser in browsers:
+                try:
+                    self._retire(browser, self.watchdog.verdict(browser.health, browser.driver))
+                except Exception as e:
+                    logger.warning(f"Browser watchdog check failed: {e}")
+
+    def close(self):
+        """Quit every browser; leases still out fail on their next command"""
+        self._closed.set()
+        with self._cond:
+            browsers, self.browsers = self.browsers, []
+        for browser in browsers:
+            browser.quit()
+
+    def stats(self) -> Dict:
+        """Counters plus ``recycles`` by reason and the browsers' last sampled RSS"""
+        with self._cond:
+            rss = [b.health.rss_bytes for b in self.browsers if b.health.rss_bytes is not None]
+            return dict(self._stats, browsers=len(self.browsers),
+                        tabs_in_use=sum(b.leases for b in self.browsers),
+                        retiring=sum(1 for b in self.browsers if b.retiring),
+                        rss_mb=round(sum(rss) / 1048576, 1), recycles=self.watchdog.stats())
+
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+
+def shared_pool() -> BrowserPool:
+    """The process-wide pool used by PooledPropertyScraper; its browsers are quit at interpreter exit"""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = BrowserPool()
+            # Otherwise each worker exit leaves its Chrome and chromedriver processes running
+            atexit.register(_shared_pool.close)
+        return _shared_pool
+
+
+def pool_stats() -> Dict:
+    """Stats of the shared pool, empty until a pooled scraper has used it"""
+    return _shared_pool.stats() if _shared_pool is not None else {}
+
+
+class PooledPropertyScraper(PropertyScraper):
+    """PropertyScraper running in a tab of a shared browser instead of its own Chrome"""
+
+    def __init__(self, pool: Optional[BrowserPool] = None, headless=True):
+        super().__init__(headless=headless)
+        self.pool = pool or shared_pool()
+
+    def start_driver(self):
+        try:
+            self.driver = self.pool.lease()
+            return True
+        except Exception as e:
+            logger.error(f"No browser tab available: {e}")
+            return False
+
+    def close_driver(self):
+        if self.driver:
+            self.driver.quit()
+            self.driver = None
@@ -0,0 +1,452 @@
+"""
+Cache backends behind every caching layer
+An in-process LRU, a SQLite file shared by the worker processes on one host,
+and a Redis client (RESP protocol) for several hosts. Each supports per-entry
+TTLs, size-bounded eviction, get-or-compute that runs one computation at a
+time across everything sharing the backend, and hit/miss/eviction counters
+"""
+
+import abc
+import json
+import logging
+import os
+import queue
+import re
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import unquote, urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(abc.ABC):
+    name = 'base'
+
+    def __init__(self, lock_ttl: Optional[float] = None, poll_interval: float = 0.05):
+        """``lock_ttl`` (CACHE_LOCK_TTL, default 300 s) bounds how long a crashed computer can hold a key"""
+        self.lock_ttl = lock_ttl or float(os.getenv('CACHE_LOCK_TTL', '300'))
+        self.poll_interval = poll_interval
+        self._counts = Counter()
+        self._counts_lock = threading.Lock()
+
+    def _count(self, event: str, n: int = 1):
+        if n:
+            with self._counts_lock:
+                self._counts[event] += n
+
+    # Storage primitives, implemented per backend; values are None when missing or expired
+    @abc.abstractmethod
+    def _get(self, key: str):
+        ...
+
+    @abc.abstractmethod
+    def _set(self, key: str, value, ttl: Optional[float]):
+        ...
+
+    @abc.abstractmethod
+    def _acquire(self, key: str, token: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def _release(self, key: str, token: str):
+        ...
+
+    @abc.abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abc.abstractmethod
+    def delete_prefix(self, prefix: str):
+        ...
+
+    @abc.abstractmethod
+    def size(self) -> int:
+        ...
+
+    def get(self, key: str):
+        value = self._get(key)
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key: str, value, ttl: Optional[float] = None):
+        """Store ``value`` for ``ttl`` seconds (None: until evicted)"""
+        self._set(key, value, ttl)
+        self._count('sets')
+
+    @contextmanager
+    def lock(self, key: str):
+        """Hold ``key``'s compute lock; waits for other holders, or past their lock_ttl if they died"""
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_ttl
+        waited = False
+        while not self._acquire(key, token):
+            if time.monotonic() > deadline:
+                logger.warning(f"Cache lock for {key} still held after {self.lock_ttl}s; proceeding without it")
+                token = None
+                break
+            waited = True
+            time.sleep(self.poll_interval)
+        if waited:
+            self._count('lock_waits')
+        try:
+            yield
+        finally:
+            if token:
+                self._release(key, token)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: Optional[float] = None,
+                       cacheable: Callable[[Any], bool] = lambda value: True):
+        """The cached value, else ``compute()``'s result - computed by one caller while the others wait for it"""
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self.lock(key):
+            # Whoever held the lock before us may have stored it
+            value = self._get(key)
+            if value is not None:
+                self._count('hits')
+                return value
+            value = compute()
+            self._count('computes')
+            if value is not None and cacheable(value):
+                self.set(key, value, ttl)
+        return value
+
+    def stats(self) -> Dict:
+        with self._counts_lock:
+            counts = dict(self._counts)
+        for event in ('hits', 'misses', 'sets', 'evictions', 'expired'):
+            counts.setdefault(event, 0)
+        return dict(counts, backend=self.name, entries=self.size())
+
+
+class MemoryCache(CacheBackend):
+    name = 'memory'
+
+    def __init__(self, max_entries: Optional[int] = None, **kwargs):
+        """LRU dictionary of up to ``max_entries`` (CACHE_MAX_ENTRIES, default 512); values are kept as is"""
+        super().__init__(**kwargs)
+        self.max_entries = max_entries or int(os.getenv('CACHE_MAX_ENTRIES', '512'))
+        self._entries = OrderedDict()  # key -> (expires_at or None, value)
+        self._locks: Dict[str, tuple] = {}  # key -> (token, expires_at)
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and time.time() > expires_at:
+                del self._entries[key]
+                self._count('expired')
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl if ttl is not None else None, value)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        self._count('evictions', evicted)
+
+    def _acquire(self, key, token):
+        now = time.time()
+        with self._lock:
+            held = self._locks.get(key)
+            if held and held[1] > now:
+                return False
+            self._locks[key] = (token, now + self.lock_ttl)
+            return True
+
+    def _release(self, key, token):
+        with self._lock:
+            if self._locks.get(key, (None,))[0] == token:
+                del self._locks[key]
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteCache(CacheBackend):
+    name = 'sqlite'
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None, **kwargs):
+        """Cache table in ``path`` (CACHE_SQLITE_PATH, default realty_cache.db), shared by processes on this host.
+
+        Keeps at most ``max_entries`` (CACHE_MAX_ENTRIES, default 512), least recently read evicted first.
+        Values are stored as JSON.
+        """
+        super().__init__(**kwargs)
+        self.path = path or os.getenv('CACHE_SQLITE_PATH', 'realty_cache.db')
+        self.max_entries = max_entries or int(os.getenv('CACHE_MAX_ENTRIES', '512'))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            if self.path != ':memory:':
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_locks (key TEXT PRIMARY KEY, token TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)")
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and now > row[1]:
+                self._conn.execute("DELETE FROM cache WHERE key = ? AND expires_at = ?", (key, row[1]))
+                self._count('expired')
+                return None
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def _set(self, key, value, ttl):
+        now = time.time()
+        data = json.dumps(value, default=str)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, data, now + ttl if ttl is not None else None, now))
+                expired = self._conn.execute(
+                    "DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (now,)).rowcount
+                excess = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+                evicted = 0
+                if excess > 0:
+                    evicted = self._conn.execute(
+                        "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                        (excess,)).rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._count('expired', expired)
+        self._count('evictions', evicted)
+
+    def _acquire(self, key, token):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM cache_locks WHERE key = ? AND expires_at < ?", (key, now))
+                acquired = self._conn.execute(
+                    "INSERT OR IGNORE INTO cache_locks (key, token, expires_at) VALUES (?, ?, ?)",
+                    (key, token, now + self.lock_ttl)).rowcount == 1
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return acquired
+
+    def _release(self, key, token):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_locks WHERE key = ? AND token = ?", (key, token))
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix):
+        escaped = re.sub(r'([\\%_])', r'\\\1', prefix)
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key LIKE ? ESCAPE '\\'", (escaped + '%',))
+
+    def size(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisError(Exception):
+    """Error reply from the Redis server"""
+
+
+class _RespConnection:
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.reader = self.sock.makefile('rb')
+
+    def execute(self, *args):
+        parts = [a if isinstance(a, bytes) else str(a).encode() for a in args]
+        self.sock.sendall(b'*%d\r\n' % len(parts) + b''.join(b'$%d\r\n%s\r\n' % (len(p), p) for p in parts))
+        return self._read()
+
+    def _read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError('Redis closed the connection')
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body.decode()
+        if kind == b'-':
+            raise RedisError(body.decode())
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            return None if length < 0 else self.reader.read(length + 2)[:-2]
+        if kind == b'*':
+            length = int(body)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise RedisError(f'Unexpected reply {line!r}')
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def _glob_escape(text: str) -> str:
+    return re.sub(r'([\\*?\[\]])', r'\\\1', text)
+
+
+_RELEASE_LOCK = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) else return 0 end"
+
+
+class RedisCache(CacheBackend):
+    name = 'redis'
+
+    def __init__(self, url: Optional[str] = None, namespace: str = 'realty:', pool_size: int = 8,
+                 socket_timeout: float = 5.0, **kwargs):
+        """Redis at ``url`` (CACHE_REDIS_URL, default redis://localhost:6379/0), keys under ``namespace``.
+
+        Size-based eviction is the server's: run it with maxmemory and an allkeys-lru policy.
+        Values are stored as JSON. If Redis is unreachable, reads miss and writes are dropped.
+        """
+        super().__init__(**kwargs)
+        self.url = url or os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+        parsed = urlparse(self.url)
+        self.host, self.port = parsed.hostname or 'localhost', parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.namespace = namespace
+        self.socket_timeout = socket_timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self) -> _RespConnection:
+        conn = _RespConnection(self.host, self.port, self.socket_timeout)
+        if self.password:
+            conn.execute('AUTH', self.password)
+        if self.db:
+            conn.execute('SELECT', self.db)
+        return conn
+
+    def _execute(self, *args):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            reply = conn.execute(*args)
+        except (OSError, ConnectionError):
+            conn.close()
+            raise
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        return reply
+
+    def _call(self, default, *args):
+        """Run one command, treating an unreachable server as a cache miss"""
+        try:
+            return self._execute(*args)
+        except (OSError, ConnectionError, RedisError) as e:
+            self._count('errors')
+            logger.warning(f"Redis cache {args[0]} failed: {e}")
+            return default
+
+    def _get(self, key):
+        data = self._call(None, 'GET', self.namespace + key)
+        return json.loads(data) if data is not None else None
+
+    def _set(self, key, value, ttl):
+        args = ['SET', self.namespace + key, json.dumps(value, default=str)]
+        if ttl is not None:
+            args += ['PX', max(1, int(ttl * 1000))]
+        self._call(None, *args)
+
+    def _acquire(self, key, token):
+        reply = self._call('UNAVAILABLE', 'SET', f"{self.namespace}lock:{key}", token, 'NX', 'PX',
+                           int(self.lock_ttl * 1000))
+        # Without a server there is nothing to coordinate on; compute locally
+        return reply in ('OK', 'UNAVAILABLE')
+
+    def _release(self, key, token):
+        # Compare and delete in one step: between a GET and a DEL our lock could expire and be taken by another
+        self._call(None, 'EVAL', _RELEASE_LOCK, 1, f"{self.namespace}lock:{key}", token)
+
+    def delete(self, key):
+        self._call(None, 'DEL', self.namespace + key)
+
+    def _scan(self, pattern: str):
+        """Batches of keys matching ``pattern``; stops early if the server is unreachable"""
+        cursor = b'0'
+        while True:
+            reply = self._call(None, 'SCAN', cursor, 'MATCH', pattern, 'COUNT', 500)
+            if reply is None:
+                return
+            cursor, keys = reply
+            if keys:
+                yield keys
+            if cursor in (b'0', '0'):
+                return
+
+    def delete_prefix(self, prefix):
+        for keys in self._scan(_glob_escape(self.namespace + prefix) + '*'):
+            self._call(None, 'DEL', *keys)
+
+    def size(self):
+        """Entries under this namespace, not DBSIZE, which counts every app sharing the database"""
+        locks = f"{self.namespace}lock:".encode()
+        return sum(1 for keys in self._scan(_glob_escape(self.namespace) + '*')
+                   for key in keys if not key.startswith(locks))
+
+    def stats(self):
+        stats = super().stats()
+        info = self._call(None, 'INFO', 'stats')
+        if info is not None:
+            # Evictions happen server-side, under its maxmemory policy
+            match = re.search(rb'evicted_keys:(\d+)', info)
+            if match:
+                stats['evictions'] = int(match.group(1))
+        return stats
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
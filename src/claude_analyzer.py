@@ -7,9 +7,19 @@ Replaces the need for separate market research APIs
 import os
 import json
 import logging
-from typing import Dict, List, Optional
-from anthropic import Anthropic
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from anthropic import Anthropic, AsyncAnthropic
 from dotenv import load_dotenv
+from json_stream import StreamingJSONParser, parse_json_checked, parse_json_text
+from token_budget import TokenBudget, default_budget
+from rate_limiter import RequestLimiter, default_limiter
+from resilience import RetryPolicy, call_with_retries, call_with_retries_async, default_latency_tracker
+from valuation_engine import estimate_value
+from flip_simulation import simulate_flip
+from model_router import ModelRouter, default_router
+from analysis_schemas import SCHEMAS, check_analysis, describe_errors, invalid_fields, repair_prompt, tool_for
+from tracing import span, traced
 
 # Load environment variables
 load_dotenv()
@@ -17,28 +27,227 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Static instruction blocks are sent as a cached system prefix; only the
+# per-property data varies between calls.
+CMA_INSTRUCTIONS = """\
+You are a licensed real estate appraiser performing a Comparative Market Analysis (CMA).
+You must follow standard appraisal methodology and provide defensible valuations.
+
+CRITICAL RULES FOR COMPARABLE SELECTION & ANALYSIS:
+1. EXCLUDE any sale that appears to be: foreclosure, probate, short sale, bank-owned/REO,
+   estate sale, auction, tax sale, sheriff sale, or any non-arm's-length transaction.
+   These distressed sales do NOT reflect fair market value.
+2. Only use standard arm's-length transactions between willing buyer and seller.
+3. Comps should be:
+   - Within 1 mile (ideal) to 3 miles (maximum) of subject
+   - Sold within last 6 months (ideal) to 12 months (maximum)
+   - Similar size: within 20-25% of subject sqft
+   - Similar bed/bath count: within +-1 bed, +-1 bath
+   - Same property type (single family vs condo vs townhouse)
+4. Apply standard adjustments for differences:
+   - Location (neighborhood quality, street, lot)
+   - Size (price per sqft adjustment)
+   - Condition and age
+   - Bed/bath count differences
+   - Garage, basement, lot size, upgrades
+5. Weight adjusted comp values by quality (best comps get more weight).
+6. Use your knowledge of the subject's local market to supplement
+   the provided comps with your understanding of local market conditions.
+
+IMPORTANT - FINISHED BASEMENT / BELOW-GRADE LIVING SPACE:
+- Zillow's listed sqft often only reflects ABOVE-GRADE living area
+- Finished basements add significant value but are NOT always in the sqft count
+- If a property has a finished basement, the total living space may be 30-60% larger
+  than the listed sqft, which dramatically affects $/sqft and overall value
+- When comparing comps, adjust for whether comps include or exclude basement sqft
+- A property with finished basement is worth MORE than one without, even at same listed sqft
+- Do NOT undervalue properties just because comps without basements sold for less
+
+VALUATION BIAS CHECK:
+- Do NOT assume asking price is overpriced. Many properties sell AT or ABOVE asking.
+- If comps are smaller, older, or inferior quality, adjust UPWARD for the subject property
+- Consider the full picture: location, condition, upgrades, finished space, lot size
+- When data is limited, lean on market knowledge but acknowledge uncertainty rather
+  than defaulting to a lower valuation
+
+NOTE: If the provided comps are insufficient (too few, too different, or suspicious),
+use your knowledge of the local market to provide additional context and adjust accordingly.
+State clearly when you are supplementing with market knowledge vs using provided data.
+If the property has a finished basement, factor that into valuation - it adds real value.
+
+Record your analysis with the record_cma tool using these exact keys:
+
+{
+    "executive_summary": "2-3 sentence overview with key finding on value vs asking price",
+    "property_overview": {
+        "condition_assessment": "Based on description, age, and price signals",
+        "key_features": ["Notable features"],
+        "property_type": "Single family/Condo/etc"
+    },
+    "market_analysis": {
+        "market_trend": "Specific trend for this neighborhood/city with data points",
+        "median_price_area": "Median home price for this area",
+        "avg_price_per_sqft": "Average $/sqft for comparable homes in area",
+        "avg_days_on_market": "Estimated DOM for this area",
+        "inventory_level": "buyer's/seller's/balanced market with reasoning",
+        "market_position": "How this property compares (above/below/at market)"
+    },
+    "comparable_analysis": {
+        "comps_used": [
+            {
+                "address": "comp address",
+                "sale_price": "price",
+                "sale_type": "arm's-length / EXCLUDED-reason",
+                "similarity_grade": "A/B/C",
+                "adjustments": "specific $ adjustments applied and why",
+                "adjusted_value": "price after adjustments"
+            }
+        ],
+        "comps_excluded": ["list any comps excluded and why (distressed, too different, etc.)"],
+        "comp_quality_score": "A/B/C rating for overall comp set quality with reasoning"
+    },
+    "valuation": {
+        "estimated_fair_market_value": "Your FMV estimate as a number",
+        "value_range_low": "Conservative estimate",
+        "value_range_high": "Optimistic estimate",
+        "price_vs_value": "Is asking price above/below/at FMV and by how much %",
+        "confidence_level": "High/Medium/Low with specific reasoning",
+        "methodology": "Brief explanation of how you arrived at this value"
+    },
+    "pricing_strategy": {
+        "suggested_list_price": "Recommended listing price if selling",
+        "pricing_rationale": "Why this price - reference comps and market",
+        "days_to_sell_estimate": "Estimated days on market at this price"
+    },
+    "investment_analysis": {
+        "rental_potential": "Estimated monthly rent with reasoning",
+        "cap_rate_estimate": "Estimated cap rate",
+        "appreciation_outlook": "1-3-5 year outlook with reasoning",
+        "investment_grade": "A-F rating with explanation"
+    },
+    "recommendations": ["3-5 specific, actionable items"],
+    "risk_factors": ["Specific risks with this property/market"],
+    "data_quality_notes": "Note any limitations in the analysis due to missing data"
+}
+
+Be precise with dollar amounts. Do not hedge excessively - give your best professional estimate.
+"""
+
+FLIP_INSTRUCTIONS = """\
+You are an experienced real estate investor analyzing a potential flip deal.
+Provide a realistic, numbers-driven analysis. Do NOT use distressed sale prices as ARV targets.
+
+CRITICAL: ARV (After Repair Value) must be based on:
+- Recent arm's-length sales of RENOVATED/UPDATED properties in the same area
+- NOT foreclosures, probate, short sales, or distressed transactions
+- Properties in good/excellent condition (post-renovation comparable)
+- Similar size, bed/bath count, and location to subject
+
+IMPORTANT: If the property has a finished basement, the ARV should reflect the TOTAL
+living space, not just above-grade sqft. Finished basements in CT typically add $30-60/sqft
+in value (less than above-grade but significant). Factor this into ARV calculation.
+
+The preliminary metrics use generic formulas (15% renovation, 70% rule).
+Override these with your actual market knowledge for this specific area and property.
+
+Record your flip analysis with the record_flip_analysis tool using this shape:
+{
+    "flip_score": "1-10 rating with justification",
+    "recommendation": "strong_buy / buy / consider / pass",
+    "arv_assessment": {
+        "estimated_arv": "Your ARV as a dollar amount",
+        "arv_per_sqft": "Target $/sqft for renovated property in this area",
+        "arv_methodology": "How you determined ARV - which comps, what adjustments",
+        "arv_confidence": "High/Medium/Low"
+    },
+    "acquisition_analysis": {
+        "max_allowable_offer": "Maximum you should pay using 70% rule",
+        "is_asking_price_viable": "Yes/No with reasoning",
+        "negotiation_target": "What to offer and why"
+    },
+    "renovation_scope": {
+        "estimated_cost_low": "Conservative reno budget",
+        "estimated_cost_high": "Full renovation budget",
+        "priority_items": ["specific renovation items with estimated costs"],
+        "timeline_months": "realistic timeline",
+        "scope_level": "cosmetic / moderate / full gut"
+    },
+    "financial_summary": {
+        "total_cost_in": "Purchase + reno + holding + closing",
+        "expected_arv": "After repair value",
+        "expected_profit": "Most likely profit",
+        "best_case_profit": "optimistic scenario with assumptions",
+        "worst_case_profit": "conservative scenario with assumptions",
+        "expected_roi": "ROI percentage",
+        "cash_needed": "Total cash required"
+    },
+    "deal_breakers": ["Any absolute no-go factors"],
+    "market_factors": "Local market conditions affecting this flip - be specific",
+    "risks": ["Specific risk factors ranked by severity"],
+    "exit_strategies": ["Ranked exit options if flip doesn't work"]
+}
+
+Be specific with dollar amounts. Use your knowledge of the subject's actual
+local market conditions, not generic assumptions.
+"""
+
+
 class ClaudeAnalyzer:
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize Claude AI client"""
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 budget: Optional[TokenBudget] = None, limiter: Optional[RequestLimiter] = None,
+                 retry_policy: Optional[RetryPolicy] = None, deadline: Optional[float] = None,
+                 hedge: Optional[bool] = None, hedge_percentile: float = 0.95,
+                 router: Optional[ModelRouter] = None, http_client=None, async_http_client=None):
+        """Initialize Claude AI client (base_url points at a local stand-in for testing).
+
+        ``deadline`` is the default overall time budget per request in seconds.
+        With ``hedge`` on, a second request is sent when the first runs past the
+        ``hedge_percentile`` latency observed for that analysis type.
+        ``router`` picks the model tier per analysis type and handles escalation.
+        ``http_client`` / ``async_http_client`` are httpx clients for the SDK, e.g. with a recording transport.
+        """
+        self.budget = budget or default_budget
+        self.router = router or default_router
+        self.limiter = limiter or default_limiter
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.deadline = deadline if deadline is not None else (
+            float(os.getenv('CLAUDE_REQUEST_DEADLINE')) if os.getenv('CLAUDE_REQUEST_DEADLINE') else None)
+        self.hedge = hedge if hedge is not None else os.getenv('CLAUDE_HEDGE_REQUESTS', 'false').lower() == 'true'
+        self.hedge_percentile = hedge_percentile
+        self.latency = default_latency_tracker
         self.api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
-        self.client = Anthropic(api_key=self.api_key) if self.api_key else None
+        self.base_url = base_url or os.getenv('ANTHROPIC_BASE_URL')
+        # Retries are handled by the resilience layer, not the SDK
+        self.client = Anthropic(api_key=self.api_key, base_url=self.base_url, max_retries=0,
+                                http_client=http_client) if self.api_key else None
+        self.async_client = AsyncAnthropic(api_key=self.api_key, base_url=self.base_url, max_retries=0,
+                                           http_client=async_http_client) if self.api_key else None
     
     def analyze_property_value(self, property_data: Dict, comparables: List[Dict], market_data: Optional[Dict] = None) -> Dict:
         """Analyze property value using comparable sales and market data"""
         if not self.client:
             return {"error": "Claude API key not configured"}
-        
+        return self._make_request(**self._property_value_request(property_data, comparables, market_data))
+
+    async def analyze_property_value_async(self, property_data: Dict, comparables: List[Dict], market_data: Optional[Dict] = None) -> Dict:
+        """Async counterpart of analyze_property_value"""
+        if not self.async_client:
+            return {"error": "Claude API key not configured"}
+        return await self._make_request_async(**self._property_value_request(property_data, comparables, market_data))
+
+    def _property_value_request(self, property_data: Dict, comparables: List[Dict], market_data: Optional[Dict] = None) -> Dict:
+        """Build the request for analyze_property_value"""
         prompt = f"""
         As a professional real estate appraiser and market researcher, analyze this property and provide comprehensive insights:
 
         SUBJECT PROPERTY:
-        {json.dumps(property_data, indent=2)}
+        {self.budget.fit_json(property_data, 800)}
 
         COMPARABLE SALES:
-        {json.dumps(comparables, indent=2)}
+        {self._format_comparables_for_analysis(comparables, property_data)}
 
         MARKET DATA:
-        {json.dumps(market_data or {}, indent=2)}
+        {self.budget.fit_json(market_data or {}, 800)}
 
         Please provide a comprehensive analysis including:
 
@@ -73,61 +282,45 @@ class ClaudeAnalyzer:
            - Upgrade recommendations
            - Potential issues or red flags
 
-        Format your response as structured JSON with clear sections.
+        Record your analysis with the record_property_value tool, one key per section above.
         Use your knowledge of real estate markets to provide insights even with limited data.
         """
         
-        return self._make_request(prompt)
+        return {"prompt": prompt, "analysis_type": "property_value"}
     
-    def comprehensive_property_analysis(self, scraped_data: Dict) -> Dict:
-        """Perform complete property analysis using scraped data"""
+    def comprehensive_property_analysis(self, scraped_data: Dict, on_section: Optional[Callable[[str, Any], None]] = None,
+                                        deadline: Optional[float] = None,
+                                        reference_valuation: Optional[Dict] = None) -> Dict:
+        """Perform complete property analysis using scraped data.
+
+        If ``on_section`` is given the response is streamed and the callback fires
+        with (key, value) for each top-level JSON section as soon as it is complete.
+        ``deadline`` is the overall time budget in seconds, retries included.
+        ``reference_valuation`` is a precomputed valuation_engine result; computed here when omitted.
+        """
         if not self.client:
             return {"error": "Claude API key not configured"}
+        return self._make_request(on_section=on_section, deadline=deadline,
+                                  **self._comprehensive_request(scraped_data, reference_valuation))
+
+    async def comprehensive_property_analysis_async(self, scraped_data: Dict,
+                                                    on_section: Optional[Callable[[str, Any], None]] = None,
+                                                    deadline: Optional[float] = None,
+                                                    reference_valuation: Optional[Dict] = None) -> Dict:
+        """Async counterpart of comprehensive_property_analysis"""
+        if not self.async_client:
+            return {"error": "Claude API key not configured"}
+        return await self._make_request_async(on_section=on_section, deadline=deadline,
+                                              **self._comprehensive_request(scraped_data, reference_valuation))
 
+    def _comprehensive_request(self, scraped_data: Dict, reference_valuation: Optional[Dict] = None) -> Dict:
+        """Build the request for comprehensive_property_analysis"""
         property_data = scraped_data.get('property', {})
         comparables = scraped_data.get('comparables', [])
+        if reference_valuation is None:
+            reference_valuation = estimate_value(property_data, comparables)
 
         prompt = f"""
-        You are a licensed real estate appraiser performing a Comparative Market Analysis (CMA).
-        You must follow standard appraisal methodology and provide defensible valuations.
-
-        CRITICAL RULES FOR COMPARABLE SELECTION & ANALYSIS:
-        1. EXCLUDE any sale that appears to be: foreclosure, probate, short sale, bank-owned/REO,
-           estate sale, auction, tax sale, sheriff sale, or any non-arm's-length transaction.
-           These distressed sales do NOT reflect fair market value.
-        2. Only use standard arm's-length transactions between willing buyer and seller.
-        3. Comps should be:
-           - Within 1 mile (ideal) to 3 miles (maximum) of subject
-           - Sold within last 6 months (ideal) to 12 months (maximum)
-           - Similar size: within 20-25% of subject sqft
-           - Similar bed/bath count: within +-1 bed, +-1 bath
-           - Same property type (single family vs condo vs townhouse)
-        4. Apply standard adjustments for differences:
-           - Location (neighborhood quality, street, lot)
-           - Size (price per sqft adjustment)
-           - Condition and age
-           - Bed/bath count differences
-           - Garage, basement, lot size, upgrades
-        5. Weight adjusted comp values by quality (best comps get more weight).
-        6. Use your knowledge of {property_data.get('address', 'this area')} to supplement
-           the provided comps with your understanding of local market conditions.
-
-        IMPORTANT - FINISHED BASEMENT / BELOW-GRADE LIVING SPACE:
-        - Zillow's listed sqft often only reflects ABOVE-GRADE living area
-        - Finished basements add significant value but are NOT always in the sqft count
-        - If a property has a finished basement, the total living space may be 30-60% larger
-          than the listed sqft, which dramatically affects $/sqft and overall value
-        - When comparing comps, adjust for whether comps include or exclude basement sqft
-        - A property with finished basement is worth MORE than one without, even at same listed sqft
-        - Do NOT undervalue properties just because comps without basements sold for less
-
-        VALUATION BIAS CHECK:
-        - Do NOT assume asking price is overpriced. Many properties sell AT or ABOVE asking.
-        - If comps are smaller, older, or inferior quality, adjust UPWARD for the subject property
-        - Consider the full picture: location, condition, upgrades, finished space, lot size
-        - When data is limited, lean on market knowledge but acknowledge uncertainty rather
-          than defaulting to a lower valuation
-
         SUBJECT PROPERTY:
         Address: {property_data.get('address', 'Unknown')}
         Listed/Asking Price: ${property_data.get('price', 'Unknown')}
@@ -142,110 +335,68 @@ class ClaudeAnalyzer:
         Description: {(property_data.get('description') or 'No description available')[:300]}
 
         SCRAPED COMPARABLE SALES (pre-filtered to remove obvious distressed sales):
-        {self._format_comparables_for_analysis(comparables)}
-
-        NOTE: If the provided comps are insufficient (too few, too different, or suspicious),
-        use your knowledge of the local market to provide additional context and adjust accordingly.
-        State clearly when you are supplementing with market knowledge vs using provided data.
-        If the property has a finished basement, factor that into valuation - it adds real value.
-
-        Respond in JSON format with these exact keys:
-
-        {{
-            "executive_summary": "2-3 sentence overview with key finding on value vs asking price",
-            "property_overview": {{
-                "condition_assessment": "Based on description, age, and price signals",
-                "key_features": ["Notable features"],
-                "property_type": "Single family/Condo/etc"
-            }},
-            "market_analysis": {{
-                "market_trend": "Specific trend for this neighborhood/city with data points",
-                "median_price_area": "Median home price for this area",
-                "avg_price_per_sqft": "Average $/sqft for comparable homes in area",
-                "avg_days_on_market": "Estimated DOM for this area",
-                "inventory_level": "buyer's/seller's/balanced market with reasoning",
-                "market_position": "How this property compares (above/below/at market)"
-            }},
-            "comparable_analysis": {{
-                "comps_used": [
-                    {{
-                        "address": "comp address",
-                        "sale_price": "price",
-                        "sale_type": "arm's-length / EXCLUDED-reason",
-                        "similarity_grade": "A/B/C",
-                        "adjustments": "specific $ adjustments applied and why",
-                        "adjusted_value": "price after adjustments"
-                    }}
-                ],
-                "comps_excluded": ["list any comps excluded and why (distressed, too different, etc.)"],
-                "comp_quality_score": "A/B/C rating for overall comp set quality with reasoning"
-            }},
-            "valuation": {{
-                "estimated_fair_market_value": "Your FMV estimate as a number",
-                "value_range_low": "Conservative estimate",
-                "value_range_high": "Optimistic estimate",
-                "price_vs_value": "Is asking price above/below/at FMV and by how much %",
-                "confidence_level": "High/Medium/Low with specific reasoning",
-                "methodology": "Brief explanation of how you arrived at this value"
-            }},
-            "pricing_strategy": {{
-                "suggested_list_price": "Recommended listing price if selling",
-                "pricing_rationale": "Why this price - reference comps and market",
-                "days_to_sell_estimate": "Estimated days on market at this price"
-            }},
-            "investment_analysis": {{
-                "rental_potential": "Estimated monthly rent with reasoning",
-                "cap_rate_estimate": "Estimated cap rate",
-                "appreciation_outlook": "1-3-5 year outlook with reasoning",
-                "investment_grade": "A-F rating with explanation"
-            }},
-            "recommendations": ["3-5 specific, actionable items"],
-            "risk_factors": ["Specific risks with this property/market"],
-            "data_quality_notes": "Note any limitations in the analysis due to missing data"
-        }}
-
-        Be precise with dollar amounts. Do not hedge excessively - give your best professional estimate.
+        {self._format_comparables_for_analysis(comparables, property_data)}
+
+        LOCAL REFERENCE VALUATION (deterministic adjusted-comp model - cross-check, explain any large difference):
+        {self._format_reference_valuation(reference_valuation)}
+
+        Focus your market knowledge on {property_data.get('address', 'this area')}.
         """
 
-        return self._make_request(prompt)
+        return {"prompt": prompt, "system": CMA_INSTRUCTIONS, "analysis_type": "comprehensive"}
+
+    @staticmethod
+    def _format_reference_valuation(valuation: Optional[Dict]) -> str:
+        """One-line summary of a valuation_engine result for the prompt"""
+        if not valuation or not valuation.get('available'):
+            return "Not available (no usable comparable sales)"
+        return (f"FMV ${valuation['estimated_fair_market_value']:,} "
+                f"(range ${valuation['value_range_low']:,} - ${valuation['value_range_high']:,}), "
+                f"confidence {valuation['confidence_level']}, {valuation['comps_used']} comps, "
+                f"median ${valuation.get('median_price_per_sqft') or 'n/a'}/sqft")
     
-    def _format_comparables_for_analysis(self, comparables: List[Dict]) -> str:
-        """Format comparable properties for Claude analysis with quality indicators"""
+    def _format_comparables_for_analysis(self, comparables: List[Dict], subject: Optional[Dict] = None) -> str:
+        """Format the most similar comparables (one line each) within the comp token budget"""
         if not comparables:
             return "No comparable properties found from scraping. Use your market knowledge to provide analysis."
 
-        formatted = []
-        for i, comp in enumerate(comparables[:8], 1):
-            sale_type = comp.get('sale_type', 'unknown')
-            comp_text = f"""
-            Comp {i}:
-            - Address: {comp.get('address', 'Unknown')}
-            - Sale Price: ${comp.get('sale_price', 'Unknown')}
-            - Beds: {comp.get('beds', 'Unknown')}
-            - Baths: {comp.get('baths', 'Unknown')}
-            - Sqft: {comp.get('sqft', 'Unknown')}
-            - Sale Type: {sale_type}
-            - Distance: {comp.get('distance_miles', 'Unknown')} miles
-            - Sale Date: {comp.get('sale_date', 'Unknown')}
-            """
-            formatted.append(comp_text.strip())
-
-        formatted.append(f"\nTotal comps provided: {len(comparables)} (pre-filtered to exclude distressed sales)")
+        kept, summary = self.budget.trim_comparables(comparables, subject)
+        formatted = ["Comp | Address | Sale Price | Beds | Baths | Sqft | Sale Type | Distance (mi) | Sale Date"]
+        for i, comp in enumerate(kept, 1):
+            formatted.append(
+                f"{i} | {comp.get('address', 'Unknown')} | ${comp.get('sale_price', 'Unknown')} | "
+                f"{comp.get('beds', '?')} | {comp.get('baths', '?')} | {comp.get('sqft', '?')} | "
+                f"{comp.get('sale_type', 'unknown')} | {comp.get('distance_miles', '?')} | {comp.get('sale_date', '?')}"
+            )
+        if summary:
+            formatted.append(f"Plus {summary['count']} less similar comps: median price "
+                             f"${summary['median_sale_price']}, median $/sqft {summary['median_price_per_sqft']}")
+
+        formatted.append(f"Total comps provided: {len(comparables)} (pre-filtered to exclude distressed sales)")
         return "\n".join(formatted)
     
     def generate_listing_description(self, property_data: Dict, analysis: Dict) -> Dict:
         """Generate compelling listing description"""
         if not self.client:
             return {"error": "Claude API key not configured"}
-        
+        return self._make_request(**self._listing_description_request(property_data, analysis))
+
+    async def generate_listing_description_async(self, property_data: Dict, analysis: Dict) -> Dict:
+        """Async counterpart of generate_listing_description"""
+        if not self.async_client:
+            return {"error": "Claude API key not configured"}
+        return await self._make_request_async(**self._listing_description_request(property_data, analysis))
+
+    def _listing_description_request(self, property_data: Dict, analysis: Dict) -> Dict:
+        """Build the request for generate_listing_description"""
         prompt = f"""
         Create a compelling real estate listing description for this property:
 
         PROPERTY DATA:
-        {json.dumps(property_data, indent=2)}
+        {self.budget.fit_json(property_data, 800)}
 
         ANALYSIS DATA:
-        {json.dumps(analysis, indent=2)}
+        {self.budget.fit_json(analysis, 1500)}
 
         Generate:
         1. HEADLINE - catchy 1-line summary
@@ -257,13 +408,22 @@ class ClaudeAnalyzer:
         Style: Professional but engaging, emphasize unique selling points, avoid superlatives without substance.
         """
         
-        return self._make_request(prompt)
+        return {"prompt": prompt, "analysis_type": "listing_description"}
     
     def assess_property_condition(self, photos: List[str], property_data: Dict) -> Dict:
         """Assess property condition from photos (when available)"""
         if not self.client:
             return {"error": "Claude API key not configured"}
-        
+        return self._make_request(**self._condition_request(photos, property_data))
+
+    async def assess_property_condition_async(self, photos: List[str], property_data: Dict) -> Dict:
+        """Async counterpart of assess_property_condition"""
+        if not self.async_client:
+            return {"error": "Claude API key not configured"}
+        return await self._make_request_async(**self._condition_request(photos, property_data))
+
+    def _condition_request(self, photos: List[str], property_data: Dict) -> Dict:
+        """Build the request for assess_property_condition"""
         # Note: This would require Claude's vision capabilities
         # For now, implement text-based condition assessment
         
@@ -271,7 +431,7 @@ class ClaudeAnalyzer:
         Assess property condition based on available data:
 
         PROPERTY INFORMATION:
-        {json.dumps(property_data, indent=2)}
+        {self.budget.fit_json(property_data, 800)}
 
         Based on year built, price relative to area, and any description text, assess:
         1. OVERALL CONDITION - Excellent/Good/Fair/Poor
@@ -283,18 +443,27 @@ class ClaudeAnalyzer:
         Provide reasoning for each assessment.
         """
         
-        return self._make_request(prompt)
+        return {"prompt": prompt, "analysis_type": "condition"}
     
     def create_market_report(self, address: str, analysis_data: Dict) -> Dict:
         """Create comprehensive market report"""
         if not self.client:
             return {"error": "Claude API key not configured"}
-        
+        return self._make_request(**self._market_report_request(address, analysis_data))
+
+    async def create_market_report_async(self, address: str, analysis_data: Dict) -> Dict:
+        """Async counterpart of create_market_report"""
+        if not self.async_client:
+            return {"error": "Claude API key not configured"}
+        return await self._make_request_async(**self._market_report_request(address, analysis_data))
+
+    def _market_report_request(self, address: str, analysis_data: Dict) -> Dict:
+        """Build the request for create_market_report"""
         prompt = f"""
         Create a comprehensive market report for {address}:
 
         ANALYSIS DATA:
-        {json.dumps(analysis_data, indent=2)}
+        {self.budget.fit_json(analysis_data, 2000)}
 
         Generate a professional market report including:
         1. EXECUTIVE SUMMARY
@@ -308,21 +477,30 @@ class ClaudeAnalyzer:
         Format as a professional report suitable for real estate professionals.
         """
         
-        return self._make_request(prompt)
+        return {"prompt": prompt, "analysis_type": "market_report"}
     
     def analyze_investment_potential(self, property_data: Dict, market_data: Dict) -> Dict:
         """Analyze property as an investment opportunity"""
         if not self.client:
             return {"error": "Claude API key not configured"}
-        
+        return self._make_request(**self._investment_request(property_data, market_data))
+
+    async def analyze_investment_potential_async(self, property_data: Dict, market_data: Dict) -> Dict:
+        """Async counterpart of analyze_investment_potential"""
+        if not self.async_client:
+            return {"error": "Claude API key not configured"}
+        return await self._make_request_async(**self._investment_request(property_data, market_data))
+
+    def _investment_request(self, property_data: Dict, market_data: Dict) -> Dict:
+        """Build the request for analyze_investment_potential"""
         prompt = f"""
         Analyze this property's investment potential:
 
         PROPERTY DATA:
-        {json.dumps(property_data, indent=2)}
+        {self.budget.fit_json(property_data, 800)}
 
         MARKET DATA:
-        {json.dumps(market_data, indent=2)}
+        {self.budget.fit_json(market_data, 800)}
 
         Provide investment analysis:
         1. CASH FLOW ANALYSIS - estimated rental income vs expenses
@@ -335,18 +513,46 @@ class ClaudeAnalyzer:
         Include specific numbers and calculations where possible.
         """
         
-        return self._make_request(prompt)
+        return {"prompt": prompt, "analysis_type": "investment"}
     
-    def analyze_flip_potential(self, property_data: Dict, comparables: List[Dict]) -> Dict:
+    def analyze_flip_potential(self, property_data: Dict, comparables: List[Dict],
+                               on_section: Optional[Callable[[str, Any], None]] = None,
+                               deadline: Optional[float] = None,
+                               reference_valuation: Optional[Dict] = None) -> Dict:
         """Analyze property for flip/investment potential with financial metrics"""
         if not self.client:
             return {"error": "Claude API key not configured"}
+        request, local_results = self._flip_request(property_data, comparables, reference_valuation)
+        result = self._make_request(on_section=on_section, deadline=deadline, **request)
+        if result.get("success"):
+            result.update(local_results)
+        return result
+
+    async def analyze_flip_potential_async(self, property_data: Dict, comparables: List[Dict],
+                                           on_section: Optional[Callable[[str, Any], None]] = None,
+                                           deadline: Optional[float] = None,
+                                           reference_valuation: Optional[Dict] = None) -> Dict:
+        """Async counterpart of analyze_flip_potential"""
+        if not self.async_client:
+            return {"error": "Claude API key not configured"}
+        request, local_results = self._flip_request(property_data, comparables, reference_valuation)
+        result = await self._make_request_async(on_section=on_section, deadline=deadline, **request)
+        if result.get("success"):
+            result.update(local_results)
+        return result
+
+    def _flip_request(self, property_data: Dict, comparables: List[Dict],
+                      reference_valuation: Optional[Dict] = None) -> Tuple[Dict, Dict]:
+        """Build the request for analyze_flip_potential plus the locally computed flip_metrics and flip_simulation"""
+        if reference_valuation is None:
+            reference_valuation = estimate_value(property_data, comparables)
 
         # Calculate basic financial metrics locally
         price = property_data.get('price')
         sqft = property_data.get('sqft')
 
         flip_metrics = {}
+        flip_simulation = None
         if price:
             try:
                 purchase_price = float(str(price).replace(',', ''))
@@ -371,19 +577,11 @@ class ClaudeAnalyzer:
                     "roi_percentage": round(roi, 1),
                     "price_per_sqft": round(purchase_price / float(sqft)) if sqft else None,
                 }
+                flip_simulation = simulate_flip(purchase_price, arv)
             except (ValueError, TypeError):
                 pass
 
         prompt = f"""
-        You are an experienced real estate investor analyzing a potential flip deal.
-        Provide a realistic, numbers-driven analysis. Do NOT use distressed sale prices as ARV targets.
-
-        CRITICAL: ARV (After Repair Value) must be based on:
-        - Recent arm's-length sales of RENOVATED/UPDATED properties in the same area
-        - NOT foreclosures, probate, short sales, or distressed transactions
-        - Properties in good/excellent condition (post-renovation comparable)
-        - Similar size, bed/bath count, and location to subject
-
         SUBJECT PROPERTY:
         Address: {property_data.get('address', 'Unknown')}
         Asking Price: ${property_data.get('price', 'Unknown')}
@@ -396,89 +594,177 @@ class ClaudeAnalyzer:
         Year Built: {property_data.get('year_built', 'Unknown')}
         Description: {(property_data.get('description') or 'No description')[:300]}
 
-        IMPORTANT: If the property has a finished basement, the ARV should reflect the TOTAL
-        living space, not just above-grade sqft. Finished basements in CT typically add $30-60/sqft
-        in value (less than above-grade but significant). Factor this into ARV calculation.
-
         COMPARABLE SALES (pre-filtered, distressed sales removed):
-        {self._format_comparables_for_analysis(comparables)}
+        {self._format_comparables_for_analysis(comparables, property_data)}
+
+        LOCAL REFERENCE VALUATION (as-is FMV from a deterministic adjusted-comp model):
+        {self._format_reference_valuation(reference_valuation)}
 
         PRELIMINARY CALCULATED METRICS (verify and adjust these):
-        {json.dumps(flip_metrics, indent=2)}
-
-        The preliminary metrics use generic formulas (15% renovation, 70% rule).
-        Override these with your actual market knowledge for this specific area and property.
-
-        Provide flip analysis in JSON format:
-        {{
-            "flip_score": "1-10 rating with justification",
-            "recommendation": "strong_buy / buy / consider / pass",
-            "arv_assessment": {{
-                "estimated_arv": "Your ARV as a dollar amount",
-                "arv_per_sqft": "Target $/sqft for renovated property in this area",
-                "arv_methodology": "How you determined ARV - which comps, what adjustments",
-                "arv_confidence": "High/Medium/Low"
-            }},
-            "acquisition_analysis": {{
-                "max_allowable_offer": "Maximum you should pay using 70% rule",
-                "is_asking_price_viable": "Yes/No with reasoning",
-                "negotiation_target": "What to offer and why"
-            }},
-            "renovation_scope": {{
-                "estimated_cost_low": "Conservative reno budget",
-                "estimated_cost_high": "Full renovation budget",
-                "priority_items": ["specific renovation items with estimated costs"],
-                "timeline_months": "realistic timeline",
-                "scope_level": "cosmetic / moderate / full gut"
-            }},
-            "financial_summary": {{
-                "total_cost_in": "Purchase + reno + holding + closing",
-                "expected_arv": "After repair value",
-                "expected_profit": "Most likely profit",
-                "best_case_profit": "optimistic scenario with assumptions",
-                "worst_case_profit": "conservative scenario with assumptions",
-                "expected_roi": "ROI percentage",
-                "cash_needed": "Total cash required"
-            }},
-            "deal_breakers": ["Any absolute no-go factors"],
-            "market_factors": "Local market conditions affecting this flip - be specific",
-            "risks": ["Specific risk factors ranked by severity"],
-            "exit_strategies": ["Ranked exit options if flip doesn't work"]
-        }}
-
-        Be specific with dollar amounts. Use your knowledge of {property_data.get('address', 'this area')}'s
-        actual market conditions, not generic assumptions.
+        {self.budget.compact_json(flip_metrics)}
+
+        MONTE CARLO OUTCOMES (100k scenarios of reno cost, holding time, ARV and selling costs):
+        {self._format_flip_simulation(flip_simulation)}
+
+        Focus your market knowledge on {property_data.get('address', 'this area')}.
         """
 
-        result = self._make_request(prompt)
-        if result.get("success"):
-            result["flip_metrics"] = flip_metrics
+        request = {"prompt": prompt, "system": FLIP_INSTRUCTIONS, "analysis_type": "flip"}
+        return request, {"flip_metrics": flip_metrics, "flip_simulation": flip_simulation}
+
+    @staticmethod
+    def _format_flip_simulation(simulation: Optional[Dict]) -> str:
+        """One-line summary of a flip_simulation result for the prompt"""
+        if not simulation:
+            return "Not available (no asking price)"
+        profit = simulation['profit_percentiles']
+        roi = simulation['roi_percentiles']
+        return (f"profit p5 ${profit['p5']:,} / p50 ${profit['p50']:,} / p95 ${profit['p95']:,}, "
+                f"ROI p5 {roi['p5']}% / p50 {roi['p50']}% / p95 {roi['p95']}%, "
+                f"probability of loss {simulation['probability_of_loss']:.0%}")
+
+    @traced('prompt_build')
+    def _build_request(self, prompt: str, system: Optional[str], analysis_type: Optional[str],
+                       tier: Optional[str] = None, tool: Optional[Dict] = None) -> Dict:
+        """Assemble Messages API parameters with the routed model, adaptive max_tokens and cached system prefix.
+
+        Analysis types with an output schema force a tool call whose input_schema
+        is that schema; ``tool`` overrides it (used for repairs).
+        """
+        # Interpolated multi-line values defeat textwrap.dedent, so strip each line instead
+        prompt = "\n".join(line.strip() for line in prompt.strip().splitlines())
+        tier = tier or self.router.tier_for(analysis_type)
+        max_tokens = self.budget.max_tokens_for(analysis_type)
+        cap = self.router.max_tokens_cap(analysis_type)
+        if cap:
+            max_tokens = min(max_tokens, cap)
+        estimated_input = self.budget.estimate_tokens(prompt) + self.budget.estimate_tokens(system or '')
+        logger.info(f"Claude request ({analysis_type or 'untyped'}, {tier}): ~{estimated_input} input tokens, "
+                    f"max_tokens={max_tokens}")
+        request = {
+            "model": self.router.model_for(tier),
+            "max_tokens": max_tokens,
+            "temperature": 0.2,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        }
+        if system:
+            request["system"] = [
+                {
+                    "type": "text",
+                    "text": system,
+                    "cache_control": {"type": "ephemeral"}
+                }
+            ]
+        tool = tool or tool_for(analysis_type)
+        if tool:
+            request["tools"] = [tool]
+            request["tool_choice"] = {"type": "tool", "name": tool["name"]}
+        return request
+
+    def _build_result(self, message, content: str, analysis_type: Optional[str], tier: Optional[str] = None,
+                      escalated_from: Optional[str] = None) -> Dict:
+        """Convert an API message into the analyzer's result dict"""
+        self.budget.record_output(analysis_type, message.usage.output_tokens, message.stop_reason)
+        result = {
+            "success": True,
+            "content": content,
+            "model": message.model,
+            "usage": {
+                "input_tokens": message.usage.input_tokens,
+                "output_tokens": message.usage.output_tokens,
+                "cache_creation_input_tokens": getattr(message.usage, "cache_creation_input_tokens", None) or 0,
+                "cache_read_input_tokens": getattr(message.usage, "cache_read_input_tokens", None) or 0
+            }
+        }
+        if tier:
+            result["tier"] = tier
+        if escalated_from:
+            result["escalated_from"] = escalated_from
         return result
 
-    def _make_request(self, prompt: str) -> Dict:
-        """Make request to Claude API"""
+    def _make_request(self, prompt: str, system: Optional[str] = None,
+                      on_section: Optional[Callable[[str, Any], None]] = None,
+                      analysis_type: Optional[str] = None, deadline: Optional[float] = None) -> Dict:
+        """Make request to Claude API, streaming when a section callback is given.
+
+        ``system`` holds static instructions; it is marked for prompt caching so
+        repeat analyses only pay full price for the per-property ``prompt``.
+        ``analysis_type`` selects the model tier, adaptive max_tokens and output
+        schema; output that fails the router's checks is redone on the next tier
+        up, and schema-invalid fields alone are sent back for one repair pass.
+        Transient failures (429/529/5xx, timeouts) are retried within ``deadline``.
+        """
         try:
-            message = self.client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=6000,
-                temperature=0.2,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            )
+            emit = self._dedupe_sections(on_section)
+            deadline = self._deadline(deadline)
+            started_at = time.monotonic()
+            hedge_after = self._hedge_after(analysis_type, on_section)
+            tier = self.router.tier_for(analysis_type)
+            escalated_from = None
+
+            while True:
+                request = self._build_request(prompt, system, analysis_type, tier)
+                message, content = call_with_retries(self._attempt(request, emit, analysis_type, tier),
+                                                     self.retry_policy, self._remaining(deadline, started_at),
+                                                     hedge_after)
+                next_tier = self._escalate(analysis_type, tier, message, content)
+                if next_tier is None:
+                    break
+                escalated_from, tier = escalated_from or tier, next_tier
+
+            result = self._build_result(message, content, analysis_type, tier, escalated_from)
+            repair = self._repair_request(prompt, system, analysis_type, tier, result)
+            if repair:
+                request, analysis, fields = repair
+                message, content = call_with_retries(self._attempt(request, None, analysis_type, tier),
+                                                     self.retry_policy, self._remaining(deadline, started_at))
+                self._apply_repair(result, analysis_type, analysis, fields, message, content, on_section)
+            return result
             
+        except Exception as e:
+            logger.error(f"Claude API error: {e}")
             return {
-                "success": True,
-                "content": message.content[0].text,
-                "usage": {
-                    "input_tokens": message.usage.input_tokens,
-                    "output_tokens": message.usage.output_tokens
-                }
+                "success": False,
+                "error": str(e)
             }
-            
+
+    async def _make_request_async(self, prompt: str, system: Optional[str] = None,
+                                  on_section: Optional[Callable[[str, Any], None]] = None,
+                                  analysis_type: Optional[str] = None, deadline: Optional[float] = None) -> Dict:
+        """Async counterpart of _make_request on the AsyncAnthropic client"""
+        try:
+            emit = self._dedupe_sections(on_section)
+            deadline = self._deadline(deadline)
+            started_at = time.monotonic()
+            hedge_after = self._hedge_after(analysis_type, on_section)
+            tier = self.router.tier_for(analysis_type)
+            escalated_from = None
+
+            while True:
+                request = self._build_request(prompt, system, analysis_type, tier)
+                message, content = await call_with_retries_async(
+                    self._attempt_async(request, emit, analysis_type, tier),
+                    self.retry_policy, self._remaining(deadline, started_at), hedge_after)
+                next_tier = self._escalate(analysis_type, tier, message, content)
+                if next_tier is None:
+                    break
+                escalated_from, tier = escalated_from or tier, next_tier
+
+            result = self._build_result(message, content, analysis_type, tier, escalated_from)
+            repair = self._repair_request(prompt, system, analysis_type, tier, result)
+            if repair:
+                request, analysis, fields = repair
+                message, content = await call_with_retries_async(
+                    self._attempt_async(request, None, analysis_type, tier),
+                    self.retry_policy, self._remaining(deadline, started_at))
+                self._apply_repair(result, analysis_type, analysis, fields, message, content, on_section)
+            return result
+
         except Exception as e:
             logger.error(f"Claude API error: {e}")
             return {
@@ -486,6 +772,157 @@ class ClaudeAnalyzer:
                 "error": str(e)
             }
 
+    def _attempt(self, request: Dict, emit, analysis_type: Optional[str], tier: str):
+        """One rate-limited API call for call_with_retries, streaming sections to ``emit`` if given"""
+        def attempt(timeout):
+            options = {"timeout": timeout} if timeout is not None else {}
+            with self.limiter.acquire(self._reserved_tokens(request)) as slot, span('llm_call', tier):
+                started = time.monotonic()
+                if emit is None:
+                    message = self.client.messages.create(**request, **options)
+                else:
+                    parser = StreamingJSONParser()
+                    with self.client.messages.stream(**request, **options) as stream:
+                        for event in stream:
+                            self._feed_event(parser, event, emit)
+                        message = stream.get_final_message()
+                self._record_call(analysis_type, tier, time.monotonic() - started, message, slot)
+            return message, self._message_content(message)
+
+        return attempt
+
+    def _attempt_async(self, request: Dict, emit, analysis_type: Optional[str], tier: str):
+        """Async counterpart of _attempt"""
+        async def attempt(timeout):
+            options = {"timeout": timeout} if timeout is not None else {}
+            async with self.limiter.acquire_async(self._reserved_tokens(request)) as slot:
+                started = time.monotonic()
+                with span('llm_call', tier):
+                    if emit is None:
+                        message = await self.async_client.messages.create(**request, **options)
+                    else:
+                        parser = StreamingJSONParser()
+                        async with self.async_client.messages.stream(**request, **options) as stream:
+                            async for event in stream:
+                                self._feed_event(parser, event, emit)
+                            message = await stream.get_final_message()
+                self._record_call(analysis_type, tier, time.monotonic() - started, message, slot)
+            return message, self._message_content(message)
+
+        return attempt
+
+    @staticmethod
+    def _feed_event(parser: StreamingJSONParser, event, emit):
+        """Feed text or tool-input JSON deltas to the section parser"""
+        if event.type != "content_block_delta":
+            return
+        delta = event.delta
+        text = delta.text if delta.type == "text_delta" else (
+            delta.partial_json if delta.type == "input_json_delta" else None)
+        if text:
+            for key, value in parser.feed(text):
+                emit(key, value)
+
+    @staticmethod
+    def _message_content(message) -> str:
+        """Response body as text: the forced tool's input as JSON, else the text blocks"""
+        for block in message.content:
+            if block.type == "tool_use":
+                return json.dumps(block.input)
+        return "".join(block.text for block in message.content if block.type == "text")
+
+    def _record_call(self, analysis_type: Optional[str], tier: str, elapsed: float, message, slot):
+        self.latency.record(analysis_type or "untyped", elapsed)
+        self.router.record(tier, elapsed, message.usage)
+        slot.settle(message.usage.input_tokens + message.usage.output_tokens)
+
+    def _repair_request(self, prompt: str, system: Optional[str], analysis_type: Optional[str], tier: str,
+                        result: Dict) -> Optional[Tuple[Dict, Dict, List[str]]]:
+        """Validate a schema-typed result in place; returns (request, analysis, fields) when a repair is needed"""
+        if analysis_type not in SCHEMAS:
+            return None
+        analysis, cut = parse_json_checked(result["content"])
+        if not isinstance(analysis, dict):
+            return None
+        analysis, errors = check_analysis(analysis_type, analysis)
+        if cut is not None:
+            # Truncated output: sections cut mid-value are re-requested even if what remains validates
+            result["truncated"] = True
+            properties = SCHEMAS[analysis_type][2]['properties']
+            errors += [((key,), 'cut off by truncated output') for key in cut
+                       if key in properties and key not in invalid_fields(errors)]
+        result["content"] = json.dumps(analysis)
+        fields = invalid_fields(errors)
+        if not fields:
+            return None
+        logger.info(f"Repairing {analysis_type} fields {fields}:\n{describe_errors(errors)}")
+        request = self._build_request(repair_prompt(prompt, analysis, errors), system, analysis_type, tier,
+                                      tool=tool_for(analysis_type, fields))
+        return request, analysis, fields
+
+    def _apply_repair(self, result: Dict, analysis_type: str, analysis: Dict, fields: List[str], message,
+                      content: str, on_section: Optional[Callable[[str, Any], None]]):
+        """Merge repaired fields into the result and re-check it"""
+        repaired = parse_json_text(content) or {}
+        merged = dict(analysis, **{f: repaired[f] for f in fields if f in repaired})
+        merged, errors = check_analysis(analysis_type, merged)
+        result["content"] = json.dumps(merged)
+        result["repaired_fields"] = fields
+        if errors:
+            result["validation_errors"] = describe_errors(errors).splitlines()
+        result["usage"]["input_tokens"] += message.usage.input_tokens
+        result["usage"]["output_tokens"] += message.usage.output_tokens
+        # Bypass section de-duplication: repaired sections replace what was streamed earlier
+        if on_section:
+            for field in fields:
+                if field in repaired:
+                    on_section(field, merged[field])
+
+    def _deadline(self, deadline: Optional[float]) -> Optional[float]:
+        return deadline if deadline is not None else self.deadline
+
+    @staticmethod
+    def _remaining(deadline: Optional[float], started_at: float) -> Optional[float]:
+        """Deadline left for the next tier after any escalated attempts"""
+        return None if deadline is None else deadline - (time.monotonic() - started_at)
+
+    def _escalate(self, analysis_type: Optional[str], tier: str, message, content: str) -> Optional[str]:
+        """The tier to redo this request on, or None to accept ``content``"""
+        reason = self.router.escalation_reason(analysis_type, tier, content, message.stop_reason)
+        if reason is None:
+            return None
+        next_tier = self.router.next_tier(tier)
+        logger.info(f"Escalating {analysis_type or 'untyped'} from {tier} to {next_tier}: {reason}")
+        self.router.record_escalation(tier)
+        return next_tier
+
+    def _hedge_after(self, analysis_type: Optional[str], on_section) -> Optional[float]:
+        """Latency after which to hedge, or None. Streamed requests are never hedged."""
+        if not self.hedge or on_section is not None:
+            return None
+        return self.latency.percentile(analysis_type or "untyped", self.hedge_percentile)
+
+    @staticmethod
+    def _dedupe_sections(on_section):
+        """Wrap the section callback so a retried stream doesn't re-emit finished sections"""
+        if on_section is None:
+            return None
+        emitted = set()
+
+        def emit(key, value):
+            if key not in emitted:
+                emitted.add(key)
+                on_section(key, value)
+        return emit
+
+    def _reserved_tokens(self, request: Dict) -> int:
+        """Tokens to hold against the per-minute budget until actual usage is known"""
+        system_text = "".join(block["text"] for block in request.get("system", []))
+        tools_text = json.dumps(request["tools"]) if request.get("tools") else ""
+        return (self.budget.estimate_tokens(request["messages"][0]["content"])
+                + self.budget.estimate_tokens(system_text) + self.budget.estimate_tokens(tools_text)
+                + request["max_tokens"])
+
 # Example usage
 if __name__ == "__main__":
     analyzer = ClaudeAnalyzer()
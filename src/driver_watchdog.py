@@ -0,0 +1,129 @@
+"""
+Health checks for long-lived browsers
+Samples each browser's process-tree RSS from /proc and keeps its recent
+page-load times and page count, and says when a browser should be recycled:
+past a memory ceiling, a page-count limit, or a slow-load threshold. The
+browser pool acts on the verdict between jobs
+"""
+
+import logging
+import os
+import statistics
+import threading
+from collections import Counter, deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def process_tree_rss(pid: int) -> Optional[int]:
+    """Resident bytes of ``pid`` and all its descendants; None without /proc or if ``pid`` is gone"""
+    children: Dict[int, list] = {}
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return None
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces and parens; fields resume after the last ')'
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total, found, pending = 0, False, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        break
+            found = True
+        except (OSError, ValueError):
+            pass
+        pending.extend(children.get(current, []))
+    return total if found else None
+
+
+def driver_rss(driver) -> Optional[int]:
+    """RSS of a local WebDriver's chromedriver process and the Chrome tree under it"""
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    pid = getattr(process, 'pid', None)
+    return process_tree_rss(pid) if pid else None
+
+
+class DriverHealth:
+    """What the watchdog knows about one browser"""
+
+    def __init__(self, window: int):
+        self.pages = 0
+        self.load_times = deque(maxlen=window)
+        self.rss_bytes: Optional[int] = None
+
+
+class DriverWatchdog:
+    def __init__(self, max_rss_mb: Optional[float] = None, max_pages: Optional[int] = None,
+                 max_load_seconds: Optional[float] = None, interval: Optional[float] = None,
+                 window: int = 20, min_loads: int = 5, rss_of: Callable[[Any], Optional[int]] = driver_rss):
+        """Recycle a browser past ``max_rss_mb`` (BROWSER_MAX_RSS_MB, default 1500), ``max_pages``
+        page loads (BROWSER_MAX_PAGES, default 200) or a median load over its last ``window`` pages
+        above ``max_load_seconds`` (BROWSER_MAX_LOAD_SECONDS, default 20). 0 disables a check.
+
+        ``interval`` (BROWSER_WATCHDOG_INTERVAL, default 30 s; 0 for between jobs only) is how often
+        the pool samples idle and busy browsers in the background.
+        """
+        self.max_rss_bytes = (max_rss_mb if max_rss_mb is not None
+                              else float(os.getenv('BROWSER_MAX_RSS_MB', '1500'))) * 1024 * 1024
+        self.max_pages = max_pages if max_pages is not None else int(os.getenv('BROWSER_MAX_PAGES', '200'))
+        self.max_load_seconds = (max_load_seconds if max_load_seconds is not None
+                                 else float(os.getenv('BROWSER_MAX_LOAD_SECONDS', '20')))
+        self.interval = interval if interval is not None else float(os.getenv('BROWSER_WATCHDOG_INTERVAL', '30'))
+        self.window = window
+        self.min_loads = min_loads
+        self.rss_of = rss_of
+        self.recycles = Counter()
+        self._lock = threading.Lock()
+
+    def new_health(self) -> DriverHealth:
+        return DriverHealth(self.window)
+
+    def record_load(self, health: DriverHealth, seconds: float):
+        with self._lock:
+            health.pages += 1
+            health.load_times.append(seconds)
+
+    def sample(self, health: DriverHealth, driver) -> Optional[int]:
+        """Re-read the browser's RSS"""
+        try:
+            health.rss_bytes = self.rss_of(driver)
+        except Exception as e:
+            logger.debug(f"RSS sample failed: {e}")
+        return health.rss_bytes
+
+    def verdict(self, health: DriverHealth, driver) -> Optional[str]:
+        """Why the browser should be recycled ('pages', 'rss' or 'latency'), or None if it is healthy"""
+        if self.max_pages and health.pages >= self.max_pages:
+            return 'pages'
+        rss = self.sample(health, driver)
+        if self.max_rss_bytes and rss is not None and rss > self.max_rss_bytes:
+            return 'rss'
+        with self._lock:
+            loads = list(health.load_times)
+        if self.max_load_seconds and len(loads) >= self.min_loads and statistics.median(loads) > self.max_load_seconds:
+            return 'latency'
+        return None
+
+    def recycled(self, reason: str, health: DriverHealth):
+        with self._lock:
+            self.recycles[reason] += 1
+        rss = f", {health.rss_bytes / 1048576:.0f} MB" if health.rss_bytes else ''
+        logger.info(f"Recycling browser ({reason}) after {health.pages} pages{rss}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.recycles)
@@ -0,0 +1,97 @@
+"""
+Vectorized Monte Carlo scenario engine for flip analysis
+Samples renovation cost, holding time, ARV and selling costs from configurable
+distributions, returns profit/ROI percentiles over all scenarios in one NumPy
+pass, plus an ROI sensitivity grid over offer price and renovation budget
+"""
+
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+# Each entry is (distribution, *params):
+#   ('triangular', low, mode, high) | ('normal', mean, sd) | ('uniform', low, high) | ('fixed', value)
+# Percentages are fractions of the purchase price except arv_factor (of the base ARV)
+# and selling_pct (of the sale price).
+DEFAULT_DISTRIBUTIONS = {
+    'renovation_pct': ('triangular', 0.10, 0.15, 0.25),
+    'holding_months': ('triangular', 3, 5, 9),
+    'monthly_holding_pct': ('fixed', 0.004),
+    'arv_factor': ('normal', 1.0, 0.08),
+    'selling_pct': ('uniform', 0.05, 0.07),
+}
+
+DEFAULT_SCENARIOS = 100_000
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Sensitivity grid: offer as a fraction of asking, renovation budget as a fraction of asking
+OFFER_STEPS = (0.80, 0.85, 0.90, 0.95, 1.00)
+RENO_STEPS = (0.10, 0.15, 0.20, 0.25, 0.30)
+# The grid reuses a subsample of the scenarios; the median is stable well before 100k
+SENSITIVITY_SAMPLES = 10_000
+
+
+def _sample(rng: np.random.Generator, spec, n: int) -> np.ndarray:
+    kind, *params = spec
+    if kind == 'triangular':
+        return rng.triangular(*params, size=n)
+    if kind == 'normal':
+        return rng.normal(*params, size=n)
+    if kind == 'uniform':
+        return rng.uniform(*params, size=n)
+    if kind == 'fixed':
+        return np.full(n, float(params[0]))
+    raise ValueError(f"Unknown distribution: {kind}")
+
+
+def _percentiles(values: np.ndarray, digits: int = 0) -> Dict[str, float]:
+    points = np.percentile(values, PERCENTILES)
+    return {f"p{p}": round(float(v), digits) if digits else int(round(v)) for p, v in zip(PERCENTILES, points)}
+
+
+def simulate_flip(purchase_price: float, arv: float, distributions: Optional[Dict] = None,
+                  scenarios: int = DEFAULT_SCENARIOS, seed: Optional[int] = None,
+                  offer_steps: Sequence[float] = OFFER_STEPS, reno_steps: Sequence[float] = RENO_STEPS) -> Dict:
+    """Profit/ROI distribution for buying at ``purchase_price`` and selling around ``arv``.
+
+    ``sensitivity.median_roi`` rows follow ``offer_prices`` and columns follow ``renovation_budgets``.
+    """
+    started = time.perf_counter()
+    dists = dict(DEFAULT_DISTRIBUTIONS, **(distributions or {}))
+    rng = np.random.default_rng(seed)
+
+    renovation = _sample(rng, dists['renovation_pct'], scenarios) * purchase_price
+    months = np.maximum(_sample(rng, dists['holding_months'], scenarios), 0)
+    holding = months * _sample(rng, dists['monthly_holding_pct'], scenarios) * purchase_price
+    sale_price = np.maximum(_sample(rng, dists['arv_factor'], scenarios), 0) * arv
+    selling_pct = _sample(rng, dists['selling_pct'], scenarios)
+    selling = selling_pct * sale_price
+
+    investment = purchase_price + renovation + holding + selling
+    profit = sale_price - investment
+    roi = profit / investment * 100
+
+    # Grid: offers x reno budgets x subsampled scenarios, holding scaled to each offer
+    k = min(SENSITIVITY_SAMPLES, scenarios)
+    offers = np.asarray(offer_steps) * purchase_price
+    budgets = np.asarray(reno_steps) * purchase_price
+    hold_rate = (holding[:k] / purchase_price)[None, None, :]
+    sale_k = sale_price[None, None, :k]
+    sell_k = selling[None, None, :k]
+    grid_investment = offers[:, None, None] * (1 + hold_rate) + budgets[None, :, None] + sell_k
+    grid_roi = np.median((sale_k - grid_investment) / grid_investment * 100, axis=2)
+
+    return {
+        'scenarios': scenarios,
+        'profit_percentiles': _percentiles(profit),
+        'roi_percentiles': _percentiles(roi, digits=1),
+        'expected_profit': int(round(profit.mean())),
+        'probability_of_loss': round(float((profit < 0).mean()), 3),
+        'sensitivity': {
+            'offer_prices': [int(round(o)) for o in offers],
+            'renovation_budgets': [int(round(b)) for b in budgets],
+            'median_roi': np.round(grid_roi, 1).tolist(),
+        },
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
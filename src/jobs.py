@@ -0,0 +1,229 @@
+"""
+Background analysis jobs
+Runs analyses on a bounded executor so web workers return immediately; job
+status, stage-by-stage progress and the final response are kept in the
+result store for polling and later retrieval. Each job records its owning
+process and a heartbeat, so workers sharing one store only fail jobs whose
+owner has died or gone silent
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+from admission import Overloaded
+from pipeline import STAGES
+
+logger = logging.getLogger(__name__)
+
+JOB_KIND = 'job'
+TERMINAL_STATUSES = ('succeeded', 'failed')
+
+
+class JobQueueFull(Exception):
+    """Too many jobs are already queued or running"""
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobManager:
+    def __init__(self, runner: Callable[..., Tuple[Dict, int]], store=None, max_workers: Optional[int] = None,
+                 max_pending: Optional[int] = None, store_factory: Optional[Callable] = None,
+                 heartbeat_interval: Optional[float] = None, stale_after: Optional[float] = None,
+                 overload_retries: Optional[int] = None):
+        """Run ``runner(request_json, analysis, on_stage=...) -> (payload, http_status)`` in the background.
+
+        Jobs are kept in ``store``, or one made by ``store_factory`` (default a ResultStore) on first use.
+        ``max_workers`` (JOB_WORKERS, default 4) bounds concurrent jobs and
+        ``max_pending`` (JOB_QUEUE_LIMIT, default 100) bounds queued plus running ones.
+        Unfinished jobs get a heartbeat every ``heartbeat_interval`` seconds (JOB_HEARTBEAT_INTERVAL,
+        default 15); another process's job is failed once its owner is gone or its heartbeat is
+        older than ``stale_after`` seconds (JOB_STALE_AFTER, default 60).
+        A job turned away by admission control waits its ``retry_after`` and runs again, up to
+        ``overload_retries`` times (JOB_OVERLOAD_RETRIES, default 20), before it fails.
+        """
+        self.runner = runner
+        self._store = store
+        self._store_factory = store_factory
+        self.max_workers = max_workers or int(os.getenv('JOB_WORKERS', '4'))
+        self.max_pending = max_pending or int(os.getenv('JOB_QUEUE_LIMIT', '100'))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='analysis-job')
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.heartbeat_interval = heartbeat_interval or float(os.getenv('JOB_HEARTBEAT_INTERVAL', '15'))
+        self.stale_after = stale_after or float(os.getenv('JOB_STALE_AFTER', '60'))
+        self.overload_retries = (overload_retries if overload_retries is not None
+                                 else int(os.getenv('JOB_OVERLOAD_RETRIES', '20')))
+        self.owner = {'host': socket.gethostname(), 'pid': os.getpid(), 'manager': uuid.uuid4().hex}
+        self._active: Dict[str, Dict] = {}  # this manager's unfinished jobs, by id
+        self._save_lock = threading.RLock()
+        self._heartbeat = None
+        self._stopped = threading.Event()
+
+    @property
+    def store(self):
+        """Opened on first use so importing the app doesn't create the database"""
+        if self._store is None:
+            if self._store_factory is None:
+                from result_store import ResultStore
+                self._store_factory = ResultStore
+            self._store = self._store_factory()
+            self._fail_interrupted()
+        return self._store
+
+    def _fail_interrupted(self):
+        """Jobs whose owning process died will never finish"""
+        for job_id, job in list(self._store.items(JOB_KIND)):
+            self._fail_if_interrupted(job_id, job)
+
+    def _interrupted(self, job: Dict) -> bool:
+        """Whether an unfinished job's owner is gone: dead on this host, or silent past stale_after"""
+        if job['status'] in TERMINAL_STATUSES:
+            return False
+        owner = job.get('owner') or {}
+        if owner.get('host') == self.owner['host']:
+            if owner.get('manager') == self.owner['manager']:
+                # Our own worker always stores an outcome, so our jobs are never interrupted
+                return False
+            if not _pid_alive(owner.get('pid')):
+                return True
+        beat = job.get('heartbeat_at') or job.get('started_at') or job.get('created_at') or 0
+        return time.time() - beat > self.stale_after
+
+    def _fail_if_interrupted(self, job_id: str, job: Dict) -> Optional[Dict]:
+        """The job, failed if its owner is gone; ``job`` may be a stale read, so the stored record decides"""
+        if not self._interrupted(job):
+            return job
+        with self._save_lock:
+            # The worker may have stored its outcome since ``job`` was read
+            job = self._store.get(job_id, JOB_KIND)
+            if job is None or not self._interrupted(job):
+                return job
+            job.update(status='failed', error='Interrupted: the worker running it stopped', finished_at=time.time())
+            self._store.put(job_id, JOB_KIND, job)
+        logger.warning(f"Job {job_id} failed: owner {job.get('owner')} is gone")
+        return job
+
+    def _save(self, job: Dict, **changes):
+        """Apply ``changes`` and store the job; serialized with the heartbeat writing the same record"""
+        with self._save_lock:
+            job.update(changes)
+            self.store.put(job['id'], JOB_KIND, job)
+
+    def _start_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is not None:
+                return
+            self._heartbeat = threading.Thread(target=self._beat, name='job-heartbeat', daemon=True)
+        self._heartbeat.start()
+
+    def _beat(self):
+        while not self._stopped.wait(self.heartbeat_interval):
+            with self._lock:
+                active = list(self._active.values())
+            for job in active:
+                try:
+                    self._save(job, heartbeat_at=time.time())
+                except Exception as e:
+                    logger.warning(f"Job heartbeat failed: {e}")
+
+    def submit(self, request_json: Dict, analysis: str) -> Dict:
+        """Queue an analysis and return the new job record"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"{self._pending} analysis jobs already pending")
+            self._pending += 1
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'analysis': analysis,
+            'address': request_json.get('address'),
+            'stages': {stage: 'pending' for stage in STAGES},
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'owner': self.owner,
+            'heartbeat_at': time.time(),
+        }
+        with self._lock:
+            self._active[job['id']] = job
+        self._save(job)
+        snapshot = dict(job, stages=dict(job['stages']))
+        self._start_heartbeat()
+        try:
+            self._executor.submit(self._run, job, dict(request_json))
+        except RuntimeError:
+            with self._lock:
+                self._pending -= 1
+                self._active.pop(job['id'], None)
+            self._save(job, status='failed', error='Job manager is shut down', finished_at=time.time())
+            raise
+        logger.info(f"Queued {analysis} job {job['id']} for {job['address']}")
+        # The worker keeps updating its own copy
+        return snapshot
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        job = self.store.get(job_id, JOB_KIND)
+        return self._fail_if_interrupted(job_id, job) if job is not None else None
+
+    def _run(self, job: Dict, request_json: Dict):
+        now = time.time()
+        self._save(job, status='running', started_at=now, heartbeat_at=now)
+
+        def on_stage(stage, status):
+            self._save(job, stages=dict(job['stages'], **{stage: status}), current_stage=stage)
+
+        outcome = {}
+        try:
+            payload, http_status = self._run_admitted(job, request_json, on_stage)
+            outcome = dict(status='succeeded' if http_status < 400 else 'failed', result=payload,
+                           result_status=http_status, error=payload.get('error'))
+        except Exception as e:
+            logger.exception(f"Job {job['id']} failed")
+            outcome = dict(status='failed', error=str(e), result_status=500)
+        finally:
+            with self._save_lock:
+                job.update(outcome, finished_at=time.time())
+                job.pop('current_stage', None)
+                self.store.put(job['id'], JOB_KIND, job)
+            with self._lock:
+                self._pending -= 1
+                self._active.pop(job['id'], None)
+
+    def _run_admitted(self, job: Dict, request_json: Dict, on_stage) -> Tuple[Dict, int]:
+        """Call the runner, waiting out admission overloads: a queued job should wait for a browser, not fail"""
+        for attempt in range(self.overload_retries + 1):
+            try:
+                return self.runner(request_json, job['analysis'], on_stage=on_stage)
+            except Overloaded as e:
+                if attempt == self.overload_retries:
+                    return {'error': str(e), 'address': job['address']}, 503
+                logger.info(f"Job {job['id']} waiting {e.retry_after}s for {e.resource} capacity")
+                self._save(job, waiting_for=e.resource, admission_retries=attempt + 1)
+                time.sleep(e.retry_after)
+                with self._save_lock:
+                    job.pop('waiting_for', None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'pending': self._pending, 'max_pending': self.max_pending, 'workers': self.max_workers}
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+        self._stopped.set()
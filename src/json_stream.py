@@ -0,0 +1,197 @@
+"""
+Incremental JSON parser for Claude's streamed analysis output
+Emits each top-level section of the response object as soon as it closes,
+skips prose around the JSON, and repairs output that was cut off mid-stream
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# How many truncation points to try (newest first) before giving up on a repair
+MAX_REPAIR_ATTEMPTS = 64
+
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+class StreamingJSONParser:
+    """Consume text chunks and yield completed top-level (key, value) pairs.
+
+    Anything before the first '{' (preamble, markdown fences) and anything after
+    the root object closes (trailing prose) is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = []          # characters of the root object seen so far
+        self.stack = []           # open '{' / '[' characters
+        self.in_string = False
+        self.escape = False
+        self.started = False
+        self.complete = False
+        self.sections: Dict[str, Any] = {}
+        # Set by finish(): whether the root object was cut off, and the top-level
+        # keys whose values were lost or left partial by the cut
+        self.truncated = False
+        self.cut_keys: List[str] = []
+
+        # Top-level key/value tracking (depth 1 only)
+        self._key_start = None
+        self._current_key = None
+        self._value_start = None
+        self._expect = 'key'      # 'key' -> 'colon' -> 'value' -> 'comma'
+
+        # Offsets just before a ',' or just after an opener, with the stack at that
+        # point. Truncating there and closing the stack yields well-formed JSON.
+        self._safe_points: List[Tuple[int, str]] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Feed a chunk of text. Returns sections completed by this chunk."""
+        completed = []
+        if self.complete or not chunk:
+            return completed
+
+        for ch in chunk:
+            if not self.started:
+                if ch != '{':
+                    continue
+                self.started = True
+
+            pos = len(self.buffer)
+            self.buffer.append(ch)
+            depth = len(self.stack)
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if depth == 1 and self._expect == 'key' and self._key_start is not None:
+                        try:
+                            self._current_key = json.loads(''.join(self.buffer[self._key_start:pos + 1]))
+                        except ValueError:
+                            self._current_key = None
+                        self._expect = 'colon'
+                continue
+
+            if ch == '"':
+                self.in_string = True
+                if depth == 1 and self._expect == 'key':
+                    self._key_start = pos
+                continue
+
+            if ch in '{[':
+                self.stack.append(ch)
+                self._safe_points.append((pos + 1, ''.join(self.stack)))
+                continue
+
+            if depth == 1 and ch == ':' and self._expect == 'colon':
+                self._expect = 'value'
+                self._value_start = pos + 1
+                continue
+
+            if ch == ',':
+                self._safe_points.append((pos, ''.join(self.stack)))
+                if depth == 1:
+                    section = self._close_section(pos)
+                    if section:
+                        completed.append(section)
+                continue
+
+            if ch in '}]':
+                if not self.stack:
+                    continue
+                self.stack.pop()
+                if not self.stack:
+                    section = self._close_section(pos)
+                    if section:
+                        completed.append(section)
+                    self.complete = True
+                    break
+
+        return completed
+
+    def _close_section(self, end: int) -> Optional[Tuple[str, Any]]:
+        """Parse the value between the last ':' and ``end`` for the current key."""
+        key, start = self._current_key, self._value_start
+        self._expect = 'key'
+        self._current_key = None
+        self._value_start = None
+        self._key_start = None
+        if key is None or start is None:
+            return None
+        try:
+            value = json.loads(''.join(self.buffer[start:end]))
+        except ValueError:
+            logger.warning(f"Could not parse section '{key}' from stream")
+            return None
+        self.sections[key] = value
+        return key, value
+
+    def finish(self) -> Optional[Dict]:
+        """Return the full parsed object, repairing truncated output if needed."""
+        if not self.started:
+            return None
+
+        text = ''.join(self.buffer)
+        if self.complete:
+            try:
+                return json.loads(text)
+            except ValueError:
+                # Root closed but something inside is malformed - keep what parsed
+                return dict(self.sections) or None
+
+        # Truncated: close the brackets where the text stops if it stops after a complete
+        # value, else back off to a safe point
+        self.truncated = True
+        candidates = []
+        if self._ends_value(text):
+            candidates.append((text, ''.join(self.stack)))
+        for offset, stack in reversed(self._safe_points[-MAX_REPAIR_ATTEMPTS:]):
+            candidates.append((text[:offset], stack))
+
+        in_value = self._current_key is not None and self._expect == 'value'
+        for prefix, stack in candidates:
+            repaired = prefix.rstrip().rstrip(',:') + ''.join(_CLOSERS[c] for c in reversed(stack))
+            try:
+                result = json.loads(repaired)
+            except ValueError:
+                continue
+            if isinstance(result, dict):
+                # Only a tail cut at the root's own level leaves the current section whole
+                if in_value and not (prefix is text and len(stack) == 1):
+                    self.cut_keys = [self._current_key]
+                logger.info(f"Repaired truncated JSON ({len(text)} chars, {len(result)} top-level keys, "
+                            f"cut: {self.cut_keys or 'none'})")
+                return result
+
+        if in_value:
+            self.cut_keys = [self._current_key]
+        return dict(self.sections) or None
+
+    def _ends_value(self, text: str) -> bool:
+        """Whether ``text`` stops right after a complete value, not inside a string or number"""
+        if self.in_string:
+            return False
+        stripped = text.rstrip().rstrip(',')
+        # A number may have had more digits; a string, literal or closed container cannot
+        return stripped.endswith(('"', '}', ']', '{', '[', 'true', 'false', 'null'))
+
+
+def parse_json_text(content: str) -> Optional[Dict]:
+    """Parse a complete response, tolerating surrounding prose and truncation"""
+    return parse_json_checked(content)[0]
+
+
+@traced('json_parse')
+def parse_json_checked(content: str) -> Tuple[Optional[Dict], Optional[List[str]]]:
+    """(object, cut): ``cut`` is None for complete output, else the top-level keys truncation lost or left partial"""
+    parser = StreamingJSONParser()
+    parser.feed(content or '')
+    result = parser.finish()
+    return result, (parser.cut_keys if parser.truncated else None)
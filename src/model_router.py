@@ -0,0 +1,152 @@
+"""
+Model tiering for Claude requests
+Maps each analysis type to a model tier and max_tokens cap, decides when a
+cheaper tier's output should be escalated to a stronger model, and keeps
+per-tier latency, token and cost statistics
+"""
+
+import os
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+from json_stream import parse_json_text
+from resilience import LatencyTracker
+
+# Prices are USD per million tokens; cache writes cost 1.25x input, cache reads 0.1x
+TIERS = {
+    'fast': {
+        'model': os.getenv('CLAUDE_FAST_MODEL', 'claude-haiku-4-5-20251001'),
+        'input_per_mtok': 1.0,
+        'output_per_mtok': 5.0,
+        'escalate_to': 'strong',
+    },
+    'strong': {
+        'model': os.getenv('CLAUDE_STRONG_MODEL', 'claude-sonnet-4-20250514'),
+        'input_per_mtok': 3.0,
+        'output_per_mtok': 15.0,
+        'escalate_to': None,
+    },
+}
+
+# Copywriting and text-only condition notes don't need deep reasoning; valuation does.
+# 'json' marks types whose output must parse as JSON; 'max_tokens' caps the adaptive budget.
+DEFAULT_ROUTES = {
+    'listing_description': {'tier': 'fast', 'json': False, 'max_tokens': 1200},
+    'condition': {'tier': 'fast', 'json': False, 'max_tokens': 1500},
+    'market_report': {'tier': 'strong', 'json': False, 'max_tokens': None},
+    'investment': {'tier': 'strong', 'json': False, 'max_tokens': None},
+    'property_value': {'tier': 'strong', 'json': True, 'max_tokens': None},
+    'comprehensive': {'tier': 'strong', 'json': True, 'max_tokens': None},
+    'flip': {'tier': 'strong', 'json': True, 'max_tokens': None},
+}
+DEFAULT_TIER = 'strong'
+
+CONFIDENCE_KEYS = ('confidence_level', 'arv_confidence', 'confidence')
+
+
+def _routes_from_env(routes: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Apply CLAUDE_MODEL_ROUTES, e.g. 'market_report=fast,condition=strong'"""
+    routes = {k: dict(v) for k, v in routes.items()}
+    for item in os.getenv('CLAUDE_MODEL_ROUTES', '').split(','):
+        if '=' not in item:
+            continue
+        analysis_type, tier = (part.strip() for part in item.split('=', 1))
+        routes.setdefault(analysis_type, {'json': False, 'max_tokens': None})['tier'] = tier
+    return routes
+
+
+def _find_confidence(obj: Any) -> Optional[str]:
+    """First confidence rating found in a parsed analysis"""
+    if isinstance(obj, dict):
+        for key in CONFIDENCE_KEYS:
+            if isinstance(obj.get(key), str):
+                return obj[key]
+        for value in obj.values():
+            found = _find_confidence(value)
+            if found:
+                return found
+    return None
+
+
+class ModelRouter:
+    def __init__(self, tiers: Optional[Dict[str, Dict]] = None, routes: Optional[Dict[str, Dict]] = None,
+                 escalation: Optional[bool] = None):
+        """Route analysis types to tiers; ``escalation`` retries failed checks on the next tier up"""
+        self.tiers = tiers or TIERS
+        self.routes = routes if routes is not None else _routes_from_env(DEFAULT_ROUTES)
+        self.escalation = escalation if escalation is not None else (
+            os.getenv('CLAUDE_ESCALATION', 'true').lower() == 'true')
+        self.latency = LatencyTracker(min_samples=1)
+        self._stats = defaultdict(lambda: {'requests': 0, 'input_tokens': 0, 'output_tokens': 0,
+                                           'cost_usd': 0.0, 'escalations': 0})
+        self._lock = threading.Lock()
+
+    def tier_for(self, analysis_type: Optional[str]) -> str:
+        tier = self.routes.get(analysis_type, {}).get('tier', DEFAULT_TIER)
+        return tier if tier in self.tiers else DEFAULT_TIER
+
+    def model_for(self, tier: str) -> str:
+        return self.tiers[tier]['model']
+
+    def max_tokens_cap(self, analysis_type: Optional[str]) -> Optional[int]:
+        return self.routes.get(analysis_type, {}).get('max_tokens')
+
+    def escalation_reason(self, analysis_type: Optional[str], tier: str, content: str,
+                          stop_reason: Optional[str]) -> Optional[str]:
+        """Why ``content`` from ``tier`` should be redone on a stronger model, or None to accept it"""
+        if not self.escalation or not self.tiers[tier].get('escalate_to'):
+            return None
+        if not content.strip():
+            return 'empty'
+        if stop_reason == 'max_tokens':
+            return 'truncated'
+        if not self.routes.get(analysis_type, {}).get('json'):
+            return None
+        parsed = parse_json_text(content)
+        if parsed is None:
+            return 'invalid_json'
+        confidence = _find_confidence(parsed)
+        if confidence and confidence.strip().lower().startswith('low'):
+            return 'low_confidence'
+        return None
+
+    def next_tier(self, tier: str) -> Optional[str]:
+        return self.tiers[tier].get('escalate_to')
+
+    def cost(self, tier: str, usage) -> float:
+        """USD cost of one response's usage block"""
+        prices = self.tiers[tier]
+        cache_write = getattr(usage, 'cache_creation_input_tokens', None) or 0
+        cache_read = getattr(usage, 'cache_read_input_tokens', None) or 0
+        input_cost = (usage.input_tokens + cache_write * 1.25 + cache_read * 0.1) * prices['input_per_mtok']
+        return (input_cost + usage.output_tokens * prices['output_per_mtok']) / 1_000_000
+
+    def record(self, tier: str, seconds: float, usage):
+        """Record one completed request on ``tier``"""
+        self.latency.record(tier, seconds)
+        with self._lock:
+            stats = self._stats[tier]
+            stats['requests'] += 1
+            stats['input_tokens'] += usage.input_tokens
+            stats['output_tokens'] += usage.output_tokens
+            stats['cost_usd'] += self.cost(tier, usage)
+
+    def record_escalation(self, tier: str):
+        with self._lock:
+            self._stats[tier]['escalations'] += 1
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-tier request counts, tokens, cost and p50/p95 latency"""
+        with self._lock:
+            snapshot = {tier: dict(stats) for tier, stats in self._stats.items()}
+        for tier, stats in snapshot.items():
+            stats['cost_usd'] = round(stats['cost_usd'], 6)
+            stats['model'] = self.model_for(tier)
+            stats['latency_p50'] = self.latency.percentile(tier, 0.5)
+            stats['latency_p95'] = self.latency.percentile(tier, 0.95)
+        return snapshot
+
+
+# Shared so stats cover every analyzer instance in the process
+default_router = ModelRouter()
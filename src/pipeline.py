@@ -0,0 +1,472 @@
+"""
+Single-pass analysis pipeline shared by every analysis endpoint
+Runs named stages (normalize, scrape subject, scrape comps, score, value, LLM)
+and memoizes each stage's result per canonical property key, so a second
+analysis of the same address only pays for its own LLM call
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from admission import Admission, default_admission
+from cache_backends import CacheBackend, MemoryCache
+from single_flight import SingleFlight
+from token_budget import TokenBudget
+from tracing import span
+from valuation_engine import estimate_value
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('normalize', 'scrape_subject', 'scrape_comps', 'score', 'value', 'llm')
+
+# Street-suffix and state spellings folded together so variants share one key
+_ADDRESS_ABBREVIATIONS = {
+    'street': 'st', 'avenue': 'ave', 'road': 'rd', 'drive': 'dr', 'lane': 'ln', 'court': 'ct',
+    'place': 'pl', 'boulevard': 'blvd', 'terrace': 'ter', 'circle': 'cir', 'highway': 'hwy',
+    'north': 'n', 'south': 's', 'east': 'e', 'west': 'w', 'connecticut': 'ct',
+}
+
+# Manual form fields that override scraped values
+MANUAL_FIELDS = ('price', 'beds', 'baths', 'sqft', 'year_built', 'lot_size', 'basement',
+                 'sqft_finished_basement', 'property_type', 'condition')
+
+
+def canonical_key(address: str) -> str:
+    """Normalized address used as the memoization key"""
+    words = re.sub(r'[^a-z0-9 ]', ' ', (address or '').lower()).split()
+    return ' '.join(_ADDRESS_ABBREVIATIONS.get(w, w) for w in words)
+
+
+def build_property_data(req_json, scraped_property=None):
+    """Merge manual input with scraped data. Manual input takes priority."""
+    base = dict(scraped_property or {})
+
+    # Manual fields override scraped data when provided
+    manual_fields = {field: req_json.get(field) for field in MANUAL_FIELDS}
+
+    for key, val in manual_fields.items():
+        if val is not None and val != '' and val != 'Unknown':
+            base[key] = val
+
+    # Calculate total living sqft if we have both
+    if base.get('sqft') and base.get('sqft_finished_basement'):
+        try:
+            above = int(str(base['sqft']).replace(',', ''))
+            below = int(str(base['sqft_finished_basement']).replace(',', ''))
+            base['sqft_above_grade'] = above
+            base['total_living_sqft'] = above + below
+        except (ValueError, TypeError):
+            pass
+
+    base['address'] = req_json.get('address', base.get('address', 'Unknown'))
+    base['data_source'] = 'manual' if any(v for v in manual_fields.values()) else 'scraped'
+    return base
+
+
+def _without_timestamps(comparables: Optional[List[Dict]]) -> List[Dict]:
+    return [{k: v for k, v in comp.items() if k != 'scraped_at'} for comp in comparables or []]
+
+
+def _fingerprint(*parts: Any) -> str:
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _default_scraper_factory():
+    from selenium_scraper import PropertyScraper
+    return PropertyScraper(headless=True)
+
+
+def _default_analyzer_factory():
+    from claude_analyzer import ClaudeAnalyzer
+    return ClaudeAnalyzer()
+
+
+class _ScraperSession:
+    """Starts a browser only if a scrape stage actually misses the memo"""
+
+    def __init__(self, factory: Callable, admission: Admission):
+        self.factory = factory
+        self.admission = admission
+        self.scraper = None
+        self.failed = False
+        self._slot_since = None
+
+    def get(self):
+        if self.scraper is None and not self.failed:
+            # Raises Overloaded rather than launching Chrome past the browser limit
+            self.admission.browser.acquire()
+            self._slot_since = time.monotonic()
+            try:
+                scraper = self.factory()
+                if scraper.start_driver():
+                    self.scraper = scraper
+                else:
+                    self.failed = True
+            except Exception as e:
+                logger.warning(f"Scraper unavailable: {e}")
+                self.failed = True
+        return self.scraper
+
+    def close(self):
+        try:
+            if self.scraper is not None:
+                self.scraper.close_driver()
+                self.scraper = None
+        finally:
+            if self._slot_since is not None:
+                self.admission.browser.release(time.monotonic() - self._slot_since)
+                self._slot_since = None
+
+
+class StageCache:
+    def __init__(self, ttl: Optional[float] = None, max_entries: int = 512, stale_ttl: Optional[float] = None,
+                 backend: Optional[CacheBackend] = None):
+        """Stage results kept for ``ttl`` seconds (PIPELINE_CACHE_TTL, default 30 min) in ``backend``.
+
+        ``backend`` defaults to an in-process LRU of ``max_entries``; a SQLite or
+        Redis backend shares entries between worker processes and hosts.
+        Entries stay available to ``lookup(..., allow_stale=True)`` for a further
+        ``stale_ttl`` seconds (SCRAPE_STALE_TTL, default 6 h). A ``ttl`` of 0 disables caching.
+        """
+        self.ttl = ttl if ttl is not None else float(os.getenv('PIPELINE_CACHE_TTL', '1800'))
+        self.stale_ttl = stale_ttl if stale_ttl is not None else float(os.getenv('SCRAPE_STALE_TTL', '21600'))
+        self.backend = backend if backend is not None else MemoryCache(max_entries)
+
+    @staticmethod
+    def _entry_key(stage: str, key: str) -> str:
+        return f"{key}#{stage}"
+
+    def lookup(self, stage: str, key: str, allow_stale: bool = False) -> Tuple[Any, bool]:
+        """(value, stale): None when missing or expired; past the TTL only with ``allow_stale``"""
+        if self.ttl <= 0:
+            return None, False
+        entry = self.backend.get(self._entry_key(stage, key))
+        if entry is None:
+            return None, False
+        stored_at, value = entry
+        stale = time.time() - stored_at > self.ttl
+        if stale and not allow_stale:
+            return None, False
+        return value, stale
+
+    def get(self, stage: str, key: str):
+        return self.lookup(stage, key)[0]
+
+    def put(self, stage: str, key: str, value):
+        if self.ttl <= 0:
+            return
+        # The backend holds entries through the stale window; lookup() decides freshness
+        self.backend.set(self._entry_key(stage, key), (time.time(), value), ttl=self.ttl + self.stale_ttl)
+
+    def lock(self, stage: str, key: str):
+        """Hold the compute lock for one stage entry, across every process sharing the backend"""
+        return self.backend.lock(self._entry_key(stage, key))
+
+    def get_or_compute(self, stage: str, key: str, compute: Callable[[], Any],
+                       cacheable: Callable[[Any], bool] = lambda value: True):
+        """The fresh entry, else ``compute()``'s result, computed by one holder of the entry's lock"""
+        if self.ttl <= 0:
+            return compute()
+        value = self.get(stage, key)
+        if value is None:
+            with self.lock(stage, key):
+                # The previous lock holder may have stored it
+                value = self.get(stage, key)
+                if value is None:
+                    value = compute()
+                    if value is not None and cacheable(value):
+                        self.put(stage, key, value)
+        return value
+
+    def invalidate(self, key: str):
+        """Drop every stage stored under ``key`` or a key derived from it"""
+        self.backend.delete_prefix(key + '#')
+        self.backend.delete_prefix(key + '|')
+
+    def stats(self) -> Dict:
+        return self.backend.stats()
+
+
+class NullCache:
+    """Memoizes nothing - every run recomputes every stage"""
+
+    def lookup(self, stage: str, key: str, allow_stale: bool = False) -> Tuple[Any, bool]:
+        return None, False
+
+    def get(self, stage: str, key: str):
+        return None
+
+    def put(self, stage: str, key: str, value):
+        pass
+
+    def lock(self, stage: str, key: str):
+        return nullcontext()
+
+    def get_or_compute(self, stage: str, key: str, compute: Callable[[], Any],
+                       cacheable: Callable[[Any], bool] = lambda value: True):
+        return compute()
+
+    def invalidate(self, key: str):
+        pass
+
+    def stats(self) -> Dict:
+        return {}
+
+
+class AnalysisPipeline:
+    def __init__(self, scraper_factory: Optional[Callable] = None, analyzer_factory: Optional[Callable] = None,
+                 ttl: Optional[float] = None, max_entries: int = 512, flight: Optional[SingleFlight] = None,
+                 admission: Optional[Admission] = None, cache=None):
+        """Stage results go to ``cache`` (default a StageCache of ``ttl`` seconds and ``max_entries``).
+
+        ``flight`` coalesces concurrent computations of the same stage; set
+        SINGLE_FLIGHT_LOCK_DIR to coordinate across worker processes too.
+        ``admission`` caps concurrent browser sessions and Claude calls.
+        A scrape past its TTL but within the cache's stale window is served at once
+        and re-scraped in the background (SCRAPE_REFRESH_WORKERS at a time, default 1).
+        """
+        self.admission = admission or default_admission
+        self.scraper_factory = scraper_factory or _default_scraper_factory
+        self.analyzer_factory = analyzer_factory or _default_analyzer_factory
+        self.flight = flight or SingleFlight(lock_dir=os.getenv('SINGLE_FLIGHT_LOCK_DIR') or None)
+        self.cache = cache if cache is not None else StageCache(ttl, max_entries)
+        self._refresher = ThreadPoolExecutor(max_workers=int(os.getenv('SCRAPE_REFRESH_WORKERS', '1')),
+                                             thread_name_prefix='scrape-refresh')
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self.scrape_stats = Counter()
+
+    def _get(self, stage: str, key: str):
+        return self.cache.get(stage, key)
+
+    def _put(self, stage: str, key: str, value):
+        self.cache.put(stage, key, value)
+
+    def invalidate(self, address: str):
+        """Drop every memoized stage for ``address``"""
+        self.cache.invalidate(canonical_key(address))
+
+    def _timed(self, name: str, compute: Callable[[], Any], timings: Dict, on_stage):
+        """Run one uncached stage, reporting progress and timing"""
+        started = time.perf_counter()
+        if on_stage:
+            on_stage(name, 'running')
+        with span('stage', name):
+            value = compute()
+        timings[name] = {'ms': round((time.perf_counter() - started) * 1000, 1), 'cached': False}
+        if on_stage:
+            on_stage(name, 'done')
+        return value
+
+    def _stage(self, name: str, key: str, compute: Callable[[], Any], timings: Dict, on_stage,
+               cacheable: Callable[[Any], bool] = lambda value: True):
+        """Return the memoized result of one stage, computing and storing it on a miss"""
+        started = time.perf_counter()
+        value = self._get(name, key)
+        cached = value is not None
+        if not cached:
+            if on_stage:
+                on_stage(name, 'running')
+            # Concurrent runs needing the same stage share one computation
+            with span('stage', name):
+                value = self.flight.do(f"{name}|{key}", lambda: self._compute(name, key, compute, cacheable))
+        timings[name] = {'ms': round((time.perf_counter() - started) * 1000, 1), 'cached': cached}
+        if on_stage:
+            on_stage(name, 'cached' if cached else 'done')
+        return value
+
+    def _compute(self, name: str, key: str, compute: Callable[[], Any], cacheable: Callable[[Any], bool]):
+        # Another flight, or another process on a shared backend, may have stored the result by now
+        return self.cache.get_or_compute(name, key, compute, cacheable)
+
+    def run(self, request: Dict, analysis: Optional[str] = 'comprehensive',
+            deadline: Union[float, Callable[[], float], None] = None,
+            on_stage: Optional[Callable[[str, str], None]] = None,
+            on_section: Optional[Callable[[str, Any], None]] = None) -> Dict:
+        """Run every stage for ``request`` (the endpoint's JSON body) and one LLM ``analysis``.
+
+        ``analysis`` is 'comprehensive', 'flip' or None (local stages only).
+        ``deadline`` is the LLM time budget in seconds, or a callable evaluated when that stage starts.
+        ``on_stage(stage, status)`` reports progress; status is running, done or cached.
+        Raises admission.Overloaded when browser or Claude capacity is exhausted.
+        """
+        timings = {}
+        session = _ScraperSession(self.scraper_factory, self.admission)
+        try:
+            address = request.get('address')
+            started = time.perf_counter()
+            key = canonical_key(address)
+            timings['normalize'] = {'ms': round((time.perf_counter() - started) * 1000, 1), 'cached': False}
+
+            scraped = self._scraped(session, request, key, timings, on_stage)
+            property_data = build_property_data(request, scraped['property'])
+
+            # Scores and values depend on the merged subject and the comps, so manual overrides
+            # and refreshed scrapes get their own entries
+            subject_key = "|".join((key, _fingerprint({k: v for k, v in property_data.items() if k != 'address'}),
+                                    scraped['comps_fingerprint']))
+            comparables = self._stage('score', subject_key,
+                                      lambda: self._score(property_data, scraped['comparables'] or []),
+                                      timings, on_stage)
+            local_valuation = self._stage('value', subject_key,
+                                          lambda: estimate_value(property_data, comparables), timings, on_stage)
+        finally:
+            session.close()
+
+        context = {
+            'key': key,
+            'address': address,
+            'property_data': property_data,
+            'comparables': comparables,
+            'local_valuation': local_valuation,
+        }
+        if analysis:
+            context['result'] = self._stage(
+                'llm', f"{subject_key}|{analysis}",
+                lambda: self._analyze(analysis, property_data, comparables, local_valuation, deadline, on_section),
+                timings, on_stage, cacheable=lambda result: bool(result.get('success')))
+        context['timings'] = timings
+        return context
+
+    def _scraped(self, session: _ScraperSession, request: Dict, key: str, timings: Dict, on_stage) -> Dict:
+        """The merged {'property', 'comparables', 'comps_fingerprint'} scrape for the request's address.
+
+        Fresh entries are used as is; stale ones are used too while a background scrape replaces them.
+        """
+        started = time.perf_counter()
+        scraped, stale = self.cache.lookup('scrape', key, allow_stale=True)
+        if scraped is not None:
+            self._count('stale_hits' if stale else 'fresh_hits')
+            if stale:
+                self._revalidate(key, request)
+            for name in ('scrape_subject', 'scrape_comps'):
+                timings[name] = {'ms': round((time.perf_counter() - started) * 1000, 1), 'cached': True,
+                                 'stale': stale}
+                if on_stage:
+                    on_stage(name, 'cached')
+            return scraped
+
+        self._count('misses')
+        scraped = self.flight.do(f"scrape|{key}", lambda: self._scrape(session, request, key, timings, on_stage))
+        # Runs that waited on another's scrape
+        for name in ('scrape_subject', 'scrape_comps'):
+            timings.setdefault(name, {'ms': round((time.perf_counter() - started) * 1000, 1), 'cached': False})
+        return scraped
+
+    def _scrape(self, session: _ScraperSession, request: Dict, key: str, timings: Dict, on_stage,
+                refresh: bool = False) -> Dict:
+        with self.cache.lock('scrape', key):
+            if not refresh:
+                # Another flight, or another process on a shared backend, may have stored the scrape by now
+                scraped, _ = self.cache.lookup('scrape', key)
+                if scraped is not None:
+                    return scraped
+            return self._scrape_locked(session, request, key, timings, on_stage)
+
+    def _scrape_locked(self, session: _ScraperSession, request: Dict, key: str, timings: Dict, on_stage) -> Dict:
+        address = request.get('address')
+        subject = self._timed('scrape_subject', lambda: self._scrape_subject(session, address), timings, on_stage)
+        comparables = self._timed(
+            'scrape_comps', lambda: self._scrape_comps(session, address, build_property_data(request, subject)),
+            timings, on_stage)
+        # Fingerprinted once here rather than on every cached run
+        scraped = {'property': subject, 'comparables': comparables,
+                   'comps_fingerprint': _fingerprint(_without_timestamps(comparables))}
+        # Incomplete scrapes are retried next time rather than cached
+        if subject and comparables:
+            self.cache.put('scrape', key, scraped)
+        return scraped
+
+    def _count(self, name: str):
+        with self._refresh_lock:
+            self.scrape_stats[name] += 1
+
+    def _revalidate(self, key: str, request: Dict):
+        """Re-scrape ``key`` in the background unless a refresh is already under way"""
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self._refresher.submit(self._refresh, key, dict(request))
+
+    def _refresh(self, key: str, request: Dict):
+        session = _ScraperSession(self.scraper_factory, self.admission)
+        try:
+            scraped = self.flight.do(f"scrape|{key}", lambda: self._scrape(session, request, key, {}, None,
+                                                                          refresh=True))
+            self._count('refreshes' if scraped['property'] and scraped['comparables'] else 'refresh_failures')
+        except Exception as e:
+            # Overloaded included: the stale entry keeps serving and the next hit tries again
+            self._count('refresh_failures')
+            logger.warning(f"Background re-scrape failed for {request.get('address')}: {e}")
+        finally:
+            session.close()
+            with self._refresh_lock:
+                self._refreshing.discard(key)
+
+    @staticmethod
+    def _scrape_subject(session: _ScraperSession, address: str) -> Dict:
+        scraper = session.get()
+        if scraper is None:
+            return {}
+        try:
+            logger.info(f"Scraping subject: {address}")
+            return scraper.scrape_subject(address) or {}
+        except Exception as e:
+            logger.warning(f"Subject scrape failed for {address}: {e}")
+            return {}
+
+    def _scrape_comps(self, session: _ScraperSession, address: str, subject: Dict) -> List[Dict]:
+        scraper = session.get()
+        if scraper is None:
+            return []
+        try:
+            return scraper.scrape_comps(address, subject_data=subject, comp_pool=self.city_listings) or []
+        except Exception as e:
+            logger.warning(f"Comp scrape failed for {address}: {e}")
+            return []
+
+    def city_listings(self, city: str, fetch: Callable[[], List[Dict]]) -> List[Dict]:
+        """A city's recently-sold listings, fetched once and shared by every address in that city"""
+        listings = self._get('city_comps', city)
+        if listings is None:
+            listings = self.flight.do(f"city_comps|{city}",
+                                      lambda: self._compute('city_comps', city, fetch, lambda value: bool(value)))
+        return listings
+
+    @staticmethod
+    def _score(subject: Dict, comparables: List[Dict]) -> List[Dict]:
+        """Comps ordered most-similar first, each tagged with its dissimilarity score"""
+        scored = [dict(comp, similarity_score=round(TokenBudget._comp_distance(comp, subject), 2))
+                  for comp in comparables]
+        return sorted(scored, key=lambda comp: comp['similarity_score'])
+
+    def _analyze(self, analysis: str, property_data: Dict, comparables: List[Dict], local_valuation: Dict,
+                 deadline, on_section) -> Dict:
+        with self.admission.llm.slot():
+            analyzer = self.analyzer_factory()
+            if callable(deadline):
+                deadline = deadline()
+            return self._call_analyzer(analyzer, analysis, property_data, comparables, local_valuation,
+                                       deadline, on_section)
+
+    @staticmethod
+    def _call_analyzer(analyzer, analysis: str, property_data: Dict, comparables: List[Dict],
+                       local_valuation: Dict, deadline: Optional[float], on_section) -> Dict:
+        if analysis == 'flip':
+            return analyzer.analyze_flip_potential(property_data, comparables, on_section=on_section,
+                                                   deadline=deadline, reference_valuation=local_valuation)
+        if analysis == 'comprehensive':
+            scraped_data = {'property': property_data, 'comparables': comparables}
+            return analyzer.comprehensive_property_analysis(scraped_data, on_section=on_section, deadline=deadline,
+                                                            reference_valuation=local_valuation)
+        raise ValueError(f"Unknown analysis: {analysis}")
@@ -0,0 +1,218 @@
+"""
+Bulk portfolio analysis
+Reads a CSV, NDJSON or JSON list of addresses (plus optional manual fields),
+runs them through the shared pipeline with bounded parallelism and yields each
+result as soon as it finishes. Rows are decoded as they are needed, so memory
+stays flat however long the portfolio is
+"""
+
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from admission import Overloaded
+from pipeline import MANUAL_FIELDS
+
+logger = logging.getLogger(__name__)
+
+ROW_FIELDS = ('address',) + MANUAL_FIELDS
+OVERLOAD_RETRIES = 3
+# Largest single JSON row decoded; anything bigger is malformed input, not an address
+MAX_ROW_CHARS = 1 << 20
+
+
+def _clean_row(row) -> Dict:
+    """Keep the fields build_property_data reads, dropping blanks"""
+    if isinstance(row, str):
+        row = {'address': row}
+    if not isinstance(row, dict):
+        return {}
+    row = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+    return {k: v.strip() if isinstance(v, str) else v for k, v in row.items()
+            if k in ROW_FIELDS and v not in (None, '')}
+
+
+class _JSONArrayReader:
+    """Items of a JSON array, bare or under "properties", decoded one at a time from a text stream"""
+
+    def __init__(self, text, chunk_size: int = 65536):
+        self.text = text
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.text.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """Next non-whitespace character, '' at the end of input"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def _expect(self, char: str):
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"Invalid JSON: expected '{char}', found {found or 'end of input'!r}")
+        self.pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number ending with the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise ValueError(f"Invalid JSON: {e}")
+            if len(self.buffer) - self.pos > MAX_ROW_CHARS:
+                raise ValueError(f"Invalid JSON: row larger than {MAX_ROW_CHARS} characters")
+            self._fill()
+
+    def open(self) -> '_JSONArrayReader':
+        """Read up to the array's '[', raising ValueError if the body is not one of the accepted shapes"""
+        start = self._peek()
+        if start == '{':
+            self.pos += 1
+            while self._peek() == '"':
+                key = self._value()
+                self._expect(':')
+                if key == 'properties' and self._peek() == '[':
+                    self.pos += 1
+                    return self
+                self._value()
+                if self._peek() != ',':
+                    break
+                self.pos += 1
+        elif start == '[':
+            self.pos += 1
+            return self
+        raise ValueError("Expected a JSON array of properties or {\"properties\": [...]}")
+
+    def items(self) -> Iterator:
+        if self._peek() == ']':
+            return
+        while True:
+            yield self._value()
+            if self._peek() == ']':
+                return
+            self._expect(',')
+
+
+def _ndjson_rows(text) -> Iterator[Dict]:
+    for number, line in enumerate(text, 1):
+        if line.strip():
+            try:
+                yield _clean_row(json.loads(line))
+            except ValueError as e:
+                raise ValueError(f"Invalid JSON on line {number}: {e}")
+
+
+def parse_rows(stream, content_type: str = '') -> Iterator[Dict]:
+    """Rows from a CSV (header must include 'address'), NDJSON lines, or a JSON array / {"properties": [...]}.
+
+    Raises ValueError straight away for a malformed header or opening; rows are then read lazily,
+    and a malformed row raises ValueError when it is reached.
+    """
+    content_type = (content_type or '').lower()
+    if 'csv' in content_type:
+        reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+        if 'address' not in [(name or '').strip().lower() for name in reader.fieldnames or []]:
+            raise ValueError("CSV header must include an 'address' column")
+        return (_clean_row(row) for row in reader)
+
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    if 'ndjson' in content_type or 'jsonl' in content_type:
+        return _ndjson_rows(text)
+    try:
+        reader = _JSONArrayReader(text).open()
+    except UnicodeDecodeError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    return (_clean_row(row) for row in reader.items())
+
+
+def _analyze_row(analyze: Callable[[Dict], Tuple[Dict, int]], row: Dict) -> Tuple[Dict, int]:
+    """One row's (payload, http_status), waiting out admission overloads a few times"""
+    if not row.get('address'):
+        return {'error': 'Address is required'}, 400
+    for attempt in range(OVERLOAD_RETRIES + 1):
+        try:
+            return analyze(row)
+        except Overloaded as e:
+            if attempt == OVERLOAD_RETRIES:
+                return {'error': str(e), 'address': row['address']}, 503
+            time.sleep(e.retry_after)
+        except Exception as e:
+            logger.exception(f"Portfolio analysis failed for {row['address']}")
+            return {'error': f'Analysis failed: {e}', 'address': row['address']}, 500
+
+
+def run_portfolio(rows: Iterable[Dict], analyze: Callable[[Dict], Tuple[Dict, int]],
+                  concurrency: Optional[int] = None) -> Iterator[Dict]:
+    """Yield one result per row in completion order, then a summary.
+
+    At most ``concurrency`` rows (PORTFOLIO_CONCURRENCY, default 4) are read
+    ahead and in flight at once. Each result carries the row's ``index``.
+    If reading a row raises ValueError, the rows already started still finish
+    and the summary reports the error as ``input_error``.
+    """
+    concurrency = concurrency or int(os.getenv('PORTFOLIO_CONCURRENCY', '4'))
+    started = time.time()
+    summary = {'total': 0, 'succeeded': 0, 'failed': 0}
+
+    def finished(future):
+        index, row = pending.pop(future)
+        payload, status = future.result()
+        summary['succeeded' if status < 400 else 'failed'] += 1
+        return dict(payload, index=index, address=row.get('address'), http_status=status)
+
+    pending = {}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='portfolio') as executor:
+        rows = iter(rows)
+        for index in itertools.count():
+            try:
+                row = next(rows)
+            except StopIteration:
+                break
+            except ValueError as e:
+                summary['input_error'] = str(e)
+                break
+            summary['total'] += 1
+            pending[executor.submit(_analyze_row, analyze, row)] = (index, row)
+            if len(pending) >= concurrency:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield finished(future)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield finished(future)
+
+    summary['elapsed_seconds'] = round(time.time() - started, 2)
+    yield {'summary': summary}
+
+
+def to_ndjson(results: Iterable[Dict]) -> Iterator[str]:
+    for result in results:
+        yield json.dumps(result, default=str) + '\n'
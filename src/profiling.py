@@ -0,0 +1,166 @@
+"""
+Opt-in request profiling
+A request carrying the profiling token (or picked by PROFILE_SAMPLE_RATE) runs
+under cProfile or a wall-clock stack sampler; the profile and the request's
+metadata are written to a rotating directory. Rate limits and a single
+concurrent session keep the overhead bounded on live traffic
+"""
+
+import cProfile
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MODES = ('cprofile', 'sample')
+
+
+class StackSampler:
+    def __init__(self, thread_id: int, interval: float):
+        """Sample one thread's stack every ``interval`` seconds; catches time blocked in I/O, unlike cProfile"""
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path: str):
+        """Collapsed stacks, one 'frame;frame;frame count' line each (flamegraph.pl / speedscope input)"""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class RequestProfiler:
+    def __init__(self, token: Optional[str] = None, directory: Optional[str] = None, keep: Optional[int] = None,
+                 sample_rate: Optional[float] = None, max_per_minute: Optional[int] = None,
+                 sample_interval: float = 0.005):
+        """Profiles are written to ``directory`` (PROFILE_DIR) and pruned to the newest ``keep`` (PROFILE_KEEP, 20).
+
+        Requests are profiled when they present ``token`` (PROFILE_TOKEN; unset disables
+        header-triggered profiling) or are picked at ``sample_rate`` (PROFILE_SAMPLE_RATE, 0).
+        At most ``max_per_minute`` (PROFILE_MAX_PER_MINUTE, 6) sessions start per minute.
+        """
+        self.token = token if token is not None else os.getenv('PROFILE_TOKEN', '')
+        self.directory = directory or os.getenv('PROFILE_DIR', 'profiles')
+        self.keep = keep or int(os.getenv('PROFILE_KEEP', '20'))
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+        self.max_per_minute = max_per_minute or int(os.getenv('PROFILE_MAX_PER_MINUTE', '6'))
+        self.sample_interval = sample_interval
+        self._started = deque()
+        self._active = threading.Lock()
+        self._lock = threading.Lock()
+
+    def _requested(self, token: Optional[str]) -> bool:
+        if token and self.token and hmac.compare_digest(token, self.token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _within_rate(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            while self._started and now - self._started[0] > 60:
+                self._started.popleft()
+            if len(self._started) >= self.max_per_minute:
+                return False
+            self._started.append(now)
+            return True
+
+    @contextmanager
+    def session(self, token: Optional[str], mode: Optional[str] = None, metadata: Optional[Dict] = None):
+        """Profile the block if requested and allowed; yields the profile id or None.
+
+        ``mode`` is 'cprofile' (default, deterministic CPU) or 'sample' (wall-clock stacks).
+        Fields added to ``metadata`` inside the block are saved with the profile.
+        """
+        if not self._requested(token):
+            yield None
+            return
+        # cProfile allows one active profiler per process, so sessions never overlap
+        if not self._active.acquire(blocking=False):
+            logger.info("Profiling skipped: another profile is running")
+            yield None
+            return
+        try:
+            if not self._within_rate():
+                logger.info("Profiling skipped: rate limit reached")
+                yield None
+                return
+            mode = mode if mode in MODES else 'cprofile'
+            profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            metadata = metadata if metadata is not None else {}
+            started = time.perf_counter()
+            if mode == 'sample':
+                profiler = StackSampler(threading.get_ident(), self.sample_interval)
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+            try:
+                yield profile_id
+            finally:
+                if mode == 'sample':
+                    profiler.stop()
+                else:
+                    profiler.disable()
+                metadata.update(profile_id=profile_id, mode=mode,
+                                duration_ms=round((time.perf_counter() - started) * 1000, 1),
+                                recorded_at=time.time())
+                self._write(profile_id, mode, profiler, metadata)
+        finally:
+            self._active.release()
+
+    def _write(self, profile_id: str, mode: str, profiler, metadata: Dict):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, profile_id)
+            if mode == 'sample':
+                profiler.dump(base + '.folded')
+            else:
+                profiler.dump_stats(base + '.prof')
+            with open(base + '.json', 'w') as f:
+                json.dump(metadata, f, indent=2, default=str)
+            logger.info(f"Wrote {mode} profile {base}")
+            self._rotate()
+        except OSError as e:
+            logger.warning(f"Could not write profile {profile_id}: {e}")
+
+    def _rotate(self):
+        """Delete all but the newest ``keep`` profiles (each is a metadata file plus its data file)"""
+        names = sorted((name for name in os.listdir(self.directory) if name.endswith('.json')),
+                       key=lambda name: os.path.getmtime(os.path.join(self.directory, name)))
+        for name in names[:-self.keep]:
+            stem = name[:-len('.json')]
+            for suffix in ('.json', '.prof', '.folded'):
+                try:
+                    os.remove(os.path.join(self.directory, stem + suffix))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,115 @@
+"""
+Process-wide concurrency and per-minute budgets for Claude requests
+Shared by the sync and async analyzer paths so one limit covers every caller
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+# How often async waiters re-check a full concurrency pool
+ASYNC_POLL_SECONDS = 0.05
+
+
+class Reservation:
+    """A slot in the limiter; settle() replaces the estimated tokens with actual usage"""
+
+    def __init__(self, timestamp: float, tokens: int):
+        self.timestamp = timestamp
+        self.tokens = tokens
+
+    def settle(self, actual_tokens: int):
+        self.tokens = actual_tokens
+
+
+class RequestLimiter:
+    def __init__(self, max_concurrent: int = 8, requests_per_minute: int = 50,
+                 tokens_per_minute: int = 80000, window: float = 60.0):
+        """Limit in-flight requests and requests/tokens per rolling ``window`` seconds"""
+        self.max_concurrent = max_concurrent
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._recent = deque()  # Reservations inside the rolling window
+
+    def _try_reserve(self, tokens: int):
+        """Return (reservation, 0) or (None, seconds until a retry could succeed). Caller holds the lock."""
+        now = time.monotonic()
+        while self._recent and now - self._recent[0].timestamp >= self.window:
+            self._recent.popleft()
+
+        if self._in_flight >= self.max_concurrent:
+            return None, None
+
+        if len(self._recent) >= self.requests_per_minute:
+            return None, self._recent[0].timestamp + self.window - now
+
+        used = sum(r.tokens for r in self._recent)
+        if self._recent and used + tokens > self.tokens_per_minute:
+            # Wait until enough of the window expires to fit this request
+            freed = 0
+            for r in self._recent:
+                freed += r.tokens
+                if used - freed + tokens <= self.tokens_per_minute:
+                    return None, r.timestamp + self.window - now
+            return None, self._recent[-1].timestamp + self.window - now
+
+        reservation = Reservation(now, tokens)
+        self._recent.append(reservation)
+        self._in_flight += 1
+        return reservation, 0
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def acquire(self, tokens: int = 0):
+        """Block the calling thread until a slot and budget are available"""
+        with self._cond:
+            while True:
+                reservation, wait = self._try_reserve(tokens)
+                if reservation:
+                    break
+                self._cond.wait(timeout=wait)
+        try:
+            yield reservation
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def acquire_async(self, tokens: int = 0):
+        """Await a slot and budget without blocking the event loop"""
+        while True:
+            with self._cond:
+                reservation, wait = self._try_reserve(tokens)
+            if reservation:
+                break
+            await asyncio.sleep(wait if wait else ASYNC_POLL_SECONDS)
+        try:
+            yield reservation
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            recent = [r for r in self._recent if now - r.timestamp < self.window]
+            return {
+                'in_flight': self._in_flight,
+                'requests_last_minute': len(recent),
+                'tokens_last_minute': sum(r.tokens for r in recent),
+            }
+
+
+default_limiter = RequestLimiter(
+    max_concurrent=int(os.getenv('CLAUDE_MAX_CONCURRENT', '8')),
+    requests_per_minute=int(os.getenv('CLAUDE_REQUESTS_PER_MINUTE', '50')),
+    tokens_per_minute=int(os.getenv('CLAUDE_TOKENS_PER_MINUTE', '80000')),
+)
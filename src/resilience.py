@@ -0,0 +1,226 @@
+"""
+Resilience layer for Claude requests
+Classified retries with jittered exponential backoff that honors retry-after,
+an overall caller deadline, and optional hedging once an attempt runs past a
+latency percentile
+"""
+
+import asyncio
+import contextvars
+import email.utils
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Optional, Tuple
+
+import anthropic
+
+logger = logging.getLogger(__name__)
+
+# 529 is Anthropic's "overloaded"; 408/409 are safe to replay for a stateless call
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Hedged requests run here so the caller's thread can wait on either attempt
+_hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='claude-attempt')
+
+
+class DeadlineExceeded(Exception):
+    """The caller's overall deadline passed before a request succeeded"""
+
+
+def _parse_retry_after(headers) -> Optional[float]:
+    """Seconds to wait from retry-after-ms / retry-after (seconds or HTTP date)"""
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+def classify_error(exc: BaseException) -> Tuple[bool, Optional[float]]:
+    """Return (retryable, retry_after_seconds) for an exception from the API client"""
+    if isinstance(exc, (anthropic.APITimeoutError, anthropic.APIConnectionError)):
+        return True, None
+    if isinstance(exc, anthropic.APIStatusError):
+        retry_after = _parse_retry_after(getattr(exc.response, 'headers', None))
+        return exc.status_code in RETRYABLE_STATUS, retry_after
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True, None
+    return False, None
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 30.0):
+        """Exponential backoff with full jitter, capped at ``max_delay``"""
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number ``attempt`` (0-based); the server's retry-after wins if longer"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay) + random.uniform(0, 0.25))
+        return delay
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        """Rolling latency samples per key, used to decide when to hedge"""
+        self.min_samples = min_samples
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float):
+        with self._lock:
+            self._samples[key].append(seconds)
+
+    def percentile(self, key: str, q: float) -> Optional[float]:
+        """The q-th quantile (0-1) of recent latencies, or None until enough samples exist"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+# Shared so hedging thresholds reflect every analyzer instance in the process
+default_latency_tracker = LatencyTracker()
+
+
+def _remaining(deadline_at: Optional[float]) -> Optional[float]:
+    return None if deadline_at is None else deadline_at - time.monotonic()
+
+
+def _submit(fn, timeout):
+    """Run on the hedge pool in a copy of the caller's context so the request's trace follows it"""
+    return _hedge_executor.submit(contextvars.copy_context().run, fn, timeout)
+
+
+def _hedged_call(fn: Callable[[Optional[float]], object], timeout: Optional[float], hedge_after: float):
+    """Run ``fn``; if it hasn't finished after ``hedge_after`` seconds start a second copy and take the first success"""
+    first = _submit(fn, timeout)
+    done, _ = wait([first], timeout=hedge_after)
+    if done:
+        return first.result()
+
+    remaining = None if timeout is None else timeout - hedge_after
+    if remaining is not None and remaining <= 0:
+        return first.result()
+
+    logger.info(f"Claude request exceeded {hedge_after:.1f}s - sending hedged request")
+    second = _submit(fn, remaining)
+    pending = {first, second}
+    last_error = None
+    while pending:
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        if not done:
+            raise DeadlineExceeded("Deadline exceeded waiting for hedged requests")
+        for fut in done:
+            if fut.exception() is None:
+                return fut.result()
+            last_error = fut.exception()
+    raise last_error
+
+
+def call_with_retries(fn: Callable[[Optional[float]], object], policy: Optional[RetryPolicy] = None,
+                      deadline: Optional[float] = None, hedge_after: Optional[float] = None):
+    """Call ``fn(timeout)`` with classified retries inside an overall ``deadline`` (seconds).
+
+    ``fn`` receives the time left for the attempt (None when unbounded).
+    ``hedge_after`` enables a hedged second attempt once the first runs that long.
+    """
+    policy = policy or RetryPolicy()
+    deadline_at = None if deadline is None else time.monotonic() + deadline
+
+    for attempt in range(policy.max_attempts):
+        remaining = _remaining(deadline_at)
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(f"Deadline of {deadline}s exceeded after {attempt} attempts")
+        try:
+            if hedge_after is not None and (remaining is None or remaining > hedge_after):
+                return _hedged_call(fn, remaining, hedge_after)
+            return fn(remaining)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            retryable, retry_after = classify_error(e)
+            if not retryable or attempt == policy.max_attempts - 1:
+                raise
+            delay = policy.backoff(attempt, retry_after)
+            remaining = _remaining(deadline_at)
+            if remaining is not None and delay >= remaining:
+                raise DeadlineExceeded(f"Deadline of {deadline}s leaves no time to retry after: {e}") from e
+            logger.warning(f"Claude request failed ({e}); retry {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+async def _hedged_call_async(fn: Callable[[Optional[float]], Awaitable], timeout: Optional[float], hedge_after: float):
+    first = asyncio.ensure_future(fn(timeout))
+    done, _ = await asyncio.wait({first}, timeout=hedge_after)
+    if done:
+        return first.result()
+
+    remaining = None if timeout is None else timeout - hedge_after
+    if remaining is not None and remaining <= 0:
+        return await first
+
+    logger.info(f"Claude request exceeded {hedge_after:.1f}s - sending hedged request")
+    second = asyncio.ensure_future(fn(remaining))
+    pending = {first, second}
+    last_error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded("Deadline exceeded waiting for hedged requests")
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                last_error = task.exception()
+        raise last_error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call_with_retries_async(fn: Callable[[Optional[float]], Awaitable], policy: Optional[RetryPolicy] = None,
+                                  deadline: Optional[float] = None, hedge_after: Optional[float] = None):
+    """Async counterpart of call_with_retries; the losing hedged attempt is cancelled"""
+    policy = policy or RetryPolicy()
+    deadline_at = None if deadline is None else time.monotonic() + deadline
+
+    for attempt in range(policy.max_attempts):
+        remaining = _remaining(deadline_at)
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(f"Deadline of {deadline}s exceeded after {attempt} attempts")
+        try:
+            if hedge_after is not None and (remaining is None or remaining > hedge_after):
+                return await _hedged_call_async(fn, remaining, hedge_after)
+            return await fn(remaining)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            retryable, retry_after = classify_error(e)
+            if not retryable or attempt == policy.max_attempts - 1:
+                raise
+            delay = policy.backoff(attempt, retry_after)
+            remaining = _remaining(deadline_at)
+            if remaining is not None and delay >= remaining:
+                raise DeadlineExceeded(f"Deadline of {deadline}s leaves no time to retry after: {e}") from e
+            logger.warning(f"Claude request failed ({e}); retry {attempt + 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
@@ -0,0 +1,52 @@
+"""
+SQLite-backed store for finished analysis results
+Keyed by (property key, kind) so batch runs and background jobs can write
+results that are read back later by other requests or processes
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+
+class ResultStore:
+    def __init__(self, path: Optional[str] = None):
+        """Open (or create) the store; ':memory:' keeps it in-process"""
+        self.path = path or os.getenv('RESULT_STORE_PATH', 'realty_results.db')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT NOT NULL, kind TEXT NOT NULL, value TEXT NOT NULL, updated_at REAL NOT NULL,"
+                " PRIMARY KEY (key, kind))"
+            )
+
+    def put(self, key: str, kind: str, value: Dict):
+        """Insert or replace the result for (key, kind)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, kind, value, updated_at) VALUES (?, ?, ?, ?)",
+                (key, kind, json.dumps(value, default=str), time.time()),
+            )
+
+    def get(self, key: str, kind: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM results WHERE key = ? AND kind = ?", (key, kind)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def items(self, kind: str) -> Iterator[Tuple[str, Dict]]:
+        """All (key, value) pairs of one kind"""
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM results WHERE kind = ? ORDER BY key", (kind,)).fetchall()
+        for key, value in rows:
+            yield key, json.loads(value)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -17,6 +17,8 @@ import re
 import logging
 from dotenv import load_dotenv
 
+from tracing import span, traced
+
 # Load environment variables
 load_dotenv()
 
@@ -90,6 +92,7 @@ class PropertyScraper:
         self.options.add_argument('--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36')
         self.driver = None
     
+    @traced('driver.start')
     def start_driver(self):
         """Start Chrome WebDriver with automatic driver management"""
         try:
@@ -121,7 +124,20 @@ class PropertyScraper:
         """Close Chrome WebDriver"""
         if self.driver:
             self.driver.quit()
+
+    def _load_page(self, url, source, settle):
+        """Navigate to ``url`` and give the page ``settle`` seconds to render"""
+        with span('driver.get', source):
+            self.driver.get(url)
+            time.sleep(settle)
+
+    def _click_through(self, element, source, settle):
+        """Click ``element`` and give the page it opens ``settle`` seconds to render"""
+        with span('driver.click', source):
+            element.click()
+            time.sleep(settle)
     
+    @traced('extract', 'zillow')
     def scrape_zillow(self, address):
         """Scrape property data from Zillow"""
         if not self.driver:
@@ -133,10 +149,8 @@ class PropertyScraper:
             search_url = f"https://www.zillow.com/homes/{clean_address}_rb/"
             
             logger.info(f"Searching Zillow for: {address}")
-            self.driver.get(search_url)
-            
             # Wait for page to load
-            time.sleep(3)
+            self._load_page(search_url, 'zillow', 3)
             
             property_data = {
                 'source': 'zillow',
@@ -391,6 +405,7 @@ class PropertyScraper:
             logger.error(f"Error scraping Zillow for {address}: {e}")
             return None
     
+    @traced('extract', 'redfin')
     def scrape_redfin(self, address):
         """Scrape property data from Redfin (less aggressive blocking than Zillow)"""
         if not self.driver:
@@ -401,8 +416,7 @@ class PropertyScraper:
             search_url = f"https://www.redfin.com/search#query={address.replace(' ', '%20')}"
 
             logger.info(f"Searching Redfin for: {address}")
-            self.driver.get(search_url)
-            time.sleep(4)
+            self._load_page(search_url, 'redfin', 4)
 
             property_data = {
                 'source': 'redfin',
@@ -426,8 +440,7 @@ class PropertyScraper:
                     result_links = self.driver.find_elements(By.CSS_SELECTOR,
                         'a.slider-item, a[href*="/home/"], .HomeCardContainer a, .HomeViews a')
                     if result_links:
-                        result_links[0].click()
-                        time.sleep(3)
+                        self._click_through(result_links[0], 'redfin', 3)
                         current_url = self.driver.current_url
                         logger.info(f"Clicked through to: {current_url}")
                 except Exception as e:
@@ -592,6 +605,7 @@ class PropertyScraper:
 
         return zip_code, city
 
+    @traced('comps', 'zillow')
     def find_comparables(self, address, subject_data=None, max_comps=8):
         """Find comparable properties, filtering out distressed sales"""
         if not self.driver:
@@ -621,8 +635,7 @@ class PropertyScraper:
             for url in sold_urls:
                 try:
                     logger.info(f"Searching for comparables at: {url}")
-                    self.driver.get(url)
-                    time.sleep(3)
+                    self._load_page(url, 'zillow', 3)
 
                     # Look for property cards
                     property_selectors = [
@@ -646,84 +659,85 @@ class PropertyScraper:
                     if not property_elements:
                         continue
 
-                    for i, prop in enumerate(property_elements):
-                        try:
-                            full_card_text = prop.text
-
-                            # --- DISTRESSED SALE FILTER ---
-                            is_distressed, keyword = self._is_distressed_sale(full_card_text)
-                            if is_distressed:
-                                logger.info(f"FILTERED OUT comp {i}: distressed sale detected ('{keyword}')")
-                                filtered_out.append({
-                                    'reason': f'distressed: {keyword}',
-                                    'text_preview': full_card_text[:100]
-                                })
-                                continue
-
-                            comp_data = {
-                                'address': 'Unknown Address',
-                                'sale_price': None,
-                                'sale_date': None,
-                                'sqft': None,
-                                'beds': None,
-                                'baths': None,
-                                'distance_miles': None,
-                                'sale_type': 'standard',
-                                'source': 'zillow_comps',
-                                'scraped_at': time.time()
-                            }
-
-                            # Extract address
-                            for addr_sel in ['[data-testid="property-card-addr"]', '.list-card-addr', '.property-card-addr', 'address']:
-                                try:
-                                    addr_elem = prop.find_element(By.CSS_SELECTOR, addr_sel)
-                                    comp_data['address'] = addr_elem.text.strip()
-                                    break
-                                except:
+                    with span('filter'):
+                        for i, prop in enumerate(property_elements):
+                            try:
+                                full_card_text = prop.text
+
+                                # --- DISTRESSED SALE FILTER ---
+                                is_distressed, keyword = self._is_distressed_sale(full_card_text)
+                                if is_distressed:
+                                    logger.info(f"FILTERED OUT comp {i}: distressed sale detected ('{keyword}')")
+                                    filtered_out.append({
+                                        'reason': f'distressed: {keyword}',
+                                        'text_preview': full_card_text[:100]
+                                    })
                                     continue
 
-                            # Extract price
-                            for price_sel in ['[data-testid="property-card-price"]', '.list-card-price', '.property-card-price', '.price']:
-                                try:
-                                    price_elem = prop.find_element(By.CSS_SELECTOR, price_sel)
-                                    price_text = price_elem.text.strip()
-                                    if '$' in price_text:
-                                        price_match = re.search(r'\$([0-9,]+)', price_text)
-                                        if price_match:
-                                            comp_data['sale_price'] = price_match.group(1).replace(',', '')
-                                    break
-                                except:
+                                comp_data = {
+                                    'address': 'Unknown Address',
+                                    'sale_price': None,
+                                    'sale_date': None,
+                                    'sqft': None,
+                                    'beds': None,
+                                    'baths': None,
+                                    'distance_miles': None,
+                                    'sale_type': 'standard',
+                                    'source': 'zillow_comps',
+                                    'scraped_at': time.time()
+                                }
+
+                                # Extract address
+                                for addr_sel in ['[data-testid="property-card-addr"]', '.list-card-addr', '.property-card-addr', 'address']:
+                                    try:
+                                        addr_elem = prop.find_element(By.CSS_SELECTOR, addr_sel)
+                                        comp_data['address'] = addr_elem.text.strip()
+                                        break
+                                    except:
+                                        continue
+
+                                # Extract price
+                                for price_sel in ['[data-testid="property-card-price"]', '.list-card-price', '.property-card-price', '.price']:
+                                    try:
+                                        price_elem = prop.find_element(By.CSS_SELECTOR, price_sel)
+                                        price_text = price_elem.text.strip()
+                                        if '$' in price_text:
+                                            price_match = re.search(r'\$([0-9,]+)', price_text)
+                                            if price_match:
+                                                comp_data['sale_price'] = price_match.group(1).replace(',', '')
+                                        break
+                                    except:
+                                        continue
+
+                                # Extract beds/baths/sqft
+                                detail_text = full_card_text.lower()
+                                bed_match = re.search(r'(\d+)\s*bed', detail_text)
+                                if bed_match:
+                                    comp_data['beds'] = int(bed_match.group(1))
+                                bath_match = re.search(r'(\d+(?:\.\d+)?)\s*bath', detail_text)
+                                if bath_match:
+                                    comp_data['baths'] = float(bath_match.group(1))
+                                sqft_match = re.search(r'([\d,]+)\s*(?:sqft|sq ft)', detail_text)
+                                if sqft_match:
+                                    comp_data['sqft'] = int(sqft_match.group(1).replace(',', ''))
+
+                                # --- COMP QUALITY FILTER ---
+                                is_valid, reason = self._is_valid_comp(comp_data, subject_data)
+                                if not is_valid:
+                                    logger.info(f"FILTERED OUT comp '{comp_data['address']}': {reason}")
+                                    filtered_out.append({
+                                        'address': comp_data['address'],
+                                        'reason': reason,
+                                        'sale_price': comp_data.get('sale_price')
+                                    })
                                     continue
 
-                            # Extract beds/baths/sqft
-                            detail_text = full_card_text.lower()
-                            bed_match = re.search(r'(\d+)\s*bed', detail_text)
-                            if bed_match:
-                                comp_data['beds'] = int(bed_match.group(1))
-                            bath_match = re.search(r'(\d+(?:\.\d+)?)\s*bath', detail_text)
-                            if bath_match:
-                                comp_data['baths'] = float(bath_match.group(1))
-                            sqft_match = re.search(r'([\d,]+)\s*(?:sqft|sq ft)', detail_text)
-                            if sqft_match:
-                                comp_data['sqft'] = int(sqft_match.group(1).replace(',', ''))
-
-                            # --- COMP QUALITY FILTER ---
-                            is_valid, reason = self._is_valid_comp(comp_data, subject_data)
-                            if not is_valid:
-                                logger.info(f"FILTERED OUT comp '{comp_data['address']}': {reason}")
-                                filtered_out.append({
-                                    'address': comp_data['address'],
-                                    'reason': reason,
-                                    'sale_price': comp_data.get('sale_price')
-                                })
-                                continue
+                                raw_comps.append(comp_data)
+                                logger.info(f"VALID comp: {comp_data['address']} - ${comp_data.get('sale_price', 'N/A')}")
 
-                            raw_comps.append(comp_data)
-                            logger.info(f"VALID comp: {comp_data['address']} - ${comp_data.get('sale_price', 'N/A')}")
-
-                        except Exception as e:
-                            logger.warning(f"Error processing comp {i}: {e}")
-                            continue
+                            except Exception as e:
+                                logger.warning(f"Error processing comp {i}: {e}")
+                                continue
 
                     if raw_comps:
                         break
@@ -745,65 +759,80 @@ class PropertyScraper:
             logger.error(f"Error finding comparables near {address}: {e}")
             return []
 
-    def find_comparables_redfin(self, address, subject_data=None, max_comps=8):
-        """Find comparable sold properties on Redfin (fallback when Zillow blocks)"""
+    def _redfin_sold_url(self, address):
+        """(city key, recently-sold URL) for the address's city"""
+        _, city = self._extract_zip_and_city(address)
+        if not city:
+            city = address.split()[-2] if len(address.split()) >= 2 else 'connecticut'
+
+        # Look up Redfin's numeric city ID
+        city_lower = city.lower().strip()
+        city_id = REDFIN_CT_CITIES.get(city_lower)
+
+        if city_id:
+            city_name = city.title()
+            logger.info(f"Redfin city ID {city_id} for '{city_lower}'")
+            return city_lower, f"https://www.redfin.com/city/{city_id}/CT/{city_name}/recently-sold"
+        # Fallback: try text-based URL
+        city_slug = city.title().replace(' ', '-')
+        logger.info(f"No Redfin city ID for '{city_lower}', trying slug URL")
+        return city_lower, f"https://www.redfin.com/city/{city_slug}/CT/recently-sold"
+
+    def fetch_redfin_sold_listings(self, url):
+        """Every parsed listing on a Redfin recently-sold page, before any subject filtering"""
+        logger.info(f"Redfin comp search: {url}")
+        self._load_page(url, 'redfin', 5)
+
+        current = self.driver.current_url
+        logger.info(f"Redfin comp page: {current}")
+
+        # Get full page text — Redfin's listing data is in the text
+        page_text = self.driver.find_element(By.TAG_NAME, 'body').text
+        logger.info(f"Redfin page text: {len(page_text)} chars")
+
+        # Parse sold listings from page text
+        # Redfin format: "SOLD <DATE>\n...\n$PRICE\nX beds\nY baths\nZ sq ft\nAddress"
+        return self._parse_redfin_sold_listings(page_text)
+
+    @traced('comps', 'redfin')
+    def find_comparables_redfin(self, address, subject_data=None, max_comps=8, comp_pool=None):
+        """Find comparable sold properties on Redfin (fallback when Zillow blocks)
+
+        ``comp_pool(city, fetch)`` may return an already-fetched city's listings so a
+        portfolio of same-city addresses loads the recently-sold page only once.
+        """
         if not self.driver:
             return []
 
         try:
-            _, city = self._extract_zip_and_city(address)
-            if not city:
-                city = address.split()[-2] if len(address.split()) >= 2 else 'connecticut'
-
-            # Look up Redfin's numeric city ID
-            city_lower = city.lower().strip()
-            city_id = REDFIN_CT_CITIES.get(city_lower)
-
-            if city_id:
-                city_name = city.title()
-                sold_url = f"https://www.redfin.com/city/{city_id}/CT/{city_name}/recently-sold"
-                logger.info(f"Redfin city ID {city_id} for '{city_lower}'")
-            else:
-                # Fallback: try text-based URL
-                city_slug = city.title().replace(' ', '-')
-                sold_url = f"https://www.redfin.com/city/{city_slug}/CT/recently-sold"
-                logger.info(f"No Redfin city ID for '{city_lower}', trying slug URL")
+            city, sold_url = self._redfin_sold_url(address)
 
             raw_comps = []
             filtered_out = []
 
             for url in [sold_url]:
                 try:
-                    logger.info(f"Redfin comp search: {url}")
-                    self.driver.get(url)
-                    time.sleep(5)
-
-                    current = self.driver.current_url
-                    logger.info(f"Redfin comp page: {current}")
-
-                    # Get full page text — Redfin's listing data is in the text
-                    page_text = self.driver.find_element(By.TAG_NAME, 'body').text
-                    logger.info(f"Redfin page text: {len(page_text)} chars")
-
-                    # Parse sold listings from page text
-                    # Redfin format: "SOLD <DATE>\n...\n$PRICE\nX beds\nY baths\nZ sq ft\nAddress"
-                    comps = self._parse_redfin_sold_listings(page_text, subject_data)
-
-                    for comp in comps:
-                        is_distressed, keyword = self._is_distressed_sale(comp.get('_raw_text', ''))
-                        if is_distressed:
-                            filtered_out.append({'reason': f'distressed: {keyword}', 'address': comp.get('address')})
-                            continue
+                    fetch = lambda: self.fetch_redfin_sold_listings(url)
+                    listings = comp_pool(city, fetch) if comp_pool else fetch()
+
+                    with span('filter'):
+                        for listing in listings or []:
+                            # Pooled listings are shared between subjects, so filter copies
+                            comp = dict(listing)
+                            is_distressed, keyword = self._is_distressed_sale(comp.get('_raw_text', ''))
+                            if is_distressed:
+                                filtered_out.append({'reason': f'distressed: {keyword}', 'address': comp.get('address')})
+                                continue
 
-                        is_valid, reason = self._is_valid_comp(comp, subject_data)
-                        if not is_valid:
-                            filtered_out.append({'address': comp.get('address'), 'reason': reason})
-                            continue
+                            is_valid, reason = self._is_valid_comp(comp, subject_data)
+                            if not is_valid:
+                                filtered_out.append({'address': comp.get('address'), 'reason': reason})
+                                continue
 
-                        comp.pop('_raw_text', None)
-                        raw_comps.append(comp)
-                        logger.info(f"Redfin comp: {comp['address']} - ${comp.get('sale_price', 'N/A')} | "
-                                    f"{comp.get('beds','?')}bd/{comp.get('baths','?')}ba/{comp.get('sqft','?')}sqft")
+                            comp.pop('_raw_text', None)
+                            raw_comps.append(comp)
+                            logger.info(f"Redfin comp: {comp['address']} - ${comp.get('sale_price', 'N/A')} | "
+                                        f"{comp.get('beds','?')}bd/{comp.get('baths','?')}ba/{comp.get('sqft','?')}sqft")
 
                     if raw_comps:
                         break
@@ -820,6 +849,7 @@ class PropertyScraper:
             return []
 
     @staticmethod
+    @traced('parse', 'redfin')
     def _parse_redfin_sold_listings(page_text, subject_data=None):
         """Parse Redfin's recently-sold page text into comp listings.
 
@@ -986,23 +1016,24 @@ class PropertyScraper:
         lines = page_text.split('\n')
         current_block = []
 
-        for line in lines:
-            line = line.strip()
-            if not line:
-                if current_block:
-                    block_text = '\n'.join(current_block)
-                    # Only consider blocks that have both a price and an address-like line
-                    if '$' in block_text and re.search(r'\d+\s+\w+\s+(st|rd|ave|dr|ln|ct|way)', block_text.lower()):
-                        comp = self._parse_comp_from_text_block(block_text, 'redfin_text')
-                        if comp.get('sale_price'):
-                            is_distressed, _ = self._is_distressed_sale(block_text)
-                            if not is_distressed:
-                                is_valid, _ = self._is_valid_comp(comp, subject_data)
-                                if is_valid:
-                                    comps.append(comp)
-                    current_block = []
-            else:
-                current_block.append(line)
+        with span('filter'):
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    if current_block:
+                        block_text = '\n'.join(current_block)
+                        # Only consider blocks that have both a price and an address-like line
+                        if '$' in block_text and re.search(r'\d+\s+\w+\s+(st|rd|ave|dr|ln|ct|way)', block_text.lower()):
+                            comp = self._parse_comp_from_text_block(block_text, 'redfin_text')
+                            if comp.get('sale_price'):
+                                is_distressed, _ = self._is_distressed_sale(block_text)
+                                if not is_distressed:
+                                    is_valid, _ = self._is_valid_comp(comp, subject_data)
+                                    if is_valid:
+                                        comps.append(comp)
+                        current_block = []
+                else:
+                    current_block.append(line)
 
         logger.info(f"Parsed {len(comps)} comps from page text")
         return comps[:8]
@@ -1058,9 +1089,8 @@ class PropertyScraper:
             merged['source'] = f"{primary['source']}+{secondary['source']}"
         return merged
 
-    def scrape_property_and_comps(self, address):
-        """Scrape property data from multiple sources, then find filtered comparables"""
-        # Try Zillow first
+    def scrape_subject(self, address):
+        """Scrape the subject property — Zillow first, Redfin fills missing key fields"""
         property_data = self.scrape_zillow(address)
 
         # Check if we're missing key fields — try Redfin as backup
@@ -1070,17 +1100,25 @@ class PropertyScraper:
             logger.info(f"Zillow missing {missing} — trying Redfin backup")
             redfin_data = self.scrape_redfin(address)
             property_data = self._merge_scraped_data(property_data, redfin_data)
+        return property_data
 
-        # Find comps — try Zillow first, fall back to Redfin
-        comparables = self.find_comparables(address, subject_data=property_data)
+    def scrape_comps(self, address, subject_data=None, comp_pool=None):
+        """Find filtered comparables — Zillow first, Redfin comp search as fallback"""
+        comparables = self.find_comparables(address, subject_data=subject_data)
         if not comparables:
             logger.info("No Zillow comps — trying Redfin comp search")
-            comparables = self.find_comparables_redfin(address, subject_data=property_data)
+            comparables = self.find_comparables_redfin(address, subject_data=subject_data, comp_pool=comp_pool)
 
         # Add distance estimates to all comps
         for comp in comparables:
             if not comp.get('distance_miles'):
                 comp['distance_miles'] = self._estimate_distance(address, comp.get('address', ''))
+        return comparables
+
+    def scrape_property_and_comps(self, address):
+        """Scrape property data from multiple sources, then find filtered comparables"""
+        property_data = self.scrape_subject(address)
+        comparables = self.scrape_comps(address, subject_data=property_data)
 
         return {
             'property': property_data,
@@ -0,0 +1,575 @@
+"""
+Record and replay complete browser and Claude API sessions
+While recording, every driver.get / click-through is saved with the element
+lookups the scraper made on that page (text, attributes, nested lookups), and
+every Claude API call is saved with its request body, response bytes and
+timings. Replaying feeds those back into the real PropertyScraper and
+ClaudeAnalyzer, so parsing, filtering, prompt building, streaming and retries
+all run unchanged, optionally at the recorded speed
+"""
+
+import asyncio
+import atexit
+import hashlib
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from anthropic import DefaultAsyncHttpxClient, DefaultHttpxClient
+from selenium.common import exceptions as selenium_exceptions
+
+from claude_analyzer import ClaudeAnalyzer
+from selenium_scraper import PropertyScraper
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+# Response headers that describe the original transfer rather than the content
+_TRANSFER_HEADERS = {'content-length', 'content-encoding', 'transfer-encoding', 'connection', 'date'}
+# Result fields that record when or how fast, not what
+VOLATILE_KEYS = {'scraped_at', 'elapsed_ms'}
+
+
+class SessionRecording:
+    def __init__(self, path: Optional[str] = None):
+        """Pages and API exchanges for one recording, loaded from ``path`` if it exists"""
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {'version': FORMAT_VERSION, 'driver_starts': [], 'pages': {}, 'exchanges': {},
+                     'prompts': {}, 'runs': []}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.data.update(json.load(f))
+
+    def add_driver_start(self, seconds: float):
+        with self._lock:
+            self.data['driver_starts'].append(round(seconds, 4))
+
+    def driver_start_seconds(self) -> float:
+        with self._lock:
+            starts = self.data['driver_starts']
+            return statistics.median(starts) if starts else 0.0
+
+    def add_visit(self, key: str, visit: Dict):
+        with self._lock:
+            self.data['pages'].setdefault(key, []).append(visit)
+
+    def visits(self, key: str) -> List[Dict]:
+        with self._lock:
+            return self.data['pages'].get(key, [])
+
+    def add_exchange(self, key: str, prompt_key: str, exchange: Dict):
+        with self._lock:
+            self.data['exchanges'].setdefault(key, []).append(exchange)
+            keys = self.data['prompts'].setdefault(prompt_key, [])
+            if key not in keys:
+                keys.append(key)
+
+    def exchanges(self, key: str, prompt_key: str) -> Tuple[str, List[Dict]]:
+        """Recorded responses for the exact request, else for the same prompt sent with other settings"""
+        with self._lock:
+            if key in self.data['exchanges']:
+                return key, self.data['exchanges'][key]
+            for other in self.data['prompts'].get(prompt_key, []):
+                return other, self.data['exchanges'][other]
+            return key, []
+
+    def add_run(self, run: Dict):
+        with self._lock:
+            self.data['runs'].append(run)
+
+    def save(self):
+        """Write the whole recording; done when a recording scraper closes its driver and at the end of a run"""
+        if not self.path:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.data, f, default=str)
+            os.replace(tmp_path, self.path)
+
+
+# ============================================================
+# Browser
+# ============================================================
+
+def _lookup_key(many: bool, by: str, value: str) -> str:
+    return f"{'all' if many else 'one'} {by} {value}"
+
+
+class _RecordingElement:
+    """Live element proxy that writes what the scraper reads into ``record``"""
+
+    def __init__(self, element, record: Dict, driver: 'RecordingDriver'):
+        self._element = element
+        self._driver = driver
+        self.record = record
+
+    @property
+    def text(self):
+        self.record['text'] = self._element.text
+        return self.record['text']
+
+    def get_attribute(self, name):
+        value = self._element.get_attribute(name)
+        self.record.setdefault('attrs', {})[name] = value
+        return value
+
+    def find_element(self, by, value):
+        return _record_lookup(self._element, self.record, self._driver, False, by, value)
+
+    def find_elements(self, by, value):
+        return _record_lookup(self._element, self.record, self._driver, True, by, value)
+
+    def click(self):
+        self._driver._navigate(f"click:{self._driver._visit['url']}", self._element.click)
+
+
+def _record_lookup(node, record: Dict, driver: 'RecordingDriver', many: bool, by, value):
+    lookups = record.setdefault('lookups', {})
+    key = _lookup_key(many, by, value)
+    try:
+        found = node.find_elements(by, value) if many else node.find_element(by, value)
+    except Exception as e:
+        lookups[key] = {'error': type(e).__name__}
+        raise
+    if many:
+        children = [{} for _ in found]
+        lookups[key] = {'elements': children}
+        return [_RecordingElement(element, child, driver) for element, child in zip(found, children)]
+    child = {}
+    lookups[key] = {'element': child}
+    return _RecordingElement(found, child, driver)
+
+
+class RecordingDriver:
+    """WebDriver proxy saving each page visit, with its load time and lookups, to a SessionRecording"""
+
+    def __init__(self, driver, recording: SessionRecording):
+        self._driver = driver
+        self._recording = recording
+        self._visit = {'url': 'about:blank'}
+        self._visit_key = None
+
+    def _finish_visit(self):
+        if self._visit_key is not None:
+            self._visit['current_url'] = self._driver.current_url
+            self._recording.add_visit(self._visit_key, self._visit)
+            self._visit_key = None
+
+    def _navigate(self, key: str, action):
+        self._finish_visit()
+        started = time.perf_counter()
+        action()
+        self._visit = {'url': key.split(':', 1)[1] if key.startswith('click:') else key,
+                       'elapsed_s': round(time.perf_counter() - started, 4)}
+        self._visit_key = key
+
+    def get(self, url):
+        self._navigate(url, lambda: self._driver.get(url))
+
+    @property
+    def current_url(self):
+        return self._driver.current_url
+
+    def find_element(self, by, value):
+        return _record_lookup(self._driver, self._visit, self, False, by, value)
+
+    def find_elements(self, by, value):
+        return _record_lookup(self._driver, self._visit, self, True, by, value)
+
+    def quit(self):
+        self._finish_visit()
+        self._driver.quit()
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+
+def _raise_recorded(error: Optional[str]):
+    raise getattr(selenium_exceptions, error or '', selenium_exceptions.NoSuchElementException)(
+        'Not found in the recorded page')
+
+
+def _replay_lookup(record: Dict, driver: 'ReplayDriver', many: bool, by, value):
+    found = record.get('lookups', {}).get(_lookup_key(many, by, value))
+    if many:
+        return [_ReplayElement(child, driver) for child in (found or {}).get('elements', [])]
+    if not found or 'element' not in found:
+        _raise_recorded((found or {}).get('error'))
+    return _ReplayElement(found['element'], driver)
+
+
+class _ReplayElement:
+    def __init__(self, record: Dict, driver: 'ReplayDriver'):
+        self.record = record
+        self._driver = driver
+
+    @property
+    def text(self):
+        return self.record.get('text', '')
+
+    def get_attribute(self, name):
+        return self.record.get('attrs', {}).get(name)
+
+    def find_element(self, by, value):
+        return _replay_lookup(self.record, self._driver, False, by, value)
+
+    def find_elements(self, by, value):
+        return _replay_lookup(self.record, self._driver, True, by, value)
+
+    def click(self):
+        self._driver._navigate(f"click:{self._driver._visit['url']}")
+
+
+class ReplayDriver:
+    """Serves recorded visits; the n-th load of a URL gets its n-th recording (or the last one)"""
+
+    def __init__(self, recording: SessionRecording, reproduce_latency: bool = False):
+        self._recording = recording
+        self.reproduce_latency = reproduce_latency
+        self._visit = {'url': 'about:blank'}
+        self._loads = defaultdict(int)
+        self.pages_loaded = 0
+
+    def _navigate(self, key: str):
+        visits = self._recording.visits(key)
+        if visits:
+            self._visit = visits[min(self._loads[key], len(visits) - 1)]
+        else:
+            logger.warning(f"No recorded page for {key}")
+            self._visit = {'url': key.split(':', 1)[1] if key.startswith('click:') else key}
+        self._loads[key] += 1
+        self.pages_loaded += 1
+        if self.reproduce_latency:
+            time.sleep(self._visit.get('elapsed_s', 0))
+
+    def get(self, url):
+        self._navigate(url)
+
+    @property
+    def current_url(self):
+        return self._visit.get('current_url', self._visit['url'])
+
+    def find_element(self, by, value):
+        return _replay_lookup(self._visit, self, False, by, value)
+
+    def find_elements(self, by, value):
+        return _replay_lookup(self._visit, self, True, by, value)
+
+    def quit(self):
+        pass
+
+
+class RecordingPropertyScraper(PropertyScraper):
+    """Scrapes live with Chrome and records the session"""
+
+    def __init__(self, recording: SessionRecording, headless=True):
+        super().__init__(headless=headless)
+        self.recording = recording
+
+    def start_driver(self):
+        started = time.perf_counter()
+        if not super().start_driver():
+            return False
+        self.recording.add_driver_start(time.perf_counter() - started)
+        self.driver = RecordingDriver(self.driver, self.recording)
+        return True
+
+    def close_driver(self):
+        super().close_driver()
+        self.recording.save()
+
+
+class ReplayPropertyScraper(PropertyScraper):
+    """Runs the real scraping code against recorded pages, with render waits only when reproducing latency"""
+
+    def __init__(self, recording: SessionRecording, reproduce_latency: bool = False, headless=True):
+        super().__init__(headless=headless)
+        self.recording = recording
+        self.reproduce_latency = reproduce_latency
+
+    def start_driver(self):
+        with span('driver.start'):
+            if self.reproduce_latency:
+                time.sleep(self.recording.driver_start_seconds())
+            self.driver = ReplayDriver(self.recording, self.reproduce_latency)
+        return True
+
+    def _load_page(self, url, source, settle):
+        with span('driver.get', source):
+            self.driver.get(url)
+            if self.reproduce_latency:
+                time.sleep(settle)
+
+    def _click_through(self, element, source, settle):
+        with span('driver.click', source):
+            element.click()
+            if self.reproduce_latency:
+                time.sleep(settle)
+
+
+# ============================================================
+# Claude API
+# ============================================================
+
+def _request_keys(request: httpx.Request) -> Tuple[str, str]:
+    """(exact key, prompt key): the whole body, and just what was asked regardless of model and limits"""
+    try:
+        body = json.loads(request.content or b'{}')
+    except ValueError:
+        body = {'raw': request.content.decode('utf-8', 'replace')}
+    exact = json.dumps([request.method, request.url.path, body], sort_keys=True)
+    prompt = json.dumps([request.url.path, body.get('system'), body.get('messages'), body.get('stream')],
+                        sort_keys=True)
+    return hashlib.sha256(exact.encode()).hexdigest()[:24], hashlib.sha256(prompt.encode()).hexdigest()[:24]
+
+
+def _decode_chunk(chunk: bytes) -> str:
+    # surrogateescape keeps multi-byte characters split across chunks lossless through JSON
+    return chunk.decode('utf-8', 'surrogateescape')
+
+
+def _encode_chunk(text: str) -> bytes:
+    return text.encode('utf-8', 'surrogateescape')
+
+
+class _ExchangeRecorder:
+    """Collects one response's chunks with their offsets, stored once the SDK closes the response"""
+
+    def __init__(self, recording: SessionRecording, request: httpx.Request, response: httpx.Response,
+                 started: float):
+        self.recording = recording
+        self.keys = _request_keys(request)
+        self.started = started
+        self.exchange = {
+            'request': json.loads(request.content or b'null'),
+            'status': response.status_code,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() not in _TRANSFER_HEADERS},
+            'elapsed_s': round(time.perf_counter() - started, 4),
+            'chunks': [],
+        }
+        self._done = False
+
+    def add(self, chunk: bytes):
+        self.exchange['chunks'].append([round(time.perf_counter() - self.started, 4), _decode_chunk(chunk)])
+
+    def finish(self):
+        if not self._done:
+            self._done = True
+            self.recording.add_exchange(*self.keys, self.exchange)
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    def __init__(self, stream, recorder: _ExchangeRecorder):
+        self._stream = stream
+        self._recorder = recorder
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._recorder.add(chunk)
+            yield chunk
+
+    def close(self):
+        self._stream.close()
+        self._recorder.finish()
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, recorder: _ExchangeRecorder):
+        self._stream = stream
+        self._recorder = recorder
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._recorder.add(chunk)
+            yield chunk
+
+    async def aclose(self):
+        await self._stream.aclose()
+        self._recorder.finish()
+
+
+def _for_recording(request: httpx.Request):
+    # Uncompressed bodies keep recordings readable and replayable as text
+    request.headers['Accept-Encoding'] = 'identity'
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """Passes requests to the real API and records each response as it streams through"""
+
+    def __init__(self, recording: SessionRecording, transport: Optional[httpx.BaseTransport] = None):
+        self.recording = recording
+        self.transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        _for_recording(request)
+        started = time.perf_counter()
+        response = self.transport.handle_request(request)
+        recorder = _ExchangeRecorder(self.recording, request, response, started)
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_RecordingStream(response.stream, recorder), extensions=response.extensions)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRecordingTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of RecordingTransport"""
+
+    def __init__(self, recording: SessionRecording, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.recording = recording
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request):
+        _for_recording(request)
+        started = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        recorder = _ExchangeRecorder(self.recording, request, response, started)
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_AsyncRecordingStream(response.stream, recorder),
+                              extensions=response.extensions)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+_NOT_RECORDED = {'type': 'error', 'error': {'type': 'invalid_request_error',
+                                            'message': 'No recorded response for this request'}}
+
+
+class _ReplayCursor:
+    def __init__(self, recording: SessionRecording, reproduce_latency: bool):
+        """The n-th identical request gets the n-th recorded response (retries replay in order)"""
+        self.recording = recording
+        self.reproduce_latency = reproduce_latency
+        self._calls = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _next(self, request: httpx.Request) -> Optional[Dict]:
+        key, exchanges = self.recording.exchanges(*_request_keys(request))
+        if not exchanges:
+            logger.warning(f"No recorded Claude response for {request.url.path}")
+            return None
+        with self._lock:
+            index = self._calls[key]
+            self._calls[key] += 1
+        return exchanges[min(index, len(exchanges) - 1)]
+
+    @staticmethod
+    def _response(exchange: Optional[Dict], stream) -> httpx.Response:
+        if exchange is None:
+            return httpx.Response(400, json=_NOT_RECORDED)
+        return httpx.Response(exchange['status'], headers=exchange['headers'], stream=stream)
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    def __init__(self, exchange: Dict, reproduce_latency: bool):
+        self.exchange = exchange
+        self.reproduce_latency = reproduce_latency
+
+    def __iter__(self):
+        previous = self.exchange['elapsed_s']
+        for offset, text in self.exchange['chunks']:
+            if self.reproduce_latency:
+                time.sleep(max(0.0, offset - previous))
+            previous = offset
+            yield _encode_chunk(text)
+
+
+class _AsyncReplayStream(httpx.AsyncByteStream):
+    def __init__(self, exchange: Dict, reproduce_latency: bool):
+        self.exchange = exchange
+        self.reproduce_latency = reproduce_latency
+
+    async def __aiter__(self):
+        previous = self.exchange['elapsed_s']
+        for offset, text in self.exchange['chunks']:
+            if self.reproduce_latency:
+                await asyncio.sleep(max(0.0, offset - previous))
+            previous = offset
+            yield _encode_chunk(text)
+
+
+class ReplayTransport(_ReplayCursor, httpx.BaseTransport):
+    """Answers API requests from a recording, never touching the network"""
+
+    def handle_request(self, request):
+        request.read()
+        exchange = self._next(request)
+        if exchange is not None and self.reproduce_latency:
+            time.sleep(exchange['elapsed_s'])
+        return self._response(exchange, exchange and _ReplayStream(exchange, self.reproduce_latency))
+
+
+class AsyncReplayTransport(_ReplayCursor, httpx.AsyncBaseTransport):
+    """Async counterpart of ReplayTransport"""
+
+    async def handle_async_request(self, request):
+        await request.aread()
+        exchange = self._next(request)
+        if exchange is not None and self.reproduce_latency:
+            await asyncio.sleep(exchange['elapsed_s'])
+        return self._response(exchange, exchange and _AsyncReplayStream(exchange, self.reproduce_latency))
+
+
+def recording_analyzer(recording: SessionRecording, **kwargs) -> ClaudeAnalyzer:
+    """ClaudeAnalyzer calling the real API and recording every exchange"""
+    return ClaudeAnalyzer(http_client=DefaultHttpxClient(transport=RecordingTransport(recording)),
+                          async_http_client=DefaultAsyncHttpxClient(transport=AsyncRecordingTransport(recording)),
+                          **kwargs)
+
+
+def replay_analyzer(recording: SessionRecording, reproduce_latency: bool = False, **kwargs) -> ClaudeAnalyzer:
+    """ClaudeAnalyzer whose API calls are answered from the recording"""
+    kwargs.setdefault('api_key', 'replay')
+    return ClaudeAnalyzer(
+        http_client=DefaultHttpxClient(transport=ReplayTransport(recording, reproduce_latency)),
+        async_http_client=DefaultAsyncHttpxClient(transport=AsyncReplayTransport(recording, reproduce_latency)),
+        **kwargs)
+
+
+def result_digest(context: Dict) -> str:
+    """Hash of a pipeline run's scraped data, comps, valuation and analysis, ignoring VOLATILE_KEYS"""
+    def strip(value):
+        if isinstance(value, dict):
+            return {k: strip(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+        if isinstance(value, list):
+            return [strip(v) for v in value]
+        return value
+
+    result = context.get('result') or {}
+    payload = {
+        'property_data': strip(context.get('property_data')),
+        'comparables': strip(context.get('comparables')),
+        'local_valuation': strip(context.get('local_valuation')),
+        'result': {k: result.get(k) for k in ('success', 'content', 'error')},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+_recordings: Dict[str, SessionRecording] = {}
+_recordings_lock = threading.Lock()
+
+
+def shared_recording(path: Optional[str] = None) -> SessionRecording:
+    """One SessionRecording per file (SESSION_RECORDING, default cassettes/session.json), saved at exit"""
+    path = path or os.getenv('SESSION_RECORDING', os.path.join('cassettes', 'session.json'))
+    with _recordings_lock:
+        if path not in _recordings:
+            _recordings[path] = SessionRecording(path)
+            # API exchanges made after the last scraper closed are only written here
+            atexit.register(_recordings[path].save)
+        return _recordings[path]
+
+
+def replay_latency() -> bool:
+    return os.getenv('SESSION_REPLAY_LATENCY', 'false').lower() == 'true'
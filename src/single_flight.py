@@ -0,0 +1,134 @@
+"""
+Single-flight coalescing for duplicate concurrent work
+Concurrent calls with the same key attach to the one in-flight computation and
+share its result or exception. Optionally coordinates across processes with a
+lock file per key and hands the result over through the SQLite result store
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows - cross-process mode unavailable
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+RESULT_KIND = 'single_flight'
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    def __init__(self, timeout: Optional[float] = None, lock_dir: Optional[str] = None, store=None,
+                 poll_interval: float = 0.05):
+        """Coalesce calls per key; followers wait up to ``timeout`` seconds (SINGLE_FLIGHT_TIMEOUT, default 300).
+
+        With ``lock_dir`` set, processes sharing that directory also coalesce:
+        one holds the key's lock file while computing and publishes the result
+        to ``store`` (a ResultStore, default <lock_dir>/single_flight.db).
+        """
+        self.timeout = timeout if timeout is not None else float(os.getenv('SINGLE_FLIGHT_TIMEOUT', '300'))
+        self.lock_dir = lock_dir
+        self.poll_interval = poll_interval
+        if lock_dir:
+            if fcntl is None:
+                raise RuntimeError("Cross-process single-flight needs fcntl (POSIX only)")
+            os.makedirs(lock_dir, exist_ok=True)
+            if store is None:
+                from result_store import ResultStore
+                store = ResultStore(os.path.join(lock_dir, 'single_flight.db'))
+        self.store = store
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats = {'leaders': 0, 'followers': 0, 'cross_process_hits': 0}
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """Run ``fn`` once per key among concurrent callers and return its result to all of them"""
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats['leaders'] += 1
+            else:
+                call.followers += 1
+                self._stats['followers'] += 1
+        if not leader:
+            return self._wait(key, call, timeout)
+
+        try:
+            call.value = self._run_cross_process(key, fn, timeout) if self.lock_dir else fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.value
+
+    def _wait(self, key: str, call: _Call, timeout: Optional[float]) -> Any:
+        if not call.done.wait(timeout):
+            raise TimeoutError(f"Timed out after {timeout}s waiting for in-flight {key}")
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def _lock_path(self, key: str) -> str:
+        return os.path.join(self.lock_dir, hashlib.sha1(key.encode()).hexdigest() + '.lock')
+
+    @contextmanager
+    def _file_lock(self, key: str, timeout: Optional[float]):
+        """Exclusive flock on the key's lock file, polling so ``timeout`` is honored"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with open(self._lock_path(key), 'a') as f:
+            while True:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise TimeoutError(f"Timed out after {timeout}s waiting for {key} in another process")
+                    time.sleep(self.poll_interval)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _run_cross_process(self, key: str, fn: Callable[[], Any], timeout: Optional[float]) -> Any:
+        """Compute under the key's file lock unless another process finished it while we waited"""
+        waiting_since = time.time()
+        with self._file_lock(key, timeout):
+            shared = self.store.get(key, RESULT_KIND)
+            if shared and shared['finished_at'] >= waiting_since:
+                with self._lock:
+                    self._stats['cross_process_hits'] += 1
+                logger.info(f"Reusing {key} computed by another process")
+                if shared['error'] is not None:
+                    raise RuntimeError(shared['error'])
+                return shared['value']
+            try:
+                value = fn()
+            except Exception as e:
+                self.store.put(key, RESULT_KIND, {'finished_at': time.time(), 'value': None, 'error': str(e)})
+                raise
+            self.store.put(key, RESULT_KIND, {'finished_at': time.time(), 'value': value, 'error': None})
+            return value
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
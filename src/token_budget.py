@@ -0,0 +1,164 @@
+"""
+Token budget manager for Claude requests
+Estimates prompt size locally, picks max_tokens per analysis type from observed
+output sizes, and shrinks prompt payloads (comps, dict dumps) to fit a budget
+"""
+
+import json
+import math
+import threading
+from collections import defaultdict, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+# Rough average for English prose and JSON with the Claude tokenizer
+CHARS_PER_TOKEN = 4
+
+# Hard ceiling - the value _make_request always used before budgeting
+MAX_OUTPUT_TOKENS = 6000
+
+# Starting max_tokens per analysis type until enough outputs have been observed
+DEFAULT_MAX_TOKENS = {
+    'comprehensive': 4500,
+    'flip': 4000,
+    'property_value': 3500,
+    'investment': 2500,
+    'market_report': 3000,
+    'condition': 1500,
+    'listing_description': 1200,
+}
+
+# Fields that cost tokens without helping the model value a property
+LOW_VALUE_FIELDS = {'photos', 'scraped_at', '_raw_text', 'text_preview', 'timestamp'}
+
+# Longest string value kept verbatim when pruning payloads
+MAX_STRING_CHARS = 400
+
+
+def _to_number(value) -> Optional[float]:
+    """Parse '250,000' / 250000 / '$250,000' into a float, or None"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(str(value).replace(',', '').replace('$', '').strip())
+    except (ValueError, TypeError):
+        return None
+
+
+class TokenBudget:
+    def __init__(self, prompt_budget: int = 5000, headroom: float = 1.25,
+                 min_samples: int = 5, history: int = 50, floor: int = 512):
+        """Track output sizes per analysis type and size prompts to ``prompt_budget`` tokens"""
+        self.prompt_budget = prompt_budget
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.floor = floor
+        self._outputs = defaultdict(lambda: deque(maxlen=history))
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Estimate token count without calling the API"""
+        return math.ceil(len(text or '') / CHARS_PER_TOKEN)
+
+    def record_output(self, analysis_type: str, output_tokens: int, stop_reason: Optional[str] = None):
+        """Record an observed output size; truncated outputs count as larger than seen"""
+        if not analysis_type or not output_tokens:
+            return
+        if stop_reason == 'max_tokens':
+            output_tokens = int(output_tokens * 1.5)
+        with self._lock:
+            self._outputs[analysis_type].append(output_tokens)
+
+    def max_tokens_for(self, analysis_type: Optional[str], ceiling: int = MAX_OUTPUT_TOKENS) -> int:
+        """Pick max_tokens from the p95 of observed outputs plus headroom"""
+        with self._lock:
+            samples = sorted(self._outputs.get(analysis_type, ()))
+        if len(samples) < self.min_samples:
+            return min(DEFAULT_MAX_TOKENS.get(analysis_type, ceiling), ceiling)
+        p95 = samples[min(len(samples) - 1, int(math.ceil(0.95 * len(samples))) - 1)]
+        return max(self.floor, min(ceiling, int(p95 * self.headroom)))
+
+    @staticmethod
+    def compact_json(obj: Any) -> str:
+        """Serialize without indentation or padding"""
+        return json.dumps(obj, separators=(',', ':'), default=str)
+
+    def prune(self, obj: Any, max_string: int = MAX_STRING_CHARS) -> Any:
+        """Drop low-value and empty fields and clip long strings, recursively"""
+        if isinstance(obj, dict):
+            pruned = {}
+            for key, val in obj.items():
+                if key in LOW_VALUE_FIELDS or val is None or val == '' or val == [] or val == {}:
+                    continue
+                pruned[key] = self.prune(val, max_string)
+            return pruned
+        if isinstance(obj, list):
+            return [self.prune(v, max_string) for v in obj]
+        if isinstance(obj, str) and len(obj) > max_string:
+            return obj[:max_string] + '...'
+        return obj
+
+    def fit_json(self, obj: Any, max_tokens: Optional[int] = None) -> str:
+        """Compact JSON for a prompt, shrinking lists and strings until it fits ``max_tokens``"""
+        max_tokens = max_tokens or self.prompt_budget
+        max_string = MAX_STRING_CHARS
+        max_items = None
+        pruned = self.prune(obj, max_string)
+        text = self.compact_json(pruned)
+        while self.estimate_tokens(text) > max_tokens and max_string > 40:
+            max_string //= 2
+            max_items = 8 if max_items is None else max(1, max_items // 2)
+            pruned = self._clip_lists(self.prune(obj, max_string), max_items)
+            text = self.compact_json(pruned)
+        return text
+
+    def _clip_lists(self, obj: Any, max_items: int) -> Any:
+        if isinstance(obj, dict):
+            return {k: self._clip_lists(v, max_items) for k, v in obj.items()}
+        if isinstance(obj, list):
+            clipped = [self._clip_lists(v, max_items) for v in obj[:max_items]]
+            if len(obj) > max_items:
+                clipped.append(f"... {len(obj) - max_items} more omitted")
+            return clipped
+        return obj
+
+    @staticmethod
+    def _comp_distance(comp: Dict, subject: Optional[Dict]) -> float:
+        """Dissimilarity between a comp and the subject; lower is more comparable"""
+        score = 0.0
+        dist = _to_number(comp.get('distance_miles'))
+        score += dist if dist is not None else 2.0
+        if subject:
+            subj_sqft, comp_sqft = _to_number(subject.get('sqft')), _to_number(comp.get('sqft'))
+            if subj_sqft and comp_sqft:
+                score += abs(comp_sqft - subj_sqft) / subj_sqft * 5
+            subj_beds, comp_beds = _to_number(subject.get('beds')), _to_number(comp.get('beds'))
+            if subj_beds is not None and comp_beds is not None:
+                score += abs(comp_beds - subj_beds)
+        return score
+
+    def trim_comparables(self, comparables: List[Dict], subject: Optional[Dict] = None,
+                         max_comps: int = 8, max_tokens: int = 1500,
+                         tokens_per_comp: int = 60) -> Tuple[List[Dict], Optional[Dict]]:
+        """Keep the most similar comps that fit the budget and summarize the rest"""
+        if not comparables:
+            return [], None
+        limit = max(1, min(max_comps, max_tokens // tokens_per_comp))
+        ranked = sorted(comparables, key=lambda c: self._comp_distance(c, subject))
+        kept, dropped = ranked[:limit], ranked[limit:]
+        if not dropped:
+            return kept, None
+
+        prices = sorted(p for p in (_to_number(c.get('sale_price')) for c in dropped) if p)
+        ppsf = sorted(_to_number(c.get('sale_price')) / _to_number(c.get('sqft')) for c in dropped
+                      if _to_number(c.get('sale_price')) and _to_number(c.get('sqft')))
+        summary = {
+            'count': len(dropped),
+            'median_sale_price': round(prices[len(prices) // 2]) if prices else None,
+            'median_price_per_sqft': round(ppsf[len(ppsf) // 2]) if ppsf else None,
+        }
+        return kept, summary
+
+
+# Shared across analyzer instances so observed output sizes outlive a request
+default_budget = TokenBudget()
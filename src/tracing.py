@@ -0,0 +1,173 @@
+"""
+Lightweight tracing and metrics
+Spans time named steps (driver startup, page loads, extraction, filtering,
+prompt build, Claude calls, JSON parsing); every span feeds per-stage latency
+histograms for /metrics, and spans inside an active per-request trace are
+also collected so they can be returned with the response
+"""
+
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Seconds; Chrome page loads and Claude calls need the long tail
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+QUANTILES = (0.5, 0.95, 0.99)
+MAX_TRACE_SPANS = 200
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS, window: int = 1000):
+        """Cumulative bucket counts plus a rolling window of samples for quantiles"""
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        samples = sorted(self.samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, span: str, source: Optional[str], seconds: float):
+        with self._lock:
+            histogram = self._histograms.get((span, source or ''))
+            if histogram is None:
+                histogram = self._histograms[(span, source or '')] = Histogram()
+            histogram.observe(seconds)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """{"span[/source]": {count, sum, p50, p95, p99}}"""
+        with self._lock:
+            items = sorted(self._histograms.items())
+            result = {}
+            for (span, source), histogram in items:
+                entry = {'count': histogram.count, 'sum': round(histogram.sum, 6)}
+                for q in QUANTILES:
+                    entry[f'p{int(q * 100)}'] = histogram.quantile(q)
+                result[f'{span}/{source}' if source else span] = entry
+        return result
+
+    def render(self) -> List[str]:
+        """Span histograms and quantiles in the Prometheus text format"""
+        lines = ['# HELP realty_span_seconds Duration of traced steps',
+                 '# TYPE realty_span_seconds histogram']
+        quantile_lines = ['# HELP realty_span_quantile_seconds Recent p50/p95/p99 of traced steps',
+                          '# TYPE realty_span_quantile_seconds gauge']
+        with self._lock:
+            for (span, source), histogram in sorted(self._histograms.items()):
+                labels = f'span="{span}",source="{source}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float('inf'),), histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'realty_span_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f'realty_span_seconds_sum{{{labels}}} {histogram.sum:.6f}')
+                lines.append(f'realty_span_seconds_count{{{labels}}} {histogram.count}')
+                for q in QUANTILES:
+                    quantile_lines.append(
+                        f'realty_span_quantile_seconds{{{labels},quantile="{q}"}} {histogram.quantile(q):.6f}')
+        return lines + quantile_lines
+
+
+class Trace:
+    def __init__(self):
+        """Spans recorded for one request; totals cover every span, the list only the first MAX_TRACE_SPANS"""
+        self.started = time.perf_counter()
+        self.spans = []
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, source: Optional[str], start: float, seconds: float):
+        key = f'{name}/{source}' if source else name
+        with self._lock:
+            total = self.totals.setdefault(key, {'count': 0, 'ms': 0.0})
+            total['count'] += 1
+            total['ms'] += seconds * 1000
+            if len(self.spans) < MAX_TRACE_SPANS:
+                self.spans.append({'span': key, 'start_ms': round((start - self.started) * 1000, 1),
+                                   'ms': round(seconds * 1000, 1)})
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'total_ms': round((time.perf_counter() - self.started) * 1000, 1),
+                'totals': {key: {'count': t['count'], 'ms': round(t['ms'], 1)} for key, t in self.totals.items()},
+                'spans': list(self.spans),
+            }
+
+
+# Process-wide so /metrics covers every request, job and worker thread
+registry = MetricsRegistry()
+
+
+@contextmanager
+def span(name: str, source: Optional[str] = None):
+    """Time the block into the metrics registry and the current request's trace"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        registry.observe(name, source, seconds)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, source, start, seconds)
+
+
+def traced(name: str, source: Optional[str] = None):
+    """Decorator form of span()"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, source):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def trace():
+    """Collect the spans of everything run inside the block (and contexts copied from it)"""
+    current = Trace()
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def gauge_lines(name: str, help_text: str, samples: Iterable[Tuple[Dict[str, str], float]]) -> List[str]:
+    """One Prometheus gauge with a sample per label set; None values are skipped"""
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+    for labels, value in samples:
+        if value is None:
+            continue
+        label_text = ','.join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+        lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+    return lines
@@ -0,0 +1,152 @@
+"""
+Deterministic local valuation engine
+Applies standard per-comp adjustments (size, beds, baths, age, basement, lot),
+weights adjusted comps by similarity, and returns an FMV with range and
+confidence in milliseconds - a fast path and a reference number for Claude
+"""
+
+import re
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Adjustment rates. Size is priced at a fraction of the comp's own $/sqft since
+# marginal square footage is worth less than the average.
+ADJUSTMENTS = {
+    'size_ppsf_factor': 0.5,
+    'per_bedroom': 7500,
+    'per_bathroom': 10000,
+    'age_pct_per_year': 0.003,
+    'age_pct_cap': 0.15,
+    'basement_per_sqft': 40,       # CT finished basements typically add $30-60/sqft
+    'lot_per_acre': 20000,
+    'lot_acres_cap': 2.0,
+}
+
+# Similarity penalty weights: gross adjustment %, miles away, size mismatch
+SIMILARITY_WEIGHTS = {'gross_adjustment': 4.0, 'distance': 0.5, 'size': 2.0}
+
+# Share of the weighted spread used for the value range (~80% interval)
+RANGE_Z = 1.28
+MIN_RANGE_PCT = 0.05
+
+
+def _num(value) -> float:
+    """Parse '250,000' / '$250,000' / 3 into a float, NaN when missing"""
+    if value is None or value == '':
+        return np.nan
+    try:
+        return float(str(value).replace(',', '').replace('$', '').strip())
+    except (ValueError, TypeError):
+        return np.nan
+
+
+def _lot_acres(value) -> float:
+    """Lot size in acres from '0.25 acres' / '10,890 sqft' / a bare number of acres"""
+    if value is None or value == '':
+        return np.nan
+    text = str(value).lower()
+    m = re.search(r'([\d,.]+)\s*(acres?|sq\s*ft|sqft)?', text)
+    if not m:
+        return np.nan
+    try:
+        amount = float(m.group(1).replace(',', ''))
+    except ValueError:
+        return np.nan
+    if m.group(2) and 'sq' in m.group(2):
+        return amount / 43560
+    return amount
+
+
+def _column(rows: List[Dict], key: str, parse=_num) -> np.ndarray:
+    return np.array([parse(r.get(key)) for r in rows], dtype=float)
+
+
+def estimate_value(subject: Dict, comparables: List[Dict], adjustments: Optional[Dict] = None) -> Dict:
+    """Adjusted-comp valuation of ``subject``. Returns {'available': False, ...} without usable comps."""
+    started = time.perf_counter()
+    rates = dict(ADJUSTMENTS, **(adjustments or {}))
+
+    comps = [c for c in comparables or [] if _num(c.get('sale_price')) > 0]
+    if not comps:
+        return {'available': False, 'reason': 'no comparable sales with a price', 'method': 'local_adjusted_comps'}
+
+    price = _column(comps, 'sale_price')
+    sqft = _column(comps, 'sqft')
+    beds = _column(comps, 'beds')
+    baths = _column(comps, 'baths')
+    year = _column(comps, 'year_built')
+    basement = _column(comps, 'sqft_finished_basement')
+    lot = _column(comps, 'lot_size', _lot_acres)
+    distance = _column(comps, 'distance_miles')
+
+    s_sqft = _num(subject.get('sqft'))
+    s_beds = _num(subject.get('beds'))
+    s_baths = _num(subject.get('baths'))
+    s_year = _num(subject.get('year_built'))
+    s_basement = _num(subject.get('sqft_finished_basement'))
+    s_lot = _lot_acres(subject.get('lot_size'))
+
+    ppsf = price / sqft
+    median_ppsf = np.nanmedian(ppsf) if np.isfinite(ppsf).any() else np.nan
+    comp_ppsf = np.where(np.isfinite(ppsf), ppsf, median_ppsf)
+
+    # Each adjustment is zero where either side is unknown
+    size_adj = np.nan_to_num((s_sqft - sqft) * comp_ppsf * rates['size_ppsf_factor'])
+    bed_adj = np.nan_to_num((s_beds - beds) * rates['per_bedroom'])
+    bath_adj = np.nan_to_num((s_baths - baths) * rates['per_bathroom'])
+    age_pct = np.clip((s_year - year) * rates['age_pct_per_year'], -rates['age_pct_cap'], rates['age_pct_cap'])
+    age_adj = np.nan_to_num(age_pct * price)
+    # A comp with no basement figure is treated as having none only when the subject's is known
+    basement_adj = np.nan_to_num((s_basement - np.nan_to_num(basement)) * rates['basement_per_sqft'])
+    lot_delta = np.clip(s_lot - lot, -rates['lot_acres_cap'], rates['lot_acres_cap'])
+    lot_adj = np.nan_to_num(lot_delta * rates['lot_per_acre'])
+
+    adj = np.vstack([size_adj, bed_adj, bath_adj, age_adj, basement_adj, lot_adj])
+    adjusted = price + adj.sum(axis=0)
+    gross_pct = np.abs(adj).sum(axis=0) / price
+
+    size_mismatch = np.nan_to_num(np.abs(sqft / s_sqft - 1), nan=0.25) if s_sqft > 0 else np.full(len(comps), 0.25)
+    penalty = (SIMILARITY_WEIGHTS['gross_adjustment'] * gross_pct
+               + SIMILARITY_WEIGHTS['distance'] * np.nan_to_num(distance, nan=2.0)
+               + SIMILARITY_WEIGHTS['size'] * size_mismatch)
+    weights = 1.0 / (1.0 + penalty)
+    weights /= weights.sum()
+
+    fmv = float(np.dot(weights, adjusted))
+    spread = float(np.sqrt(np.dot(weights, (adjusted - fmv) ** 2)))
+    half_range = max(RANGE_Z * spread, MIN_RANGE_PCT * fmv)
+
+    cv = spread / fmv if fmv > 0 else 1.0
+    avg_gross = float(np.dot(weights, gross_pct))
+    score = (0.4 * min(len(comps), 6) / 6
+             + 0.4 * (1 - min(cv / 0.2, 1))
+             + 0.2 * (1 - min(avg_gross / 0.3, 1)))
+    confidence = 'High' if score >= 0.7 else 'Medium' if score >= 0.45 else 'Low'
+
+    names = ['size', 'beds', 'baths', 'age', 'basement', 'lot']
+    adjusted_comps = [
+        {
+            'address': comp.get('address'),
+            'sale_price': int(price[i]),
+            'adjusted_value': int(round(adjusted[i])),
+            'weight': round(float(weights[i]), 3),
+            'adjustments': {name: int(round(adj[j, i])) for j, name in enumerate(names) if adj[j, i]},
+        }
+        for i, comp in enumerate(comps)
+    ]
+
+    return {
+        'available': True,
+        'method': 'local_adjusted_comps',
+        'estimated_fair_market_value': int(round(fmv)),
+        'value_range_low': int(round(fmv - half_range)),
+        'value_range_high': int(round(fmv + half_range)),
+        'confidence_level': confidence,
+        'confidence_score': round(score, 2),
+        'comps_used': len(comps),
+        'median_price_per_sqft': int(round(median_ppsf)) if np.isfinite(median_ppsf) else None,
+        'adjusted_comps': adjusted_comps,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
@@ -0,0 +1,14 @@
+"""
+Shared pytest configuration
+"""
+
+import os
+import sys
+
+# Modules in src/ import each other by bare name (see src/app.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+# The app builds its pipeline at import; keep the suite off Chrome, Claude and the on-disk store
+os.environ.setdefault('SCRAPER_BACKEND', 'fake')
+os.environ.setdefault('ANALYZER_BACKEND', 'fake')
+os.environ.setdefault('STORE_BACKEND', 'memory')
@@ -0,0 +1,171 @@
+"""
+Local stand-in for a Redis server
+Speaks enough RESP for RedisCache: strings with expiry, SET NX, SCAN, INFO and
+the compare-and-delete lock release script, with allkeys-lru eviction past a
+key limit in place of maxmemory
+"""
+
+import re
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+
+# The one Lua script the server runs, spelled as RedisCache sends it
+COMPARE_AND_DELETE = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) else return 0 end"
+
+
+def _glob_to_regex(pattern: str) -> str:
+    out, i = [], 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == '\\' and i + 1 < len(pattern):
+            i += 1
+            out.append(re.escape(pattern[i]))
+        elif ch == '*':
+            out.append('.*')
+        elif ch == '?':
+            out.append('.')
+        else:
+            out.append(re.escape(ch))
+        i += 1
+    return ''.join(out) + r'\Z'
+
+
+class FakeRedisServer:
+    """Threaded TCP server keeping one database in memory"""
+
+    def __init__(self, max_keys=None, password=None):
+        self.max_keys = max_keys
+        self.password = password
+        self.evicted_keys = 0
+        self.commands = []
+        self._data = OrderedDict()  # key -> (value, expires_at or None), least recently used first
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        auth = f":{self.password}@" if self.password else ''
+        return f"redis://{auth}{host}:{port}/0"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and time.time() > entry[1]:
+            del self._data[key]
+            return None
+        return entry
+
+    def execute(self, args):
+        """Reply to one command, as the Python value the handler encodes"""
+        name = args[0].decode().upper()
+        self.commands.append(name)
+        with self._lock:
+            if name == 'PING':
+                return 'PONG'
+            if name in ('AUTH', 'SELECT'):
+                if name == 'AUTH' and args[-1].decode() != self.password:
+                    return Exception('WRONGPASS invalid password')
+                return 'OK'
+            if name == 'GET':
+                entry = self._live(args[1])
+                if entry is None:
+                    return None
+                self._data.move_to_end(args[1])
+                return entry[0]
+            if name == 'SET':
+                return self._set(args[1], args[2], [a.decode().upper() for a in args[3:]])
+            if name == 'DEL':
+                return sum(self._data.pop(key, None) is not None for key in args[1:])
+            if name == 'EXISTS':
+                return sum(self._live(key) is not None for key in args[1:])
+            if name == 'DBSIZE':
+                return sum(self._live(key) is not None for key in list(self._data))
+            if name == 'SCAN':
+                options = [a.decode() for a in args[2:]]
+                pattern = options[options.index('MATCH') + 1] if 'MATCH' in options else '*'
+                regex = re.compile(_glob_to_regex(pattern))
+                # One pass returns everything; real servers page through with the cursor
+                return [b'0', [key for key in list(self._data)
+                               if self._live(key) is not None and regex.match(key.decode())]]
+            if name == 'INFO':
+                return f"# Stats\r\nevicted_keys:{self.evicted_keys}\r\n".encode()
+            if name == 'EVAL':
+                if args[1].decode() != COMPARE_AND_DELETE or int(args[2]) != 1:
+                    return Exception('ERR unsupported script')
+                entry = self._live(args[3])
+                if entry is None or entry[0] != args[4]:
+                    return 0
+                del self._data[args[3]]
+                return 1
+            if name == 'FLUSHDB':
+                self._data.clear()
+                return 'OK'
+        return Exception(f"ERR unknown command '{name}'")
+
+    def _set(self, key, value, options):
+        expires_at = None
+        for flag, scale in (('EX', 1), ('PX', 0.001)):
+            if flag in options:
+                expires_at = time.time() + int(options[options.index(flag) + 1]) * scale
+        if 'NX' in options and self._live(key) is not None:
+            return None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while self.max_keys is not None and len(self._data) > self.max_keys:
+            self._data.popitem(last=False)
+            self.evicted_keys += 1
+        return 'OK'
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    args = self._read_command()
+                    if args is None:
+                        return
+                    self.wfile.write(self._encode(server.execute(args)))
+
+            def _read_command(self):
+                line = self.rfile.readline()
+                if not line:
+                    return None
+                args = []
+                for _ in range(int(line[1:])):
+                    length = int(self.rfile.readline()[1:])
+                    args.append(self.rfile.read(length + 2)[:-2])
+                return args
+
+            def _encode(self, value):
+                if value is None:
+                    return b'$-1\r\n'
+                if isinstance(value, Exception):
+                    return b'-%s\r\n' % str(value).encode()
+                if isinstance(value, str):
+                    return b'+%s\r\n' % value.encode()
+                if isinstance(value, int):
+                    return b':%d\r\n' % value
+                if isinstance(value, bytes):
+                    return b'$%d\r\n%s\r\n' % (len(value), value)
+                return b'*%d\r\n' % len(value) + b''.join(self._encode(v) for v in value)
+
+        return Handler
@@ -0,0 +1,64 @@
+"""
+Unit tests for admission control
+"""
+
+import threading
+import time
+
+import pytest
+
+from admission import Admission, AdmissionLimiter, Overloaded
+from backends import FakeScraper
+from pipeline import AnalysisPipeline
+
+
+def test_waiter_is_admitted_when_slot_frees():
+    """Test that a queued request gets the slot once the holder releases it"""
+    limiter = AdmissionLimiter('browser', limit=1, max_queue=1, max_wait=5)
+    limiter.acquire()
+    waited = []
+    waiter = threading.Thread(target=lambda: waited.append(limiter.acquire()))
+    waiter.start()
+    time.sleep(0.05)
+    assert limiter.stats()['queue_depth'] == 1
+
+    limiter.release(0.05)
+    waiter.join(2)
+    assert waited and waited[0] >= 0.04
+    assert limiter.stats()['active'] == 1
+
+
+def test_full_queue_rejects_immediately():
+    """Test that requests beyond the queue bound fail fast with a retry hint"""
+    limiter = AdmissionLimiter('browser', limit=1, max_queue=0, max_wait=5)
+    limiter.acquire()
+    started = time.monotonic()
+    with pytest.raises(Overloaded) as excinfo:
+        limiter.acquire()
+    assert time.monotonic() - started < 0.5
+    assert excinfo.value.retry_after >= 1
+    assert limiter.stats()['rejected_queue_full'] == 1
+
+
+def test_queue_wait_is_bounded():
+    """Test that a queued request gives up after max_wait"""
+    limiter = AdmissionLimiter('llm', limit=1, max_queue=5, max_wait=0.05)
+    with limiter.slot():
+        with pytest.raises(Overloaded):
+            limiter.acquire()
+    assert limiter.stats()['rejected_timeout'] == 1
+    assert limiter.stats()['active'] == 0
+
+
+def test_pipeline_releases_browser_slot_and_rejects_when_full():
+    """Test that the browser slot is returned after scraping and overload surfaces as Overloaded"""
+    admission = Admission(browser=AdmissionLimiter('browser', limit=1, max_queue=0, max_wait=1),
+                          llm=AdmissionLimiter('llm', limit=1, max_queue=0, max_wait=1))
+    pipeline = AnalysisPipeline(scraper_factory=FakeScraper, ttl=0, admission=admission)
+    pipeline.run({'address': '1 Main St'}, analysis=None)
+    assert admission.browser.stats()['active'] == 0
+    assert admission.browser.stats()['admitted'] == 1
+
+    admission.browser.acquire()
+    with pytest.raises(Overloaded):
+        pipeline.run({'address': '2 Main St'}, analysis=None)
@@ -4,7 +4,8 @@ Unit tests for the main Flask application
 
 import pytest
 import json
-from src.app import app
+import re
+from app import app
 
 @pytest.fixture
 def client():
@@ -44,4 +45,50 @@ def test_analyze_endpoint_invalid_json(client):
     response = client.post('/analyze',
                           data='invalid json',
                           content_type='application/json')
-    assert response.status_code == 400
\ No newline at end of file
+    assert response.status_code == 400
+
+def test_jobs_endpoint_no_address(client):
+    """Test that job submission validates the address before queuing"""
+    response = client.post('/jobs', json={'analysis_type': 'flip'})
+    assert response.status_code == 400
+    assert 'Address is required' in json.loads(response.data)['error']
+
+def test_jobs_endpoint_rejects_non_object_body(client):
+    """Test that a JSON array or non-JSON body is a 400, not a server error"""
+    response = client.post('/jobs', json=[{'address': '123 Main St, Anytown, CA'}])
+    assert response.status_code == 400
+    response = client.post('/jobs', data='invalid json', content_type='application/json')
+    assert response.status_code == 400
+
+def test_jobs_endpoint_accepts_every_ui_analysis_type(client):
+    """Test that each analysis option in the form maps to a type /jobs accepts"""
+    page = client.get('/').get_data(as_text=True)
+    select = re.search(r'<select[^>]*id="analysisType".*?</select>', page, re.S).group(0)
+    options = re.findall(r'<option value="([^"]+)"', select)
+    mapping = dict(re.findall(r"(\w+): '(\w+)'", re.search(r'JOB_ANALYSES = \{(.*?)\}', page).group(1)))
+    assert set(options) == set(mapping)
+    for option in options:
+        response = client.post('/jobs', json={'address': '123 Main St, Anytown, CA',
+                                              'analysis_type': mapping[option]})
+        assert response.status_code == 202, option
+
+def test_jobs_endpoint_unknown_job(client):
+    """Test that polling an unknown job id returns 404"""
+    from app import jobs
+    from result_store import ResultStore
+    jobs._store = ResultStore(':memory:')
+    response = client.get('/jobs/does-not-exist')
+    assert response.status_code == 404
+
+def test_portfolio_endpoint_rejects_csv_without_address(client):
+    """Test that a CSV without an address column is rejected before streaming"""
+    response = client.post('/portfolio', data='street,price\n1 Main St,1\n', content_type='text/csv')
+    assert response.status_code == 400
+
+def test_metrics_endpoint(client):
+    """Test that /metrics serves Prometheus text with stage histograms and gauges"""
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert b'# TYPE realty_span_seconds histogram' in response.data
+    assert b'realty_admission_queue_depth{resource="browser"}' in response.data
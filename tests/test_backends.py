@@ -0,0 +1,75 @@
+"""
+Unit tests for the backend registry, in-memory fakes and record/replay backends
+"""
+
+import pytest
+
+import backends
+from backends import (Cassette, FakeAnalyzer, FakeScraper, RecordingAnalyzer, RecordingScraper, ReplayAnalyzer,
+                      ReplayScraper, create, factory_for)
+from pipeline import AnalysisPipeline, NullCache, StageCache
+
+ADDRESS = '12 Elm St, Hartford, CT 06106'
+
+
+def test_create_uses_env_then_default(monkeypatch):
+    """Test that create() picks the backend from the environment, then the default"""
+    monkeypatch.setenv('CACHE_BACKEND', 'none')
+    assert isinstance(create('cache'), NullCache)
+    assert isinstance(create('cache', 'memory'), StageCache)
+    monkeypatch.delenv('CACHE_BACKEND')
+    assert isinstance(create('cache'), StageCache)
+
+
+def test_unknown_backend_lists_choices():
+    """Test that an unknown backend name raises ValueError listing the registered ones"""
+    with pytest.raises(ValueError, match='available: .*fake'):
+        create('scraper', 'nope')
+    with pytest.raises(ValueError):
+        factory_for('analyzer', 'nope')
+
+
+def test_fake_scraper_is_deterministic():
+    """Test that the fake scraper returns the same data for the same address"""
+    first, second = FakeScraper(), FakeScraper()
+    assert first.scrape_subject(ADDRESS) == second.scrape_subject(ADDRESS)
+    assert first.scrape_subject(ADDRESS)['sqft'] == second.scrape_subject(ADDRESS.upper())['sqft']
+    comps = first.scrape_comps(ADDRESS)
+    assert len(comps) == 6 and all(comp['sale_price'] for comp in comps)
+
+
+def test_pipeline_runs_on_fakes():
+    """Test that a full pipeline run completes on the fake scraper and analyzer"""
+    pipeline = AnalysisPipeline(scraper_factory=FakeScraper, analyzer_factory=FakeAnalyzer, cache=NullCache())
+    context = pipeline.run({'address': ADDRESS}, analysis='comprehensive')
+    assert context['result']['success']
+    assert context['property_data']['sqft']
+    assert len(context['comparables']) == 6
+
+
+def test_record_then_replay(tmp_path):
+    """Test that a replayed run reproduces the recorded comps and analysis"""
+    tape_path = str(tmp_path / 'tape.json')
+    tape = Cassette(tape_path)
+    recording_scraper = RecordingScraper(FakeScraper(), tape)
+    recording_analyzer = RecordingAnalyzer(FakeAnalyzer(), tape)
+    recorded = AnalysisPipeline(scraper_factory=lambda: recording_scraper,
+                                analyzer_factory=lambda: recording_analyzer,
+                                cache=NullCache()).run({'address': ADDRESS}, analysis='flip')
+
+    tape = Cassette(tape_path)  # reloaded from disk
+    replayed = AnalysisPipeline(scraper_factory=lambda: ReplayScraper(tape),
+                                analyzer_factory=lambda: ReplayAnalyzer(tape),
+                                cache=NullCache()).run({'address': ADDRESS}, analysis='flip')
+    assert replayed['comparables'] == recorded['comparables']
+    assert replayed['result']['content'] == recorded['result']['content']
+
+    missing = ReplayAnalyzer(tape).comprehensive_property_analysis({'property': {'address': ADDRESS}})
+    assert not missing['success']
+
+
+def test_cassette_dir_from_env(tmp_path, monkeypatch):
+    """Test that cassettes are written under BACKEND_CASSETTE_DIR"""
+    monkeypatch.setenv('BACKEND_CASSETTE_DIR', str(tmp_path))
+    backends.cassette('scraper').put('subject|x', {'sqft': 1})
+    assert Cassette(str(tmp_path / 'scraper.json')).get('subject|x') == {'sqft': 1}
@@ -0,0 +1,52 @@
+"""
+Unit tests for message-batch portfolio analysis against a local stand-in batch server
+"""
+
+import json
+
+from batch_analyzer import PortfolioBatch
+from benchmarks.fake_anthropic import SAMPLE_CMA, FakeAnthropicServer
+from claude_analyzer import ClaudeAnalyzer
+from result_store import ResultStore
+
+
+def test_batch_results_are_stored_by_property_key():
+    """Test that a portfolio batch is submitted, polled, and mapped back to property keys"""
+    portfolio = {
+        '5 charles st willimantic ct': {'property': {'address': '5 Charles St, Willimantic, CT', 'price': '250000'},
+                                        'comparables': []},
+        '9 oak st willimantic ct': {'property': {'address': '9 Oak St, Willimantic, CT', 'price': '310000'},
+                                    'comparables': []},
+    }
+    store = ResultStore(':memory:')
+    with FakeAnthropicServer(response_text=json.dumps(SAMPLE_CMA)) as server:
+        server.batch_polls_until_end = 2
+        analyzer = ClaudeAnalyzer(api_key='test-key', base_url=server.base_url)
+        counts = PortfolioBatch(analyzer, store, poll_interval=0.01).run(portfolio, timeout=5)
+
+    assert counts['succeeded'] == 2
+    # Valid results are stored as returned, with no repair calls
+    assert server.requests == []
+    submitted = next(iter(server.batches.values()))['requests']
+    assert '5 Charles St' in submitted[0]['params']['messages'][0]['content']
+    result = store.get('9 oak st willimantic ct', 'comprehensive')
+    assert result['success']
+    assert result['analysis'] == SAMPLE_CMA and 'repaired_fields' not in result
+
+
+def test_invalid_batch_results_are_repaired_before_storing():
+    """Test that batch results go through the same schema check and field repair as interactive ones"""
+    portfolio = {'5 charles st': {'property': {'address': '5 Charles St, Willimantic, CT'}, 'comparables': []}}
+    broken = dict(SAMPLE_CMA, valuation=dict(SAMPLE_CMA['valuation'], estimated_fair_market_value='about 255k'))
+    store = ResultStore(':memory:')
+    with FakeAnthropicServer(response_text=json.dumps(broken)) as server:
+        server.responses = [json.dumps({'valuation': SAMPLE_CMA['valuation']})]
+        analyzer = ClaudeAnalyzer(api_key='test-key', base_url=server.base_url)
+        PortfolioBatch(analyzer, store, poll_interval=0.01).run(portfolio, timeout=5)
+
+    # One direct call, for the invalid section only
+    assert len(server.requests) == 1
+    assert 'estimated_fair_market_value' in server.requests[0]['messages'][0]['content']
+    result = store.get('5 charles st', 'comprehensive')
+    assert result['repaired_fields'] == ['valuation'] and 'validation_errors' not in result
+    assert result['analysis'] == SAMPLE_CMA
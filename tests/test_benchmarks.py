@@ -0,0 +1,63 @@
+"""
+Unit tests for the benchmark harness and its page fixtures
+"""
+
+from benchmarks.harness import calibrate, compare, load_baseline, measure, save_baseline
+from benchmarks.pages import FixtureScraper, fixture_text
+from selenium_scraper import PropertyScraper
+
+
+def test_fixture_pages_parse_and_filter_like_live_pages():
+    """Test that captured Redfin pages yield listings and the fixture scraper filters them"""
+    listings = PropertyScraper._parse_redfin_sold_listings(fixture_text('redfin_sold_hartford.txt'))
+    assert len(listings) == 64
+
+    scraper = FixtureScraper()
+    scraper.start_driver()
+    subject = scraper.scrape_subject('77 Church St, Hartford, CT 06105')
+    comps = scraper.scrape_comps(subject['address'], subject_data=subject)
+    assert 0 < len(comps) <= 8
+    assert all('_raw_text' not in comp and int(comp['sale_price']) >= 50000 for comp in comps)
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    """Test that only benchmarks slower than baseline by more than the tolerance regress"""
+    result = measure(lambda: sum(range(100)), min_time=0.01, repeats=2)
+    assert result['best_s'] <= result['median_s']
+
+    rows = compare({'fast': {'best_s': 1.1, 'median_s': 1.2}, 'slow': {'best_s': 1.5, 'median_s': 1.6},
+                    'new': {'best_s': 1.0, 'median_s': 1.0}},
+                   {'fast': {'best_s': 1.0}, 'slow': {'best_s': 1.0}}, tolerance=0.25)
+    assert {row['name']: row['regressed'] for row in rows} == {'fast': False, 'slow': True, 'new': False}
+
+
+def test_baseline_scaled_by_host_calibration(tmp_path):
+    """Test that a baseline recorded on a faster host only regresses beyond the calibrated slowdown"""
+    path = str(tmp_path / 'baseline.json')
+    save_baseline(path, {'parse': {'best_s': 1.0, 'median_s': 1.1}}, calibrate(min_time=0.01, repeats=2))
+    baseline, calibration_s = load_baseline(path)
+    assert calibration_s > 0
+    assert load_baseline(str(tmp_path / 'missing.json')) == ({}, None)
+
+    # This host runs the calibration workload 1.6x slower than the one that recorded the baseline
+    results = {'parse': {'best_s': 1.8, 'median_s': 1.9}}
+    assert compare(results, baseline, tolerance=0.25)[0]['regressed']
+    row = compare(results, baseline, tolerance=0.25, host_factor=1.6)[0]
+    assert not row['regressed'] and row['baseline_s'] == 1.6
+    assert compare({'parse': {'best_s': 2.1, 'median_s': 2.2}}, baseline, tolerance=0.25, host_factor=1.6)[0]['regressed']
+
+
+def test_load_test_against_stubbed_app():
+    """Test that a short in-process load run reports every endpoint in the mix"""
+    from benchmarks.load_test import InProcessTarget, LoadTest, parse_mix
+
+    target = InProcessTarget(time_scale=0.001, llm_median=1.0, warm=False)
+    try:
+        report = LoadTest(target.url, rate=40, duration=0.5, mix=parse_mix('analyze=1,flip=1,static=1'),
+                          timeout=30, rss_interval=0.1).run()
+    finally:
+        target.close()
+
+    assert sum(e['requests'] for e in report['endpoints'].values()) == report['sent']
+    assert all(e['error_rate'] < 1 for e in report['endpoints'].values())
+    assert report['rss_mb']['timeline']
@@ -0,0 +1,259 @@
+"""
+Unit tests for running concurrent scrapes in tabs of shared browsers, and recycling them
+"""
+
+import atexit
+import itertools
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+from selenium.common.exceptions import InvalidSessionIdException, NoSuchElementException
+
+from admission import Overloaded
+import browser_pool
+from browser_pool import BrowserPool, PooledPropertyScraper
+from driver_watchdog import DriverWatchdog, process_tree_rss
+
+
+class _Element:
+    def __init__(self, driver, handle, text):
+        self._driver = driver
+        self._handle = handle
+        self._text = text
+
+    @property
+    def text(self):
+        self._driver.check(self._handle)
+        return self._text
+
+    def click(self):
+        self._driver.check(self._handle)
+        self._driver.get(self._driver.tabs[self._handle]['url'] + '/next')
+
+
+class MultiTabDriver:
+    """A browser whose pages take ``load_s`` to load and whose commands act on the current window only"""
+    started = []
+
+    def __init__(self, load_s=0.2):
+        self.load_s = load_s
+        self._ids = itertools.count()
+        self.tabs = {}
+        self.current_window_handle = self._open()
+        self.switch_to = self
+        self.max_tabs = 1
+        self.quit_called = False
+        MultiTabDriver.started.append(self)
+
+    def _open(self):
+        handle = f"tab-{next(self._ids)}"
+        self.tabs[handle] = {'url': 'about:blank', 'ready_at': 0}
+        return handle
+
+    def check(self, handle):
+        assert self.current_window_handle == handle, 'command sent to another task\'s tab'
+
+    @property
+    def window_handles(self):
+        return list(self.tabs)
+
+    def window(self, handle):
+        self.current_window_handle = handle
+
+    def new_window(self, kind):
+        self.current_window_handle = self._open()
+        self.max_tabs = max(self.max_tabs, len(self.tabs))
+
+    def close(self):
+        del self.tabs[self.current_window_handle]
+
+    def get(self, url):
+        self.tabs[self.current_window_handle] = {'url': url, 'ready_at': time.monotonic() + self.load_s}
+
+    @property
+    def current_url(self):
+        return self.tabs[self.current_window_handle]['url']
+
+    def execute_script(self, script):
+        if 'readyState' in script:
+            ready = time.monotonic() >= self.tabs[self.current_window_handle]['ready_at']
+            return 'complete' if ready else 'loading'
+
+    def find_element(self, by, value):
+        if value == 'missing':
+            raise NoSuchElementException(value)
+        return _Element(self, self.current_window_handle, f"page {self.current_url}")
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture(autouse=True)
+def _reset_started():
+    MultiTabDriver.started = []
+
+
+def test_tasks_share_browsers_and_overlap_page_loads():
+    """Test that concurrent tasks share browsers as tabs and their page loads overlap"""
+    pool = BrowserPool(driver_factory=MultiTabDriver, max_browsers=2, tabs_per_browser=3, poll_interval=0.01)
+    seen = {}
+
+    def task(n):
+        tab = pool.lease()
+        try:
+            tab.get(f"https://example.test/{n}")
+            body = tab.find_element('tag name', 'body')
+            time.sleep(0.05)  # other tabs run commands in between
+            body.click()
+            seen[n] = (tab.current_url, body.text)
+        finally:
+            tab.quit()
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=task, args=(n,)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Six tasks each loading two 0.2 s pages finish in far less than 2.4 s
+    assert time.monotonic() - started < 1.2
+    assert seen == {n: (f"https://example.test/{n}/next", f"page https://example.test/{n}") for n in range(6)}
+    assert len(MultiTabDriver.started) == 2
+    assert all(driver.max_tabs <= 3 for driver in MultiTabDriver.started)
+    stats = pool.stats()
+    assert stats['browsers'] == 2 and stats['tabs_in_use'] == 0 and stats['leases'] == 6
+    # Every task's tab was closed or blanked for reuse
+    assert all(len(driver.tabs) == 1 for driver in MultiTabDriver.started)
+
+
+def test_full_pool_waits_then_rejects():
+    """Test that a lease waits for a free tab, is rejected past max_wait, and released tabs are unusable"""
+    pool = BrowserPool(driver_factory=MultiTabDriver, max_browsers=1, tabs_per_browser=2, max_wait=0.1)
+    first, second = pool.lease(), pool.lease()
+    with pytest.raises(Overloaded):
+        pool.lease()
+
+    threading.Timer(0.05, first.quit).start()
+    third = pool.lease()
+    assert third.handle != second.handle
+    with pytest.raises(InvalidSessionIdException):
+        first.current_url  # released handles are unusable
+    assert len(MultiTabDriver.started) == 1
+
+
+def test_pooled_scraper_releases_its_tab():
+    """Test that the pooled scraper returns its tab on close and fails to start when the pool is full"""
+    pool = BrowserPool(driver_factory=MultiTabDriver, max_browsers=1, tabs_per_browser=1, max_wait=0)
+    for _ in range(3):
+        scraper = PooledPropertyScraper(pool=pool)
+        assert scraper.start_driver()
+        scraper._load_page('https://example.test/home', 'zillow', settle=0)
+        with pytest.raises(NoSuchElementException):
+            scraper.driver.find_element('css selector', 'missing')
+        scraper.close_driver()
+    assert pool.stats()['leases'] == 3 and len(MultiTabDriver.started) == 1
+
+    blocker = PooledPropertyScraper(pool=pool)
+    assert blocker.start_driver()
+    assert not PooledPropertyScraper(pool=pool).start_driver()
+
+
+def test_shared_pool_is_closed_at_exit(monkeypatch):
+    """Test that the shared pool is created once and closed at interpreter exit"""
+    registered = []
+    monkeypatch.setattr(browser_pool, '_shared_pool', None)
+    monkeypatch.setattr(atexit, 'register', registered.append)
+    pool = browser_pool.shared_pool()
+    assert browser_pool.shared_pool() is pool
+    assert registered == [pool.close]
+    pool.close()
+
+
+def _watched_pool(watchdog, **kwargs):
+    return BrowserPool(driver_factory=lambda: MultiTabDriver(load_s=0), max_browsers=1, tabs_per_browser=2,
+                       poll_interval=0.01, watchdog=watchdog, **kwargs)
+
+
+def test_page_limit_recycles_between_jobs():
+    """Test that a browser past its page limit is recycled only after its other tabs finish"""
+    pool = _watched_pool(DriverWatchdog(max_pages=3, max_rss_mb=0, max_load_seconds=0, interval=0))
+    busy = pool.lease()
+    other = pool.lease()
+    for n in range(3):
+        busy.get(f"https://example.test/{n}")
+    busy.quit()
+    # Flagged, but the other job's tab keeps working until it is done
+    assert pool.stats()['retiring'] == 1
+    assert other.current_url == 'about:blank'
+    assert not MultiTabDriver.started[0].quit_called
+    other.quit()
+
+    assert MultiTabDriver.started[0].quit_called
+    fresh = pool.lease()
+    assert len(MultiTabDriver.started) == 2 and fresh._browser.driver is MultiTabDriver.started[1]
+    assert pool.stats()['recycles'] == {'pages': 1}
+
+
+def test_clicks_count_as_page_loads():
+    """Test that click-through navigations count toward the page limit and load times"""
+    pool = _watched_pool(DriverWatchdog(max_pages=2, max_rss_mb=0, max_load_seconds=0, interval=0))
+    tab = pool.lease()
+    tab.get('https://example.test/search')
+    tab.find_element('tag name', 'a').click()
+    assert tab._browser.health.pages == 2 and len(tab._browser.health.load_times) == 2
+    tab.quit()
+    assert pool.stats()['recycles'] == {'pages': 1}
+
+
+def test_rss_and_latency_thresholds():
+    """Test that the watchdog flags high memory and slow page loads"""
+    rss = {'bytes': 100 * 1048576}
+    watchdog = DriverWatchdog(max_rss_mb=500, max_pages=0, max_load_seconds=1, interval=0, min_loads=2,
+                              rss_of=lambda driver: rss['bytes'])
+    health = watchdog.new_health()
+    assert watchdog.verdict(health, None) is None
+    rss['bytes'] = 600 * 1048576
+    assert watchdog.verdict(health, None) == 'rss'
+
+    rss['bytes'] = None  # no /proc: only the other checks apply
+    for seconds in (0.5, 3, 4):
+        watchdog.record_load(health, seconds)
+    assert watchdog.verdict(health, None) == 'latency'
+
+
+def test_background_sampler_recycles_idle_browser():
+    """Test that the background sampler recycles an idle browser over the memory limit"""
+    rss = {'bytes': 0}
+    watchdog = DriverWatchdog(max_rss_mb=500, max_pages=0, max_load_seconds=0, interval=0.02,
+                              rss_of=lambda driver: rss['bytes'])
+    pool = _watched_pool(watchdog)
+    pool.lease().quit()
+    rss['bytes'] = 900 * 1048576
+    deadline = time.monotonic() + 2
+    while not watchdog.stats() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pool.close()
+    assert watchdog.stats() == {'rss': 1}
+    assert MultiTabDriver.started[0].quit_called and pool.stats()['browsers'] == 0
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason='needs /proc')
+def test_process_tree_rss_includes_children():
+    """Test that process tree RSS includes child processes and is None for a dead one"""
+    child = subprocess.Popen([sys.executable, '-c',
+                              'import sys, time; x = bytearray(80_000_000); print(1, flush=True); time.sleep(30)'],
+                             stdout=subprocess.PIPE)
+    try:
+        child.stdout.readline()
+        own = process_tree_rss(child.pid)
+        assert own > 70_000_000
+        assert process_tree_rss(os.getpid()) >= own
+    finally:
+        child.kill()
+        child.wait()
+    assert process_tree_rss(child.pid) is None
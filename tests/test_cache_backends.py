@@ -0,0 +1,141 @@
+"""
+Unit tests for the memory, SQLite and Redis cache backends
+"""
+
+import threading
+import time
+
+import pytest
+
+from backends import FakeAnalyzer, FakeScraper
+from cache_backends import MemoryCache, RedisCache, SQLiteCache
+from pipeline import AnalysisPipeline, StageCache
+from tests.fake_redis import FakeRedisServer
+
+ADDRESS = '12 Elm St, Hartford, CT 06106'
+
+
+@pytest.fixture
+def redis_server():
+    with FakeRedisServer(max_keys=3) as server:
+        yield server
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def make_backend(request, tmp_path):
+    """Constructor for backends that share one store, as separate worker processes would"""
+    if request.param == 'memory':
+        shared = MemoryCache(max_entries=3)
+        return lambda: shared
+    if request.param == 'sqlite':
+        return lambda: SQLiteCache(str(tmp_path / 'cache.db'), max_entries=3)
+    server = request.getfixturevalue('redis_server')
+    return lambda: RedisCache(server.url)
+
+
+def test_ttl_eviction_and_counters(make_backend):
+    """Test that each backend expires, evicts least-recently-used entries and counts hits and misses"""
+    cache = make_backend()
+    cache.set('short', {'v': 1}, ttl=0.05)
+    cache.set('a', [1, 2])
+    assert cache.get('short') == {'v': 1}
+    time.sleep(0.1)
+    assert cache.get('short') is None
+
+    cache.set('b', 'x')
+    cache.set('c', 'y')
+    cache.get('a')  # 'a' is now more recently used than 'b'
+    cache.set('d', 'z')
+    assert cache.get('a') == [1, 2]
+    assert cache.get('b') is None
+
+    stats = cache.stats()
+    assert stats['evictions'] >= 1
+    assert stats['hits'] == 3 and stats['misses'] == 2
+    assert stats['entries'] == 3
+
+    cache.delete_prefix('c')
+    assert cache.get('c') is None and cache.get('d') == 'z'
+
+
+def test_get_or_compute_runs_once_across_instances(make_backend):
+    """Test that concurrent get_or_compute calls on one store compute the value once"""
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return {'value': 42}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(make_backend().get_or_compute('k', compute, ttl=60)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [{'value': 42}] * 4
+    assert len(calls) == 1
+
+    assert make_backend().get_or_compute('none', lambda: None) is None
+    assert make_backend().get_or_compute('bad', lambda: 'x', cacheable=lambda v: False) == 'x'
+    assert make_backend().get('bad') is None
+
+
+def test_release_leaves_another_holders_lock(make_backend):
+    """Test that releasing an expired lock token leaves the current holder's lock in place"""
+    cache = make_backend()
+    assert cache._acquire('k', 'current')
+    # A holder whose lock expired and was taken over must not free the new holder's
+    cache._release('k', 'expired')
+    assert not make_backend()._acquire('k', 'waiting')
+    cache._release('k', 'current')
+    assert make_backend()._acquire('k', 'waiting')
+
+
+def test_pipelines_share_scrapes_through_sqlite(tmp_path):
+    """Test that two pipelines on one SQLite file reuse each other's scrapes"""
+    scraped = []
+
+    class CountingScraper(FakeScraper):
+        def scrape_subject(self, address):
+            scraped.append(address)
+            return super().scrape_subject(address)
+
+    def pipeline():
+        return AnalysisPipeline(scraper_factory=CountingScraper, analyzer_factory=FakeAnalyzer,
+                                cache=StageCache(backend=SQLiteCache(str(tmp_path / 'cache.db'))))
+
+    first = pipeline().run({'address': ADDRESS}, analysis='flip')
+    second_pipeline = pipeline()
+    second = second_pipeline.run({'address': ADDRESS}, analysis='flip')
+    assert len(scraped) == 1
+    assert second['timings']['llm']['cached']
+    assert second['comparables'] == first['comparables']
+
+    second_pipeline.invalidate(ADDRESS)
+    pipeline().run({'address': ADDRESS}, analysis=None)
+    assert len(scraped) == 2
+
+
+def test_unreachable_redis_degrades_to_misses():
+    """Test that an unreachable Redis server reads as cache misses and counts errors"""
+    cache = RedisCache('redis://127.0.0.1:1/0', socket_timeout=0.2)
+    cache.set('k', 1)
+    assert cache.get('k') is None
+    assert cache.get_or_compute('k', lambda: 'computed') == 'computed'
+    assert cache.stats()['errors'] >= 2
+
+
+def test_redis_auth_and_namespace():
+    """Test that Redis authenticates and keeps each namespace's keys and size separate"""
+    with FakeRedisServer(password='s3cret') as server:
+        cache = RedisCache(server.url, namespace='app1:')
+        cache.set('k', {'n': 1}, ttl=60)
+        assert RedisCache(server.url, namespace='app1:').get('k') == {'n': 1}
+        assert RedisCache(server.url, namespace='app2:').get('k') is None
+
+        # Entries count this namespace only, not other apps' keys or held locks
+        RedisCache(server.url, namespace='app2:').set('other', 1)
+        assert cache._acquire('k', 'token')
+        assert cache.size() == 1 and cache.stats()['entries'] == 1
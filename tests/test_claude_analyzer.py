@@ -0,0 +1,166 @@
+"""
+Unit tests for the Claude analyzer against a local stand-in API
+"""
+
+import asyncio
+import json
+import pytest
+from benchmarks.fake_anthropic import SAMPLE_CMA, FakeAnthropicServer
+from claude_analyzer import ClaudeAnalyzer, CMA_INSTRUCTIONS
+from model_router import DEFAULT_ROUTES, TIERS, ModelRouter
+from rate_limiter import RequestLimiter
+
+SCRAPED = {
+    'property': {'address': '5 Charles St, Willimantic, CT 06226', 'price': '250000', 'sqft': 1500, 'beds': 3},
+    'comparables': [{'address': '9 Oak St, Willimantic, CT 06226', 'sale_price': '240000', 'sqft': 1400}],
+}
+
+
+@pytest.fixture
+def fake_api():
+    """Run the fake Messages API for the duration of a test"""
+    with FakeAnthropicServer(response_text=json.dumps(SAMPLE_CMA)) as server:
+        yield server
+
+
+def test_static_instructions_sent_as_cached_system_prefix(fake_api):
+    """Test that CMA rules go in a cached system block and property data stays in the prompt"""
+    analyzer = ClaudeAnalyzer(api_key='test-key', base_url=fake_api.base_url)
+    analyzer.comprehensive_property_analysis(SCRAPED)
+
+    body = fake_api.requests[0]
+    assert body['system'][0]['text'] == CMA_INSTRUCTIONS
+    assert body['system'][0]['cache_control'] == {'type': 'ephemeral'}
+    assert 'Willimantic' not in CMA_INSTRUCTIONS
+    assert '5 Charles St' in body['messages'][0]['content']
+
+
+def test_prompt_lines_sent_without_source_indentation():
+    """Test that an interpolated multi-line comp table doesn't leave the prompt indented"""
+    analyzer = ClaudeAnalyzer(api_key='test-key')
+    request = analyzer._build_request(**analyzer._comprehensive_request(SCRAPED))
+    lines = request['messages'][0]['content'].splitlines()
+    assert any(line.startswith('1 | 9 Oak St') for line in lines)
+    assert all(line == line.lstrip() for line in lines)
+
+
+def test_usage_reports_cache_reads_and_writes(fake_api):
+    """Test that repeat analyses report cache reads instead of writes"""
+    analyzer = ClaudeAnalyzer(api_key='test-key', base_url=fake_api.base_url)
+    first = analyzer.comprehensive_property_analysis(SCRAPED)
+    second = analyzer.comprehensive_property_analysis(SCRAPED)
+
+    assert first['usage']['cache_creation_input_tokens'] > 0
+    assert first['usage']['cache_read_input_tokens'] == 0
+    assert second['usage']['cache_read_input_tokens'] == first['usage']['cache_creation_input_tokens']
+
+
+def test_streamed_sections_reach_callback(fake_api):
+    """Test that streaming emits completed sections through the callback"""
+    analyzer = ClaudeAnalyzer(api_key='test-key', base_url=fake_api.base_url)
+    sections = []
+    result = analyzer.comprehensive_property_analysis(SCRAPED, on_section=lambda k, v: sections.append(k))
+
+    assert result['success']
+    assert sections == list(SAMPLE_CMA)
+
+
+def test_async_analyses_respect_concurrency_limit(fake_api):
+    """Test that concurrent async analyses never exceed the limiter's in-flight cap"""
+    fake_api.latency = 0.1
+    analyzer = ClaudeAnalyzer(api_key='test-key', base_url=fake_api.base_url,
+                              limiter=RequestLimiter(max_concurrent=2))
+
+    async def run_all():
+        return await asyncio.gather(*[analyzer.comprehensive_property_analysis_async(SCRAPED) for _ in range(6)])
+
+    results = asyncio.run(run_all())
+    assert all(r['success'] for r in results)
+    assert len(fake_api.requests) == 6
+    assert fake_api.max_in_flight == 2
+
+
+def test_copywriting_routes_to_fast_tier(fake_api):
+    """Test that listing descriptions use the fast model and are costed under that tier"""
+    router = ModelRouter()
+    analyzer = ClaudeAnalyzer(api_key='test-key', base_url=fake_api.base_url, router=router)
+    result = analyzer.generate_listing_description(SCRAPED['property'], {})
+
+    assert fake_api.requests[0]['model'] == TIERS['fast']['model']
+    assert result['tier'] == 'fast'
+    assert router.stats()['fast']['requests'] == 1
+    assert router.stats()['fast']['cost_usd'] > 0
+
+
+def test_invalid_json_escalates_to_strong_tier(fake_api):
+    """Test that JSON output failing validation on the fast tier is redone on the strong tier"""
+    fake_api.response_text = 'Sorry, here is my analysis in prose.'
+    routes = dict(DEFAULT_ROUTES, comprehensive={'tier': 'fast', 'json': True, 'max_tokens': None})
+    router = ModelRouter(routes=routes, escalation=True)
+    analyzer = ClaudeAnalyzer(api_key='test-key', base_url=fake_api.base_url, router=router)
+    result = analyzer.comprehensive_property_analysis(SCRAPED)
+
+    assert [r['model'] for r in fake_api.requests] == [TIERS['fast']['model'], TIERS['strong']['model']]
+    assert result['tier'] == 'strong'
+    assert result['escalated_from'] == 'fast'
+    assert router.stats()['fast']['escalations'] == 1
+
+
+def test_schema_forced_as_tool_and_invalid_fields_repaired(fake_api):
+    """Test that the CMA schema is a forced tool and only invalid fields are re-requested"""
+    broken = dict(SAMPLE_CMA, valuation=dict(SAMPLE_CMA['valuation'], estimated_fair_market_value='about 255k'))
+    fake_api.responses = [json.dumps(broken), json.dumps({'valuation': SAMPLE_CMA['valuation']})]
+    analyzer = ClaudeAnalyzer(api_key='test-key', base_url=fake_api.base_url)
+    result = analyzer.comprehensive_property_analysis(SCRAPED)
+
+    first, repair = fake_api.requests
+    assert first['tool_choice'] == {'type': 'tool', 'name': 'record_cma'}
+    assert list(repair['tools'][0]['input_schema']['properties']) == ['valuation']
+    assert 'valuation.estimated_fair_market_value' in repair['messages'][0]['content']
+    assert result['repaired_fields'] == ['valuation']
+    assert 'validation_errors' not in result
+    assert json.loads(result['content']) == SAMPLE_CMA
+
+
+def test_section_cut_by_truncation_is_re_requested(fake_api):
+    """Test that a section cut mid-value is repaired even though what survived validates"""
+    ordered = {k: v for k, v in SAMPLE_CMA.items() if k != 'recommendations'}
+    ordered['recommendations'] = ['List at $259,000', 'Replace the roof before listing']
+    text = json.dumps(ordered)
+    fake_api.responses = [text[:text.index('Replace the') + 7],
+                          json.dumps({'recommendations': ordered['recommendations']})]
+    result = ClaudeAnalyzer(api_key='test-key', base_url=fake_api.base_url).comprehensive_property_analysis(SCRAPED)
+
+    first, repair = fake_api.requests
+    assert list(repair['tools'][0]['input_schema']['properties']) == ['recommendations']
+    assert result['truncated'] and result['repaired_fields'] == ['recommendations']
+    assert json.loads(result['content'])['recommendations'] == ordered['recommendations']
+
+
+def test_property_value_forced_as_tool_and_range_repaired(fake_api):
+    """Test that property valuations use their own forced tool and an inverted value range is re-requested"""
+    valuation = {'estimated_market_value': 255000, 'value_range_low': 245000, 'value_range_high': 265000,
+                 'price_per_sqft': 170, 'confidence_level': 'Medium'}
+    analysis = {
+        'market_research': {'market_trend': 'Stable', 'avg_days_on_market': 30, 'price_per_sqft_trend': 'Flat',
+                            'inventory_level': 'Balanced'},
+        'property_valuation': dict(valuation, value_range_low=270000),
+        'comparable_analysis': {'comps': [{'address': '9 Oak St', 'grade': 'A', 'adjustments': '+$5k size'}],
+                                'best_comparable': '9 Oak St', 'worst_comparable': '9 Oak St'},
+        'market_strategy': {'suggested_list_price': 259000, 'pricing_rationale': 'Just under comps',
+                            'best_time_to_sell': 'Spring', 'marketing_recommendations': ['Stage the kitchen']},
+        'investment_analysis': {'rental_potential': 1900, 'appreciation_outlook': 'Moderate',
+                                'risk_factors': ['Older roof']},
+        'property_insights': {'condition_assessment': 'Average', 'upgrade_recommendations': ['Paint'],
+                              'red_flags': []},
+    }
+    fake_api.responses = [json.dumps(analysis), json.dumps({'property_valuation': valuation})]
+    analyzer = ClaudeAnalyzer(api_key='test-key', base_url=fake_api.base_url)
+    result = analyzer.analyze_property_value(SCRAPED['property'], SCRAPED['comparables'])
+
+    first, repair = fake_api.requests
+    assert first['tool_choice'] == {'type': 'tool', 'name': 'record_property_value'}
+    assert 'record_property_value' in first['messages'][0]['content']
+    assert list(repair['tools'][0]['input_schema']['properties']) == ['property_valuation']
+    assert result['repaired_fields'] == ['property_valuation']
+    assert json.loads(result['content'])['property_valuation'] == valuation
@@ -0,0 +1,31 @@
+"""
+Unit tests for the flip Monte Carlo engine
+"""
+
+from flip_simulation import simulate_flip
+
+
+def test_simulation_percentiles_and_grid():
+    """Test percentile ordering, seeded determinism and the sensitivity grid shape"""
+    result = simulate_flip(300000, 430000, seed=7)
+    profit = list(result['profit_percentiles'].values())
+    assert profit == sorted(profit)
+    assert result['scenarios'] == 100000
+    assert 0 <= result['probability_of_loss'] <= 1
+    assert simulate_flip(300000, 430000, seed=7)['profit_percentiles'] == result['profit_percentiles']
+
+    grid = result['sensitivity']['median_roi']
+    assert len(grid) == len(result['sensitivity']['offer_prices'])
+    assert all(len(row) == len(result['sensitivity']['renovation_budgets']) for row in grid)
+    # Lower offers and smaller reno budgets both improve ROI
+    assert grid[0][0] > grid[-1][0] and grid[0][0] > grid[0][-1]
+
+
+def test_fixed_distributions_are_deterministic():
+    """Test that fixed inputs collapse every scenario to the same outcome"""
+    result = simulate_flip(100000, 150000, scenarios=1000, distributions={
+        'renovation_pct': ('fixed', 0.2), 'holding_months': ('fixed', 5), 'monthly_holding_pct': ('fixed', 0.0),
+        'arv_factor': ('fixed', 1.0), 'selling_pct': ('fixed', 0.0)})
+    # 150k sale - 100k purchase - 20k reno
+    assert set(result['profit_percentiles'].values()) == {30000}
+    assert result['probability_of_loss'] == 0
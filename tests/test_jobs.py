@@ -0,0 +1,186 @@
+"""
+Unit tests for background analysis jobs
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from admission import Overloaded
+from jobs import JOB_KIND, JobManager, JobQueueFull
+from result_store import ResultStore
+
+
+def wait_for(manager, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job['status'] in ('succeeded', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_reports_stages_and_stores_result():
+    """Test that a job records per-stage progress and its final payload"""
+    def runner(request_json, analysis, on_stage=None):
+        on_stage('scrape_subject', 'cached')
+        on_stage('llm', 'done')
+        return {'address': request_json['address'], 'analysis': analysis}, 200
+
+    manager = JobManager(runner, store=ResultStore(':memory:'), max_workers=1)
+    job = manager.submit({'address': '1 Main St'}, 'flip')
+    assert job['status'] == 'queued'
+
+    finished = wait_for(manager, job['id'])
+    assert finished['status'] == 'succeeded'
+    assert finished['result'] == {'address': '1 Main St', 'analysis': 'flip'}
+    assert finished['stages']['scrape_subject'] == 'cached'
+    assert finished['stages']['scrape_comps'] == 'pending'
+    assert manager.stats()['pending'] == 0
+    manager.shutdown()
+
+
+def test_failed_runner_marks_job_failed():
+    """Test that error payloads and exceptions both end as failed jobs"""
+    def runner(request_json, analysis, on_stage=None):
+        if request_json.get('raise'):
+            raise RuntimeError('browser crashed')
+        return {'error': 'Claude analysis failed'}, 500
+
+    manager = JobManager(runner, store=ResultStore(':memory:'), max_workers=2)
+    errored = wait_for(manager, manager.submit({'address': 'a'}, 'comprehensive')['id'])
+    raised = wait_for(manager, manager.submit({'address': 'b', 'raise': True}, 'comprehensive')['id'])
+
+    assert (errored['status'], errored['result_status'], errored['error']) == ('failed', 500, 'Claude analysis failed')
+    assert (raised['status'], raised['error']) == ('failed', 'browser crashed')
+    manager.shutdown()
+
+
+def test_queue_limit_rejects_excess_jobs():
+    """Test that submissions beyond max_pending raise JobQueueFull"""
+    release = threading.Event()
+
+    def runner(request_json, analysis, on_stage=None):
+        release.wait(5)
+        return {}, 200
+
+    manager = JobManager(runner, store=ResultStore(':memory:'), max_workers=1, max_pending=2)
+    manager.submit({'address': 'a'}, 'flip')
+    manager.submit({'address': 'b'}, 'flip')
+    with pytest.raises(JobQueueFull):
+        manager.submit({'address': 'c'}, 'flip')
+    release.set()
+    manager.shutdown()
+
+
+def test_overloaded_job_waits_for_capacity():
+    """Test that a job turned away by admission control retries instead of failing"""
+    calls = []
+
+    def runner(request_json, analysis, on_stage=None):
+        calls.append(1)
+        if len(calls) < 3 or request_json.get('always_busy'):
+            raise Overloaded('browser', 0, 'queue full')
+        return {'ok': True}, 200
+
+    manager = JobManager(runner, store=ResultStore(':memory:'), max_workers=1, overload_retries=3)
+    job = wait_for(manager, manager.submit({'address': 'a'}, 'flip')['id'])
+    assert (job['status'], job['admission_retries'], len(calls)) == ('succeeded', 2, 3)
+    assert 'waiting_for' not in job
+
+    busy = wait_for(manager, manager.submit({'address': 'b', 'always_busy': True}, 'flip')['id'])
+    assert (busy['status'], busy['result_status']) == ('failed', 503)
+    manager.shutdown()
+
+
+def test_unfinished_jobs_from_previous_process_are_failed():
+    """Test that jobs left running by a restart are reported as failed"""
+    store = ResultStore(':memory:')
+    store.put('old', JOB_KIND, {'id': 'old', 'status': 'running'})
+
+    manager = JobManager(lambda *a, **k: ({}, 200), store=store)
+    manager._fail_interrupted()
+    assert manager.get('old')['status'] == 'failed'
+
+
+def test_only_jobs_of_dead_or_silent_owners_are_failed():
+    """Test that a worker opening a shared store leaves its siblings' live jobs alone"""
+    host = socket.gethostname()
+    now = time.time()
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    store = ResultStore(':memory:')
+    store.put('sibling', JOB_KIND, {'id': 'sibling', 'status': 'running', 'heartbeat_at': now,
+                                    'owner': {'host': host, 'pid': os.getppid(), 'manager': 'other'}})
+    store.put('remote', JOB_KIND, {'id': 'remote', 'status': 'queued', 'heartbeat_at': now,
+                                   'owner': {'host': 'other-host', 'pid': 1, 'manager': 'other'}})
+    store.put('crashed', JOB_KIND, {'id': 'crashed', 'status': 'running', 'heartbeat_at': now,
+                                    'owner': {'host': host, 'pid': dead.pid, 'manager': 'other'}})
+    store.put('silent', JOB_KIND, {'id': 'silent', 'status': 'running', 'heartbeat_at': now - 120,
+                                   'owner': {'host': 'other-host', 'pid': 1, 'manager': 'other'}})
+
+    manager = JobManager(lambda *a, **k: ({}, 200), store=store, stale_after=60)
+    manager._fail_interrupted()
+    assert {job_id: manager.get(job_id)['status'] for job_id in ('sibling', 'remote', 'crashed', 'silent')} == {
+        'sibling': 'running', 'remote': 'queued', 'crashed': 'failed', 'silent': 'failed'}
+
+
+class _StaleFirstRead:
+    """Store whose first get() returns the record as it was before the job finished"""
+
+    def __init__(self, store, stale):
+        self._store = store
+        self._stale = stale
+
+    def get(self, key, kind):
+        stale, self._stale = self._stale, None
+        return stale or self._store.get(key, kind)
+
+    def __getattr__(self, name):
+        return getattr(self._store, name)
+
+
+def test_job_finishing_during_poll_keeps_its_result():
+    """Test that a job stored as succeeded after get() read it as running is not failed"""
+    store = ResultStore(':memory:')
+    manager = JobManager(lambda *a, **k: ({'ok': True}, 200), store=store, max_workers=1)
+    job_id = manager.submit({'address': 'a'}, 'flip')['id']
+    finished = wait_for(manager, job_id)
+    assert finished['status'] == 'succeeded'
+
+    manager._store = _StaleFirstRead(store, dict(finished, status='running', finished_at=None))
+    assert manager.get(job_id)['status'] == 'running'
+    assert store.get(job_id, JOB_KIND)['status'] == 'succeeded'
+
+    # Likewise for another worker's job whose heartbeat went stale just as it finished
+    sibling = JobManager(lambda *a, **k: ({}, 200), store=_StaleFirstRead(store, dict(
+        finished, status='running', heartbeat_at=time.time() - 120, owner={'host': 'other-host', 'pid': 1})))
+    assert sibling.get(job_id)['status'] == 'succeeded'
+    assert store.get(job_id, JOB_KIND)['result'] == {'ok': True}
+    manager.shutdown()
+
+
+def test_heartbeat_keeps_long_jobs_alive():
+    """Test that a running job's heartbeat stops other workers from failing it"""
+    release = threading.Event()
+
+    def runner(request_json, analysis, on_stage=None):
+        release.wait(5)
+        return {}, 200
+
+    store = ResultStore(':memory:')
+    manager = JobManager(runner, store=store, max_workers=1, heartbeat_interval=0.05, stale_after=0.3)
+    job_id = manager.submit({'address': 'a'}, 'flip')['id']
+    time.sleep(0.5)
+
+    sibling = JobManager(runner, store=store, stale_after=0.3)
+    assert sibling.get(job_id)['status'] == 'running'
+    release.set()
+    assert wait_for(manager, job_id)['status'] == 'succeeded'
+    manager.shutdown()
@@ -0,0 +1,40 @@
+"""
+Unit tests for the incremental JSON parser
+"""
+
+from json_stream import StreamingJSONParser, parse_json_checked, parse_json_text
+
+
+def test_sections_emitted_as_they_close():
+    """Test that top-level sections are emitted as soon as they complete"""
+    parser = StreamingJSONParser()
+    assert parser.feed('Here is the analysis:\n```json\n{"valuation": {"fmv": 3') == []
+    emitted = parser.feed('50000}, "recommendations": ["a", "b, c"]')
+    assert emitted == [('valuation', {'fmv': 350000})]
+    emitted = parser.feed('}\n```\nLet me know if you need more.')
+    assert emitted == [('recommendations', ['a', 'b, c'])]
+    assert parser.finish() == {'valuation': {'fmv': 350000}, 'recommendations': ['a', 'b, c']}
+
+
+def test_truncated_output_is_repaired():
+    """Test that output cut off mid-value keeps every complete section"""
+    result = parse_json_text('{"executive_summary": "Fair", "valuation": {"low": 1, "high": 2}, '
+                             '"risk_factors": ["Old roof", "Flood zo')
+    assert result['executive_summary'] == 'Fair'
+    assert result['valuation'] == {'low': 1, 'high': 2}
+    assert result['risk_factors'][0] == 'Old roof'
+
+
+def test_values_cut_mid_token_are_dropped_and_reported():
+    """Test that a number or string cut mid-value is not accepted as complete"""
+    result, cut = parse_json_checked('{"summary": "ok", "valuation": {"estimated_fair_market_value": 35')
+    assert result == {'summary': 'ok', 'valuation': {}}
+    assert cut == ['valuation']
+    assert parse_json_checked('{"summary": "ok", "notes": "trunc') == ({'summary': 'ok'}, ['notes'])
+    assert parse_json_checked('{"summary": "ok", "flags": [true') == ({'summary': 'ok', 'flags': [True]}, ['flags'])
+    assert parse_json_checked('{"summary": "ok"}') == ({'summary': 'ok'}, None)
+
+
+def test_no_json_returns_none():
+    """Test that prose without a JSON object yields nothing"""
+    assert parse_json_text('Sorry, I cannot help with that.') is None
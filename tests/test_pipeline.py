@@ -0,0 +1,98 @@
+"""
+Unit tests for the shared analysis pipeline
+"""
+
+import time
+
+import backends
+from pipeline import AnalysisPipeline, StageCache, canonical_key
+
+
+class FakeScraper(backends.FakeScraper):
+    """The backends fake, counting browser work"""
+    calls = []
+
+    def start_driver(self):
+        FakeScraper.calls.append('start')
+        return super().start_driver()
+
+    def scrape_subject(self, address):
+        FakeScraper.calls.append('subject')
+        return super().scrape_subject(address)
+
+    def scrape_comps(self, address, subject_data=None, comp_pool=None):
+        FakeScraper.calls.append('comps')
+        return super().scrape_comps(address, subject_data, comp_pool)
+
+
+class FakeAnalyzer:
+    def comprehensive_property_analysis(self, scraped_data, **kwargs):
+        return {'success': True, 'content': '{}', 'reference': kwargs['reference_valuation']}
+
+    def analyze_flip_potential(self, property_data, comparables, **kwargs):
+        return {'success': True, 'content': '{}', 'deadline': kwargs['deadline']}
+
+
+def test_second_analysis_reuses_scrapes():
+    """Test that a flip after a CMA of the same address only runs its own LLM stage"""
+    FakeScraper.calls = []
+    pipeline = AnalysisPipeline(scraper_factory=FakeScraper, analyzer_factory=FakeAnalyzer, ttl=60)
+
+    first = pipeline.run({'address': '5 Charles Street, Willimantic, CT'}, analysis='comprehensive')
+    second = pipeline.run({'address': '5 charles st willimantic ct'}, analysis='flip', deadline=lambda: 42)
+
+    assert FakeScraper.calls == ['start', 'subject', 'comps']
+    assert first['result']['reference'] == first['local_valuation']
+    assert first['comparables'][0]['address'].endswith('Comp St')
+    assert second['result']['deadline'] == 42
+    assert all(second['timings'][stage]['cached'] for stage in ('scrape_subject', 'scrape_comps', 'score', 'value'))
+    assert not second['timings']['llm']['cached']
+
+
+def test_manual_override_revalues_without_rescraping():
+    """Test that manual input changes the valuation key but not the scrape key"""
+    FakeScraper.calls = []
+    pipeline = AnalysisPipeline(scraper_factory=FakeScraper, analyzer_factory=FakeAnalyzer, ttl=60)
+    pipeline.run({'address': '5 Charles St'}, analysis=None)
+    bigger = pipeline.run({'address': '5 Charles St', 'sqft': 2000}, analysis=None)
+
+    assert FakeScraper.calls == ['start', 'subject', 'comps']
+    assert not bigger['timings']['value']['cached']
+    assert canonical_key('5 Charles Street, Connecticut') == canonical_key('5 charles st., CT')
+
+
+def test_stale_scrape_served_while_refreshing_in_background():
+    """Past the TTL but inside the stale window, the old scrape is returned at once and replaced behind it"""
+    FakeScraper.calls = []
+    pipeline = AnalysisPipeline(scraper_factory=FakeScraper, analyzer_factory=FakeAnalyzer,
+                                cache=StageCache(ttl=0.05, stale_ttl=60))
+    pipeline.run({'address': '12 Elm St'}, analysis=None)
+    time.sleep(0.1)
+
+    stale = pipeline.run({'address': '12 Elm St'}, analysis=None)
+    assert stale['timings']['scrape_subject']['cached'] and stale['timings']['scrape_subject']['stale']
+    assert stale['property_data']['sqft'] == backends.FakeScraper().scrape_subject('12 Elm St')['sqft']
+    for _ in range(50):
+        if pipeline.scrape_stats['refreshes']:
+            break
+        time.sleep(0.02)
+    assert pipeline.scrape_stats['refreshes'] == 1
+    assert FakeScraper.calls == ['start', 'subject', 'comps'] * 2
+
+    fresh = pipeline.run({'address': '12 Elm St'}, analysis=None)
+    assert fresh['timings']['scrape_comps']['stale'] is False
+    assert FakeScraper.calls == ['start', 'subject', 'comps'] * 2
+
+
+def test_scrape_without_comps_is_not_cached():
+    """Test that a scrape that found no comps is redone on the next run instead of cached"""
+    class NoComps(FakeScraper):
+        def scrape_comps(self, address, subject_data=None, comp_pool=None):
+            FakeScraper.calls.append('comps')
+            return []
+
+    FakeScraper.calls = []
+    pipeline = AnalysisPipeline(scraper_factory=NoComps, analyzer_factory=FakeAnalyzer, ttl=60)
+    pipeline.run({'address': '12 Elm St'}, analysis=None)
+    pipeline.run({'address': '12 Elm St'}, analysis=None)
+    assert FakeScraper.calls == ['start', 'subject', 'comps'] * 2
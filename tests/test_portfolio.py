@@ -0,0 +1,120 @@
+"""
+Unit tests for bulk portfolio analysis
+"""
+
+import io
+import threading
+import time
+
+import pytest
+
+from admission import Overloaded
+from backends import FakeScraper
+from pipeline import AnalysisPipeline
+from portfolio import parse_rows, run_portfolio
+
+
+def test_parse_csv_keeps_manual_fields():
+    """Test that CSV rows keep address and build_property_data fields only"""
+    body = io.BytesIO(b"Address,price,beds,notes\n1 Main St Hartford CT,250000,3,corner lot\n2 Oak St,,,\n")
+    rows = list(parse_rows(body, 'text/csv'))
+    assert rows == [{'address': '1 Main St Hartford CT', 'price': '250000', 'beds': '3'},
+                    {'address': '2 Oak St'}]
+
+
+def test_parse_rejects_bad_input():
+    """Test that a missing address column or non-list JSON fails before streaming"""
+    with pytest.raises(ValueError):
+        parse_rows(io.BytesIO(b"street,price\n1 Main St,1\n"), 'text/csv')
+    with pytest.raises(ValueError):
+        parse_rows(io.BytesIO(b'{"address": "1 Main St"}'), 'application/json')
+    rows = parse_rows(io.BytesIO(b'{"properties": ["1 Main St", {"address": "2 Oak St", "sqft": 1200}]}'),
+                      'application/json')
+    assert list(rows) == [{'address': '1 Main St'}, {'address': '2 Oak St', 'sqft': 1200}]
+
+
+def test_parse_json_reads_rows_incrementally():
+    """Test that JSON rows are decoded one at a time, across read-chunk boundaries"""
+    rows_json = ', '.join(f'{{"address": "{i} Main St", "beds": {i}}}' for i in range(20000))
+    body = io.BytesIO(f'{{"name": "Q3", "tags": [1, {{"a": "]"}}], "properties": [{rows_json}]}}'.encode())
+    rows = parse_rows(body, 'application/json')
+    assert next(rows) == {'address': '0 Main St', 'beds': 0}
+    assert body.tell() < len(body.getvalue()) // 4
+    rest = list(rows)
+    assert len(rest) == 19999 and rest[-1] == {'address': '19999 Main St', 'beds': 19999}
+    assert all(row['beds'] == i for i, row in enumerate(rest, 1))
+
+
+def test_parse_ndjson_and_mid_stream_errors():
+    """Test NDJSON input, and that a malformed row ends the run with an input_error summary"""
+    rows = parse_rows(io.BytesIO(b'{"address": "1 Main St"}\n\n"2 Oak St"\n'), 'application/x-ndjson')
+    assert list(rows) == [{'address': '1 Main St'}, {'address': '2 Oak St'}]
+
+    rows = parse_rows(io.BytesIO(b'["1 Main St", {"address": "2 Oak St"}, {"address": oops}]'), 'application/json')
+    results = list(run_portfolio(rows, lambda row: ({'status': 'success'}, 200), concurrency=1))
+    summary = results[-1]['summary']
+    assert (summary['total'], summary['succeeded']) == (2, 2)
+    assert summary['input_error'].startswith('Invalid JSON')
+
+
+def test_run_portfolio_bounds_parallelism():
+    """Test that at most `concurrency` rows run at once and every row gets a result"""
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def analyze(row):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return {'status': 'success'}, 200
+
+    rows = ({'address': f'{i} Main St'} for i in range(20))
+    results = list(run_portfolio(rows, analyze, concurrency=3))
+    assert peak[0] <= 3
+    assert sorted(r['index'] for r in results[:-1]) == list(range(20))
+    assert results[-1]['summary']['succeeded'] == 20
+
+
+def test_run_portfolio_reports_row_failures():
+    """Test that missing addresses, errors and retried overloads each produce a line"""
+    calls = []
+
+    def analyze(row):
+        calls.append(row['address'])
+        if row['address'] == 'busy' and calls.count('busy') == 1:
+            raise Overloaded('browser', 0, 'queue full')
+        if row['address'] == 'broken':
+            raise RuntimeError('boom')
+        return {'status': 'success'}, 200
+
+    results = list(run_portfolio([{}, {'address': 'busy'}, {'address': 'broken'}], analyze, concurrency=1))
+    by_index = {r['index']: r for r in results[:-1]}
+    assert by_index[0]['http_status'] == 400
+    assert by_index[1]['http_status'] == 200
+    assert by_index[2]['http_status'] == 500
+    summary = results[-1]['summary']
+    assert (summary['total'], summary['succeeded'], summary['failed']) == (3, 1, 2)
+
+
+class PooledScraper(FakeScraper):
+    """The backends fake, fetching the city sold page through the pipeline's comp pool"""
+    fetches = 0
+
+    def scrape_comps(self, address, subject_data=None, comp_pool=None):
+        def fetch():
+            PooledScraper.fetches += 1
+            return super(PooledScraper, self).scrape_comps(address, subject_data)
+        return [dict(c) for c in comp_pool('hartford', fetch)]
+
+
+def test_city_listings_shared_across_addresses():
+    """Test that two addresses in one city load the recently-sold page once"""
+    PooledScraper.fetches = 0
+    pipeline = AnalysisPipeline(scraper_factory=PooledScraper, ttl=60)
+    first = pipeline.run({'address': '1 Main St Hartford CT'}, analysis=None)
+    second = pipeline.run({'address': '7 Park St Hartford CT'}, analysis=None)
+    assert PooledScraper.fetches == 1
+    assert {c['address'] for c in first['comparables']} == {c['address'] for c in second['comparables']}
@@ -0,0 +1,54 @@
+"""
+Unit tests for opt-in request profiling
+"""
+
+import os
+import time
+
+from profiling import RequestProfiler
+
+
+def busy(seconds=0.03):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(100))
+
+
+def test_profiles_only_with_valid_token(tmp_path):
+    """Test that a missing or wrong token never profiles"""
+    profiler = RequestProfiler(token='secret', directory=str(tmp_path), sample_rate=0)
+    for token in (None, 'wrong'):
+        with profiler.session(token) as profile_id:
+            busy(0.001)
+        assert profile_id is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_cprofile_and_sample_modes_write_profile_and_metadata(tmp_path):
+    """Test that both modes write their data file plus request metadata"""
+    profiler = RequestProfiler(token='secret', directory=str(tmp_path), sample_interval=0.001)
+    metadata = {'path': '/analyze'}
+    with profiler.session('secret', 'cprofile', metadata) as first:
+        busy()
+    with profiler.session('secret', 'sample', {'path': '/flip-analysis'}) as second:
+        busy()
+
+    assert os.path.exists(tmp_path / f'{first}.prof')
+    assert 'busy' in (tmp_path / f'{second}.folded').read_text()
+    assert metadata['mode'] == 'cprofile' and metadata['duration_ms'] >= 20
+    assert (tmp_path / f'{first}.json').exists()
+
+
+def test_rate_limit_and_rotation(tmp_path):
+    """Test that sessions beyond the per-minute limit are skipped and old profiles are pruned"""
+    profiler = RequestProfiler(token='secret', directory=str(tmp_path), keep=2, max_per_minute=3)
+    ids = []
+    for _ in range(4):
+        with profiler.session('secret') as profile_id:
+            busy(0.001)
+        ids.append(profile_id)
+        time.sleep(0.01)
+
+    assert ids[3] is None
+    remaining = sorted(os.listdir(tmp_path))
+    assert remaining == sorted(f'{i}{ext}' for i in ids[1:3] for ext in ('.json', '.prof'))
@@ -0,0 +1,56 @@
+"""
+Unit tests for retries, deadlines and hedging of Claude requests
+"""
+
+import time
+import pytest
+from benchmarks.fake_anthropic import FakeAnthropicServer
+from claude_analyzer import ClaudeAnalyzer
+from resilience import DeadlineExceeded, RetryPolicy, call_with_retries
+
+FAST_RETRIES = RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.05)
+
+
+def test_overloaded_response_is_retried():
+    """Test that a 529 with retry-after is retried and the analysis succeeds"""
+    with FakeAnthropicServer() as server:
+        server.failures = [(529, {'retry-after': '0'})]
+        analyzer = ClaudeAnalyzer(api_key='test-key', base_url=server.base_url, retry_policy=FAST_RETRIES)
+        result = analyzer.create_market_report('5 Charles St', {'valuation': 1})
+    assert result['success']
+    assert len(server.requests) == 2
+
+
+def test_client_errors_are_not_retried():
+    """Test that a 400 fails immediately without retrying"""
+    with FakeAnthropicServer() as server:
+        server.failures = [(400, {})]
+        analyzer = ClaudeAnalyzer(api_key='test-key', base_url=server.base_url, retry_policy=FAST_RETRIES)
+        result = analyzer.create_market_report('5 Charles St', {'valuation': 1})
+    assert not result['success']
+    assert len(server.requests) == 1
+
+
+def test_retry_that_would_pass_deadline_is_abandoned():
+    """Test that backoff never sleeps past the caller's deadline"""
+    def always_timeout(timeout):
+        raise TimeoutError("slow")
+
+    with pytest.raises(DeadlineExceeded):
+        call_with_retries(always_timeout, RetryPolicy(max_attempts=5, base_delay=10, max_delay=10), deadline=0.5)
+
+
+def test_hedged_request_wins_over_slow_attempt():
+    """Test that a hedged second attempt returns before a stalled first attempt"""
+    calls = []
+
+    def attempt(timeout):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            time.sleep(1.0)
+            return 'slow'
+        return 'fast'
+
+    started = time.monotonic()
+    assert call_with_retries(attempt, FAST_RETRIES, hedge_after=0.05) == 'fast'
+    assert time.monotonic() - started < 0.5
@@ -0,0 +1,176 @@
+"""
+Unit tests for recording and replaying browser and Claude API sessions
+"""
+
+import asyncio
+import atexit
+import json
+import time
+
+import pytest
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+
+from benchmarks.fake_anthropic import SAMPLE_CMA, FakeAnthropicServer
+from benchmarks.pages import FixtureDriver
+from pipeline import AnalysisPipeline, NullCache
+from rate_limiter import RequestLimiter
+from session_replay import (RecordingDriver, RecordingPropertyScraper, ReplayDriver, ReplayPropertyScraper,
+                            SessionRecording, recording_analyzer, replay_analyzer, result_digest, shared_recording)
+
+ADDRESS = '45 Prospect St, Willimantic, CT 06226'
+
+
+class _LiveElement:
+    def __init__(self, text, attrs=None, children=None, on_click=None):
+        self.text = text
+        self.attrs = attrs or {}
+        self.children = children or {}
+        self.on_click = on_click
+
+    def get_attribute(self, name):
+        return self.attrs.get(name)
+
+    def find_element(self, by, value):
+        if value not in self.children:
+            raise NoSuchElementException(value)
+        return self.children[value][0]
+
+    def find_elements(self, by, value):
+        return self.children.get(value, [])
+
+    def click(self):
+        self.on_click()
+
+
+class _LiveDriver(_LiveElement):
+    """A two-page site: a search page whose first result clicks through to a listing"""
+
+    def __init__(self):
+        super().__init__('')
+        self.current_url = 'about:blank'
+
+    def get(self, url):
+        self.current_url = url
+        self._show_search()
+
+    def _show_search(self):
+        card = _LiveElement('3 bd 2 ba', children={'.price': [_LiveElement('$250,000')]})
+        link = _LiveElement('first', attrs={'href': '/home/1'}, on_click=self._show_listing)
+        self.children = {'body': [_LiveElement('Search results')], '.card': [card, card], 'a': [link]}
+
+    def _show_listing(self):
+        self.current_url = 'https://example.test/home/1'
+        self.children = {'body': [_LiveElement('Listing page')], 'img': [_LiveElement('', attrs={'src': 'p.jpg'})]}
+
+    def quit(self):
+        pass
+
+
+def _browse(driver):
+    driver.get('https://example.test/search?query=x')
+    seen = [driver.find_element(By.TAG_NAME, 'body').text]
+    seen += [card.find_element(By.CSS_SELECTOR, '.price').text for card in driver.find_elements(By.CSS_SELECTOR, '.card')]
+    with pytest.raises(NoSuchElementException):
+        driver.find_element(By.CSS_SELECTOR, '.missing')
+    link = driver.find_elements(By.CSS_SELECTOR, 'a')[0]
+    seen.append(link.get_attribute('href'))
+    link.click()
+    seen += [driver.current_url, driver.find_element(By.TAG_NAME, 'body').text,
+             driver.find_elements(By.CSS_SELECTOR, 'img')[0].get_attribute('src')]
+    driver.quit()
+    return seen
+
+
+def test_driver_round_trip(tmp_path):
+    """Test that a replayed browser session returns what the live driver returned"""
+    recording = SessionRecording(str(tmp_path / 'session.json'))
+    live = _browse(RecordingDriver(_LiveDriver(), recording))
+    recording.save()
+
+    replayed = _browse(ReplayDriver(SessionRecording(str(tmp_path / 'session.json'))))
+    assert replayed == live
+    assert live[-3:] == ['https://example.test/home/1', 'Listing page', 'p.jpg']
+
+
+class _RecordingFixtureScraper(RecordingPropertyScraper):
+    """Records the real scraping code running over fixture pages instead of Chrome"""
+
+    def start_driver(self):
+        self.driver = RecordingDriver(FixtureDriver(), self.recording)
+        return True
+
+    def _load_page(self, url, source, settle):
+        self.driver.get(url)
+
+
+@pytest.fixture
+def limiter():
+    return RequestLimiter(max_concurrent=8, requests_per_minute=1_000_000, tokens_per_minute=1_000_000_000)
+
+
+def test_pipeline_replays_identically_without_network(tmp_path, limiter):
+    """Test that a recorded pipeline run replays to the same result with the API server gone"""
+    path = str(tmp_path / 'session.json')
+    recording = SessionRecording(path)
+    with FakeAnthropicServer(json.dumps(SAMPLE_CMA)) as server:
+        live = AnalysisPipeline(
+            scraper_factory=lambda: _RecordingFixtureScraper(recording),
+            analyzer_factory=lambda: recording_analyzer(recording, api_key='test', base_url=server.base_url,
+                                                        limiter=limiter),
+            cache=NullCache()).run({'address': ADDRESS}, analysis='comprehensive')
+    recording.save()
+    assert live['result']['success'] and live['comparables']
+
+    # The server is gone: everything below comes from the recording file
+    replayed_recording = SessionRecording(path)
+    pipeline = AnalysisPipeline(scraper_factory=lambda: ReplayPropertyScraper(replayed_recording),
+                                analyzer_factory=lambda: replay_analyzer(replayed_recording, limiter=limiter),
+                                cache=NullCache())
+    for _ in range(2):
+        replayed = pipeline.run({'address': ADDRESS}, analysis='comprehensive')
+        assert result_digest(replayed) == result_digest(live)
+
+
+def test_streamed_and_async_calls_replay(tmp_path, limiter):
+    """Test that streamed and async API calls replay, instantly or with the recorded latency"""
+    recording = SessionRecording(str(tmp_path / 'session.json'))
+    scraped = {'property': {'address': ADDRESS, 'sqft': 1500}, 'comparables': []}
+    live_sections = []
+    with FakeAnthropicServer(json.dumps(SAMPLE_CMA), latency=0.3) as server:
+        analyzer = recording_analyzer(recording, api_key='test', base_url=server.base_url, limiter=limiter)
+        live = analyzer.comprehensive_property_analysis(scraped, on_section=lambda k, v: live_sections.append(k))
+        live_async = asyncio.run(analyzer.comprehensive_property_analysis_async(scraped))
+    assert live['success'] and live_async['success']
+    # Exchanges are kept in memory until the recording is saved, not rewritten per call
+    assert not (tmp_path / 'session.json').exists()
+
+    sections = []
+    started = time.perf_counter()
+    replayed = replay_analyzer(recording, limiter=limiter).comprehensive_property_analysis(
+        scraped, on_section=lambda k, v: sections.append(k))
+    assert time.perf_counter() - started < 0.25
+    assert replayed['content'] == live['content'] and sections == live_sections
+
+    started = time.perf_counter()
+    slow = asyncio.run(replay_analyzer(recording, reproduce_latency=True, limiter=limiter)
+                       .comprehensive_property_analysis_async(scraped))
+    assert time.perf_counter() - started >= 0.25
+    assert slow['content'] == live_async['content']
+
+
+def test_shared_recording_is_saved_at_exit(tmp_path, monkeypatch):
+    """Test that the shared recording is saved once, at interpreter exit"""
+    registered = []
+    monkeypatch.setattr(atexit, 'register', registered.append)
+    path = str(tmp_path / 'shared.json')
+    recording = shared_recording(path)
+    assert shared_recording(path) is recording
+    assert registered == [recording.save]
+
+
+def test_unrecorded_request_fails_cleanly(tmp_path, limiter):
+    """Test that a request missing from the recording gives a failed result, not an exception"""
+    analyzer = replay_analyzer(SessionRecording(str(tmp_path / 'empty.json')), limiter=limiter)
+    result = analyzer.comprehensive_property_analysis({'property': {'address': ADDRESS}, 'comparables': []})
+    assert not result['success']
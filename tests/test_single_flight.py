@@ -0,0 +1,78 @@
+"""
+Unit tests for single-flight request coalescing
+"""
+
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def _run_concurrently(targets):
+    results = [None] * len(targets)
+
+    def runner(i, target):
+        try:
+            results[i] = target()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=runner, args=(i, t)) for i, t in enumerate(targets)]
+    for t in threads:
+        t.start()
+        time.sleep(0.01)
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_calls_share_one_computation():
+    """Test that followers receive the leader's result and errors without recomputing"""
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return {'fmv': 255000}
+
+    results = _run_concurrently([lambda: flight.do('5 charles st|flip', slow)] * 4)
+    assert calls == [1]
+    assert results == [{'fmv': 255000}] * 4
+    assert flight.stats()['followers'] == 3
+
+    def failing():
+        time.sleep(0.2)
+        raise ValueError('scrape blocked')
+
+    errors = _run_concurrently([lambda: flight.do('9 oak st|flip', failing)] * 3)
+    assert all(isinstance(e, ValueError) for e in errors)
+
+
+def test_follower_timeout():
+    """Test that a follower gives up after its timeout while the leader keeps running"""
+    flight = SingleFlight()
+    leader = threading.Thread(target=flight.do, args=('k', lambda: time.sleep(0.3)))
+    leader.start()
+    time.sleep(0.05)
+    with pytest.raises(TimeoutError):
+        flight.do('k', lambda: None, timeout=0.05)
+    leader.join()
+
+
+def test_cross_process_result_handoff(tmp_path):
+    """Test that a second coordinator sharing the lock dir reuses the first one's result"""
+    first, second = SingleFlight(lock_dir=str(tmp_path)), SingleFlight(lock_dir=str(tmp_path))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {'fmv': 255000}
+
+    results = _run_concurrently([lambda: first.do('k', compute), lambda: second.do('k', compute)])
+    assert calls == [1]
+    assert results == [{'fmv': 255000}] * 2
+    assert second.stats()['cross_process_hits'] == 1
@@ -0,0 +1,36 @@
+"""
+Unit tests for the token budget manager
+"""
+
+from token_budget import TokenBudget, DEFAULT_MAX_TOKENS
+
+
+def test_max_tokens_adapts_to_observed_outputs():
+    """Test that max_tokens starts at the default and then tracks observed output sizes"""
+    budget = TokenBudget(min_samples=3)
+    assert budget.max_tokens_for('listing_description') == DEFAULT_MAX_TOKENS['listing_description']
+    for tokens in (600, 650, 700):
+        budget.record_output('listing_description', tokens)
+    assert budget.max_tokens_for('listing_description') == int(700 * budget.headroom)
+
+
+def test_fit_json_drops_low_value_fields_and_fits_budget():
+    """Test that photos are dropped and oversized payloads are shrunk to the budget"""
+    budget = TokenBudget()
+    data = {'address': '5 Charles St', 'photos': ['https://photos.zillowstatic.com/a.jpg'],
+            'history': [{'note': 'x' * 1000} for _ in range(50)]}
+    text = budget.fit_json(data, max_tokens=300)
+    assert 'photos' not in text
+    assert '5 Charles St' in text
+    assert budget.estimate_tokens(text) <= 300
+
+
+def test_trim_comparables_keeps_most_similar():
+    """Test that the closest comps are kept and the rest summarized"""
+    budget = TokenBudget()
+    subject = {'sqft': 1500, 'beds': 3}
+    comps = [{'address': f'{i} Main St', 'sale_price': str(200000 + i * 1000), 'sqft': 1500 + i * 100,
+              'beds': 3, 'distance_miles': 0.5} for i in range(10)]
+    kept, summary = budget.trim_comparables(comps, subject, max_comps=4)
+    assert [c['address'] for c in kept] == ['0 Main St', '1 Main St', '2 Main St', '3 Main St']
+    assert summary['count'] == 6
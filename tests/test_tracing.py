@@ -0,0 +1,54 @@
+"""
+Unit tests for tracing spans and metrics
+"""
+
+import threading
+
+import tracing
+from tracing import MetricsRegistry, span, trace, traced
+
+
+def test_spans_feed_trace_and_registry():
+    """Test that spans inside a trace are collected and always reach the histograms"""
+    @traced('unit.parse', 'redfin')
+    def parse():
+        return 1
+
+    with trace() as request_trace:
+        with span('unit.page_load', 'zillow'):
+            pass
+        parse()
+        parse()
+    with span('unit.page_load', 'zillow'):
+        pass
+
+    result = request_trace.to_dict()
+    assert result['totals']['unit.parse/redfin']['count'] == 2
+    assert [s['span'] for s in result['spans']] == ['unit.page_load/zillow', 'unit.parse/redfin', 'unit.parse/redfin']
+    assert tracing.registry.snapshot()['unit.page_load/zillow']['count'] >= 2
+
+
+def test_trace_does_not_leak_into_other_threads():
+    """Test that a thread without a copied context records no spans into the request trace"""
+    def work():
+        with span('unit.other'):
+            pass
+
+    with trace() as request_trace:
+        worker = threading.Thread(target=work)
+        worker.start()
+        worker.join()
+    assert request_trace.to_dict()['totals'] == {}
+    assert tracing.registry.snapshot()['unit.other']['count'] >= 1
+
+
+def test_render_prometheus_histogram():
+    """Test cumulative buckets, count and quantile lines"""
+    registry = MetricsRegistry()
+    for seconds in (0.004, 0.2, 3.0):
+        registry.observe('driver.get', 'zillow', seconds)
+    text = '\n'.join(registry.render())
+    assert 'realty_span_seconds_bucket{span="driver.get",source="zillow",le="0.005"} 1' in text
+    assert 'realty_span_seconds_bucket{span="driver.get",source="zillow",le="+Inf"} 3' in text
+    assert 'realty_span_seconds_count{span="driver.get",source="zillow"} 3' in text
+    assert 'realty_span_quantile_seconds{span="driver.get",source="zillow",quantile="0.5"} 0.200000' in text
@@ -0,0 +1,39 @@
+"""
+Unit tests for the local valuation engine
+"""
+
+from valuation_engine import estimate_value
+
+
+SUBJECT = {'address': '5 Charles St', 'price': '300,000', 'beds': 3, 'baths': 2, 'sqft': 1500,
+           'year_built': 1960, 'sqft_finished_basement': 400}
+
+
+def test_identical_comps_value_at_their_price():
+    """Test that comps matching the subject need no adjustment and give a tight, confident range"""
+    comps = [{'address': f'{n} Elm St', 'sale_price': '320,000', 'beds': 3, 'baths': 2, 'sqft': 1500,
+              'year_built': 1960, 'sqft_finished_basement': 400, 'distance_miles': 0.3} for n in range(6)]
+    result = estimate_value(SUBJECT, comps)
+    assert result['available']
+    assert result['estimated_fair_market_value'] == 320000
+    assert result['value_range_low'] < 320000 < result['value_range_high']
+    assert result['confidence_level'] == 'High'
+    assert result['adjusted_comps'][0]['adjustments'] == {}
+
+
+def test_adjustments_move_value_toward_subject():
+    """Test that a smaller comp without a basement is adjusted up and closer comps weigh more"""
+    comps = [
+        {'address': 'near', 'sale_price': 280000, 'beds': 2, 'baths': 1, 'sqft': 1200, 'distance_miles': 0.2},
+        {'address': 'far', 'sale_price': 280000, 'beds': 2, 'baths': 1, 'sqft': 1200, 'distance_miles': 3.0},
+    ]
+    result = estimate_value(SUBJECT, comps)
+    near, far = result['adjusted_comps']
+    assert near['adjustments']['basement'] == 400 * 40
+    assert near['adjusted_value'] > 280000
+    assert near['weight'] > far['weight']
+
+
+def test_no_priced_comps_is_unavailable():
+    """Test that comps without a sale price don't produce a valuation"""
+    assert estimate_value(SUBJECT, [{'address': 'x', 'sqft': 1400}])['available'] is False